@@ -0,0 +1,355 @@
+"""Aggregate the run histories under logs/<scenario>/.
+
+Reads both the plain-text logs (`<index>.log`, also when several runs were
+appended to one file) and the structured `<index>.jsonl` files written by
+`utils.logging_utils`, and reports per query: planner/caller iterations,
+planner "Continue" loops, API selector retries, which ResponseParser path was
+taken and the execution time, followed by per-scenario summaries and
+histograms.
+
+    python analyze_logs.py                      # everything under logs/
+    python analyze_logs.py logs/docker_en --json
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+LOG_ROOT = "logs"
+
+# Message prefixes the chains log with; a free-text record runs from one of
+# these to the next.
+RECORD_PREFIXES = (
+    "Query: ",
+    "query is ",
+    "planner received input: ",
+    "Planner: ",
+    "API Selector: ",
+    "Caller: ",
+    "response_text is ",
+    "returning execution result: ",
+    "executing operation ",
+    "Parser: ",
+    "Code: ",
+    "Falling back to LLM parsing",
+    "Output too long",
+    "Router: ",
+    "Model router: ",
+    "Pushdown: ",
+    "Pagination: ",
+    "Execution Time: ",
+)
+
+MODEL_CALL = re.compile(r"Model router: stage=(\S+) model=(\S+) .*?latency=([\d.]+)s(?: cost=\$([\d.]+))?")
+PROMPT_TOKENS = re.compile(r"prompt_tokens=(\d+)(?: cached_prefix_tokens=(\d+))?")
+
+# run.py logs "Execution Time: 12.3", run_tmdb.py "Execution Time: 12 seconds"
+EXECUTION_TIME = re.compile(r"Execution Time: ([\d.]+)")
+
+PUSHDOWN = re.compile(r"Pushdown: .* (\d+) bytes(?: \(was (\d+) bytes\))?$")
+
+SELECTOR_RETRY = "API Selector: The API you called is not in the list of available APIs"
+
+# ResponseParser paths, keyed by how many code attempts preceded the result
+PARSER_PATHS = {0: "llm", 1: "code", 2: "code_retry"}
+
+
+def iter_text_records(lines: Iterable[str]) -> Iterator[Tuple[Optional[float], str]]:
+    current: List[str] = []
+    for line in lines:
+        if line.startswith(RECORD_PREFIXES) and current:
+            yield None, "".join(current)
+            current = []
+        current.append(line)
+    if current:
+        yield None, "".join(current)
+
+
+def iter_jsonl_records(lines: Iterable[str]) -> Iterator[Tuple[Optional[float], str]]:
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        yield entry.get("ts"), entry.get("message", "")
+
+
+def new_run(path: str, scenario: str, run_index: int) -> Dict:
+    return {
+        "scenario": scenario,
+        "file": path,
+        "run": run_index,
+        "query": None,
+        "planner_calls": 0,
+        "continue_loops": 0,
+        "selector_calls": 0,
+        "selector_retries": 0,
+        "caller_steps": 0,
+        "parser_calls": 0,
+        "parser_paths": Counter(),
+        "truncated_outputs": 0,
+        "routed_to": None,
+        "model_calls": {},
+        "pushdowns": 0,
+        "pushdown_bytes": 0,
+        "pushdown_baseline_bytes": 0,
+        "final_answer": False,
+        "execution_time": None,
+        # records with a known prefix whose values could not be read
+        "unparsed": [],
+        "_first_ts": None,
+        "_last_ts": None,
+        "_pending_code": 0,
+        "_pending_llm": False,
+    }
+
+
+def finish_run(run: Dict) -> Dict:
+    if run["execution_time"] is None and run["_first_ts"] is not None:
+        run["execution_time"] = run["_last_ts"] - run["_first_ts"]
+    run["parser_paths"] = dict(run["parser_paths"])
+    return {key: value for key, value in run.items() if not key.startswith("_")}
+
+
+def analyze_file(path: str) -> Tuple[str, List[Dict], Optional[str]]:
+    """Parse one log file into a list of per-run metrics.
+
+    Runs in a worker process, so it only returns plain data and never raises.
+    """
+    try:
+        scenario = os.path.basename(os.path.dirname(path))
+        with open(path, encoding="utf-8", errors="replace") as f:
+            lines = f.readlines()
+        records = iter_jsonl_records(lines) if path.endswith(".jsonl") else iter_text_records(lines)
+
+        runs: List[Dict] = []
+        run: Optional[Dict] = None
+        for ts, message in records:
+            if message.startswith("Query: ") or run is None:
+                if run is not None:
+                    runs.append(finish_run(run))
+                run = new_run(path, scenario, len(runs))
+            if ts is not None:
+                run["_first_ts"] = ts if run["_first_ts"] is None else run["_first_ts"]
+                run["_last_ts"] = ts
+
+            if message.startswith("Query: "):
+                run["query"] = message[len("Query: "):].strip()
+            elif message.startswith("query is ") and run["query"] is None:
+                run["query"] = message[len("query is "):].strip()
+            elif message.startswith("Planner: "):
+                run["planner_calls"] += 1
+                plan = message[len("Planner: "):]
+                if "Final Answer" in plan:
+                    run["final_answer"] = True
+                elif re.search("Continue", plan):
+                    run["continue_loops"] += 1
+            elif message.startswith(SELECTOR_RETRY):
+                run["selector_retries"] += 1
+            elif message.startswith("API Selector: "):
+                run["selector_calls"] += 1
+            elif message.startswith("Caller: "):
+                run["caller_steps"] += 1
+            elif message.startswith("Code: "):
+                run["_pending_code"] += 1
+            elif message.startswith("Falling back to LLM parsing"):
+                run["_pending_llm"] = True
+            elif message.startswith("Output too long"):
+                run["truncated_outputs"] += 1
+            elif message.startswith("Parser: "):
+                run["parser_calls"] += 1
+                code_attempts = run["_pending_code"]
+                parser_path = PARSER_PATHS.get(code_attempts, f"code_x{code_attempts}")
+                if run["_pending_llm"] and code_attempts:
+                    parser_path += "+llm"
+                run["parser_paths"][parser_path] += 1
+                run["_pending_code"], run["_pending_llm"] = 0, False
+            elif message.startswith("Router: "):
+                run["routed_to"] = message[len("Router: "):].strip()
+            elif message.startswith("Model router: "):
+                match = MODEL_CALL.match(message)
+                # coalesced calls shared another call's request and cost nothing extra
+                if match and " coalesced " not in message:
+                    _, model, latency, cost = match.groups()
+                    calls = run["model_calls"].setdefault(model, {"calls": 0, "latency": 0.0, "cost": 0.0, "prompt_tokens": 0, "cached_prefix_tokens": 0})
+                    tokens = PROMPT_TOKENS.search(message)
+                    if tokens:
+                        calls["prompt_tokens"] += int(tokens.group(1))
+                        calls["cached_prefix_tokens"] += int(tokens.group(2) or 0)
+                    calls["calls"] += 1
+                    calls["latency"] += float(latency)
+                    calls["cost"] += float(cost or 0.0)
+            elif message.startswith("Pushdown: "):
+                match = PUSHDOWN.match(message.strip())
+                if match:
+                    run["pushdowns"] += 1
+                    run["pushdown_bytes"] += int(match.group(1))
+                    run["pushdown_baseline_bytes"] += int(match.group(2) or match.group(1))
+            elif message.startswith("Execution Time: "):
+                match = EXECUTION_TIME.match(message)
+                if match:
+                    run["execution_time"] = float(match.group(1))
+                else:
+                    run["unparsed"].append(message.strip()[:80])
+        if run is not None:
+            runs.append(finish_run(run))
+        return path, runs, None
+    except Exception as e:
+        return path, [], f"{type(e).__name__}: {e}"
+
+
+def discover_logs(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+            continue
+        for dirpath, _, filenames in os.walk(path):
+            files.extend(
+                os.path.join(dirpath, name) for name in filenames
+                if name.endswith((".log", ".jsonl"))
+            )
+    # a run logged in both formats is counted once, from the structured log
+    jsonl = {f[:-len(".jsonl")] for f in files if f.endswith(".jsonl")}
+    return sorted(f for f in files if not (f.endswith(".log") and f[:-len(".log")] in jsonl))
+
+
+def analyze(paths: List[str], max_workers: Optional[int] = None) -> Tuple[List[Dict], Dict[str, str]]:
+    files = discover_logs(paths)
+    runs: List[Dict] = []
+    errors: Dict[str, str] = {}
+    if not files:
+        return runs, errors
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for path, file_runs, error in pool.map(analyze_file, files, chunksize=8):
+            if error is not None:
+                errors[path] = error
+            runs.extend(file_runs)
+    return runs, errors
+
+
+def summarize(runs: List[Dict]) -> Dict[str, Dict]:
+    by_scenario: Dict[str, List[Dict]] = defaultdict(list)
+    for run in runs:
+        by_scenario[run["scenario"]].append(run)
+
+    summary = {}
+    for scenario, scenario_runs in sorted(by_scenario.items()):
+        times = [run["execution_time"] for run in scenario_runs if run["execution_time"] is not None]
+        parser_paths: Counter = Counter()
+        model_calls: Dict[str, Dict[str, float]] = {}
+        for run in scenario_runs:
+            parser_paths.update(run["parser_paths"])
+            for model, calls in run["model_calls"].items():
+                totals = model_calls.setdefault(model, {"calls": 0, "latency": 0.0, "cost": 0.0, "prompt_tokens": 0, "cached_prefix_tokens": 0})
+                for key, value in calls.items():
+                    totals[key] += value
+        parser_total = sum(parser_paths.values())
+
+        def mean(key: str) -> float:
+            return statistics.mean(run[key] for run in scenario_runs)
+
+        summary[scenario] = {
+            "runs": len(scenario_runs),
+            "finished": sum(run["final_answer"] for run in scenario_runs),
+            "mean_planner_calls": mean("planner_calls"),
+            "mean_continue_loops": mean("continue_loops"),
+            "mean_selector_retries": mean("selector_retries"),
+            "mean_caller_steps": mean("caller_steps"),
+            "parser_paths": {path: count / parser_total for path, count in parser_paths.most_common()} if parser_total else {},
+            "timed_runs": len(times),
+            "median_time": statistics.median(times) if times else None,
+            "p90_time": sorted(times)[int(0.9 * (len(times) - 1))] if times else None,
+            "total_time": sum(times),
+            "model_calls": model_calls,
+            "pushdowns": sum(run["pushdowns"] for run in scenario_runs),
+            "pushdown_bytes": sum(run["pushdown_bytes"] for run in scenario_runs),
+            "pushdown_baseline_bytes": sum(run["pushdown_baseline_bytes"] for run in scenario_runs),
+        }
+    return summary
+
+
+def histogram(values: List[float], bins: int = 8, width: int = 40) -> List[str]:
+    if not values:
+        return ["    (no data)"]
+    low, high = min(values), max(values)
+    step = (high - low) / bins or 1.0
+    counts = [0] * bins
+    for value in values:
+        counts[min(int((value - low) / step), bins - 1)] += 1
+    peak = max(counts)
+    return [
+        f"    {low + i * step:9.1f} - {low + (i + 1) * step:9.1f} | {'#' * round(width * count / peak):<{width}} {count}"
+        for i, count in enumerate(counts)
+    ]
+
+
+def fmt(value: Optional[float], spec: str = ".1f") -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def print_report(runs: List[Dict], summary: Dict[str, Dict], show_runs: bool) -> None:
+    if show_runs:
+        header = f"{'scenario':<18} {'run':<12} {'plan':>4} {'cont':>4} {'sel':>4} {'retry':>5} {'call':>4} {'time(s)':>8}  parser paths"
+        print(header)
+        print("-" * len(header))
+        for run in sorted(runs, key=lambda r: (r["scenario"], r["file"], r["run"])):
+            name = os.path.splitext(os.path.basename(run["file"]))[0] + (f"#{run['run']}" if run["run"] else "")
+            paths = ", ".join(f"{path}:{count}" for path, count in sorted(run["parser_paths"].items()))
+            print(f"{run['scenario']:<18} {name:<12} {run['planner_calls']:>4} {run['continue_loops']:>4} "
+                  f"{run['selector_calls']:>4} {run['selector_retries']:>5} {run['caller_steps']:>4} "
+                  f"{fmt(run['execution_time']):>8}  {paths}")
+        print()
+
+    for scenario, stats in summary.items():
+        print(f"== {scenario}: {stats['runs']} runs, {stats['finished']} reached a final answer")
+        print(f"   planner calls {stats['mean_planner_calls']:.1f}, continue loops {stats['mean_continue_loops']:.1f}, "
+              f"selector retries {stats['mean_selector_retries']:.1f}, caller steps {stats['mean_caller_steps']:.1f} (means)")
+        paths = ", ".join(f"{path} {share:.0%}" for path, share in stats["parser_paths"].items()) or "-"
+        print(f"   parser paths: {paths}")
+        for model, calls in stats["model_calls"].items():
+            cached = f", {calls['cached_prefix_tokens'] / calls['prompt_tokens']:.0%} of prompt tokens cached" if calls["prompt_tokens"] else ""
+            print(f"   {model}: {calls['calls']} calls, {calls['latency'] / calls['calls']:.2f}s mean latency, ${calls['cost']:.4f}{cached}")
+        if stats["pushdowns"]:
+            print(f"   pushdown: {stats['pushdowns']} requests, {stats['pushdown_bytes']} bytes "
+                  f"(measured baseline {stats['pushdown_baseline_bytes']} bytes)")
+        print(f"   time: median {fmt(stats['median_time'])}s, p90 {fmt(stats['p90_time'])}s, "
+              f"total {stats['total_time']:.1f}s over {stats['timed_runs']} timed runs")
+
+    print("\nexecution time (s):")
+    print("\n".join(histogram([run["execution_time"] for run in runs if run["execution_time"] is not None])))
+    print("\nplanner calls per run:")
+    print("\n".join(histogram([run["planner_calls"] for run in runs])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", default=[LOG_ROOT], help="log files or directories (default: logs/)")
+    parser.add_argument("--workers", type=int, default=None, help="size of the process pool")
+    parser.add_argument("--no-runs", action="store_true", help="only print the per-scenario summary")
+    parser.add_argument("--json", action="store_true", help="print runs and summary as JSON")
+    args = parser.parse_args()
+
+    runs, errors = analyze(args.paths, max_workers=args.workers)
+    summary = summarize(runs)
+    if args.json:
+        print(json.dumps({"runs": runs, "summary": summary, "errors": errors}, indent=2, ensure_ascii=False))
+    else:
+        print_report(runs, summary, show_runs=not args.no_runs)
+    for run in runs:
+        for message in run["unparsed"]:
+            print(f"could not parse {message!r} in {run['file']}", file=sys.stderr)
+    for path, error in errors.items():
+        print(f"skipped {path}: {error}", file=sys.stderr)
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
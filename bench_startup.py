@@ -0,0 +1,133 @@
+"""Startup benchmark for the entry points.
+
+Reports `python -X importtime` totals for each entry module and the wall
+time from process spawn to the first LLM request of `run.py` (the request is
+intercepted, so no API call is made). With `--budget-ms` it exits non-zero
+when time-to-first-LLM-call exceeds the budget, which makes it usable as a
+CI check:
+
+    python bench_startup.py --budget-ms 6000
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import time
+from typing import Dict, List, Tuple
+
+ENTRY_MODULES = ['run', 'serve', 'run_tmdb', 'wash_oas_dict']
+
+FIRST_LLM_CALL_MARKER = "FIRST_LLM_CALL"
+
+# Runs run.build() for real and stops the process at the first chat
+# completion request the planner makes.
+PROBE_CODE = f"""
+import sys
+import tempfile
+import run
+# log to a scratch dir so the benchmark never appends to logs/
+rest_gpt, query = run.build({{config_path!r}}, log_root=tempfile.mkdtemp())
+import openai
+def _probe(*args, **kwargs):
+    print({FIRST_LLM_CALL_MARKER!r}, flush=True)
+    sys.exit(0)
+openai.ChatCompletion.create = _probe
+openai.Completion.create = _probe
+rest_gpt.run(query)
+"""
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self_us, cumulative_us, depth) for every line of -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def measure_imports(module: str) -> Dict:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return {"module": module, "error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+    rows = parse_importtime(proc.stderr)
+    total_us = sum(self_us for _, self_us, _, _ in rows)
+    # direct imports of the entry module, i.e. what it chose to pull in
+    direct = sorted(((m, cum) for m, _, cum, depth in rows if depth == 1), key=lambda x: -x[1])
+    return {
+        "module": module,
+        "total_ms": total_us / 1000,
+        "modules": len(rows),
+        "heaviest": [(m, cum / 1000) for m, cum in direct[:8]],
+    }
+
+
+def measure_first_llm_call(config_path: str, timeout: float) -> float:
+    start_time = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-c", PROBE_CODE.format(config_path=config_path)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+    )
+    try:
+        for line in proc.stdout:
+            if line.strip() == FIRST_LLM_CALL_MARKER:
+                elapsed = time.perf_counter() - start_time
+                proc.wait(timeout=timeout)
+                return elapsed * 1000
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        raise RuntimeError(f"probe did not reach the first LLM call within {timeout}s")
+    raise RuntimeError(f"probe exited before the first LLM call:\n{proc.stderr.read()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.yaml", help="config passed to run.build()")
+    parser.add_argument("--modules", nargs="*", default=ENTRY_MODULES)
+    parser.add_argument("--repeat", type=int, default=3, help="time-to-first-LLM-call samples (median is reported)")
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail when time-to-first-LLM-call exceeds this")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    report = {"imports": [measure_imports(module) for module in args.modules]}
+    samples = [measure_first_llm_call(args.config, args.timeout) for _ in range(args.repeat)]
+    report["first_llm_call_ms"] = statistics.median(samples)
+    report["first_llm_call_samples_ms"] = samples
+    report["budget_ms"] = args.budget_ms
+    over_budget = args.budget_ms is not None and report["first_llm_call_ms"] > args.budget_ms
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for item in report["imports"]:
+            if "error" in item:
+                print(f"import {item['module']}: FAILED ({item['error']})")
+                continue
+            print(f"import {item['module']}: {item['total_ms']:.1f} ms over {item['modules']} modules")
+            for module, cumulative_ms in item["heaviest"]:
+                print(f"    {cumulative_ms:9.1f} ms  {module}")
+        samples_str = ", ".join(f"{sample:.0f}" for sample in samples)
+        print(f"time to first LLM call: {report['first_llm_call_ms']:.0f} ms (samples: {samples_str})")
+        if args.budget_ms is not None:
+            print(f"budget: {args.budget_ms:.0f} ms -> {'OVER BUDGET' if over_budget else 'ok'}")
+
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,28 @@
-from .rest_gpt import RestGPT
-from .planner import Planner
-from .api_selector import APISelector
-from .caller import Caller
-from .parser import ResponseParser, SimpleResponseParser
+# Resolved on first use (PEP 562), see utils/__init__.py
+import importlib
+
+_LAZY_ATTRS = {
+    'RestGPT': '.rest_gpt',
+    'Planner': '.planner',
+    'APISelector': '.api_selector',
+    'Caller': '.caller',
+    'ResponseParser': '.parser',
+    'SimpleResponseParser': '.parser',
+    'ParserRacePolicy': '.parser',
+    'ModelRouter': '.routing',
+    'RoutingPolicy': '.routing',
+}
+
+__all__ = list(_LAZY_ATTRS)
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
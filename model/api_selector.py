@@ -5,10 +5,13 @@ import logging
 from langchain.chains.base import Chain
 from langchain.chains.llm import LLMChain
 from langchain.prompts.base import BasePromptTemplate
-from langchain.prompts.prompt import PromptTemplate
 from langchain.llms.base import BaseLLM
 
 from utils import ReducedOpenAPISpec, get_matched_endpoint
+from utils.budget import check_budget
+
+from .prompts import stable_prompt
+from .routing import record_outcome
 
 logger = logging.getLogger(__name__)
 
@@ -124,10 +127,9 @@ class APISelector(Chain):
     def __init__(self, llm: BaseLLM, scenario: str, api_spec: ReducedOpenAPISpec) -> None:
         api_name_desc = [f"{endpoint[0]} {endpoint[1].split('.')[0] if endpoint[1] is not None else ''}" for endpoint in api_spec.endpoints]
         api_name_desc = '\n'.join(api_name_desc)
-        api_selector_prompt = PromptTemplate(
-            template=API_SELECTOR_PROMPT,
-            partial_variables={"endpoints": api_name_desc, "icl_examples": icl_examples[scenario]},
-            input_variables=["plan", "background", "agent_scratchpad"],
+        api_selector_prompt = stable_prompt(
+            "api_selector", API_SELECTOR_PROMPT, ["plan", "background", "agent_scratchpad"],
+            endpoints=api_name_desc, icl_examples=icl_examples[scenario],
         )
         super().__init__(llm=llm, api_spec=api_spec, scenario=scenario, api_selector_prompt=api_selector_prompt)
 
@@ -192,11 +194,15 @@ class APISelector(Chain):
             return {"result": api_plan}
             
         
+        # bounded by the query budget: every retry is an LLM call charged to it
         while get_matched_endpoint(self.api_spec, api_plan) is None:
+            record_outcome(self.llm, ok=False)
+            check_budget()
             logger.info("API Selector: The API you called is not in the list of available APIs. Please use another API.")
             scratchpad += api_selector_chain_output + "\nThe API you called is not in the list of available APIs. Please use another API.\n"
             api_selector_chain_output = api_selector_chain.run(plan=inputs['plan'], background=inputs['background'], agent_scratchpad=scratchpad)
             api_plan = re.sub(r"API calling \d+: ", "", api_selector_chain_output).strip()
             logger.info(f"API Selector: {api_plan}")
 
+        record_outcome(self.llm, ok=True)
         return {"result": api_plan}
@@ -1,36 +1,38 @@
 import json
 import logging
-from typing import Any, Dict, List, Optional, Tuple
-from copy import deepcopy
+from typing import Any, Dict, List, Optional, Tuple, Union
 import yaml
 import time
 import re
 import requests
 
-import tiktoken
-
 from langchain.chains.base import Chain
 from langchain.chains.llm import LLMChain
 from langchain.requests import RequestsWrapper
-from langchain.prompts.prompt import PromptTemplate
 from langchain.llms.base import BaseLLM
 
-from utils import simplify_json, get_matched_endpoint, ReducedOpenAPISpec, fix_json_error
+from utils import simplify_json, get_matched_endpoint, ReducedOpenAPISpec, get_encoder, PooledRequestsWrapper
+from utils.json_repair import JSONRepairError, repair_json
+from utils.pagination import PageStream, needs_all_pages
+from utils.pushdown import default_pushdown
+from utils.entity_cache import EntityCache
+from utils.parse_memo import ParseMemo, first_page_only
+from utils.scenario_utils import search_variant
 from .parser import ResponseParser, SimpleResponseParser
+from .prompts import stable_prompt
+from .routing import stage_llm
 
 
 logger = logging.getLogger(__name__)
 
+# how much of a failed call's body the Caller sees
+MAX_ERROR_CHARS = 1000
+
 
 CALLER_PROMPT = """You are an agent that gets a sequence of API calls and given their documentation, should execute them and return the final response.
 If you cannot complete them and run into issues, you should explain the issue. If you're able to resolve an API call, you can retry the API call. When interacting with API objects, you should extract ids for inputs to other API calls but ids and names for outputs returned to the User.
 Your task is to complete the corresponding api calls according to the plan.
-
-
-Here is documentation on the API:
-Base url: {api_url}
-Endpoints:
-{api_docs}
+The documentation of the API is given right before the background and the plan.
 
 If the API path contains "{{}}", it means that it is a variable and you should replace it with the appropriate value. For example, if the path is "/users/{{user_id}}/tweets", you should replace "{{user_id}}" with the user id. "{{" and "}}" cannot appear in the url.
 
@@ -100,6 +102,12 @@ The execution result should satisfy the following conditions:
 4. if calling a jenkins url, please  include username and token in the request url:
    `username`: `123`
    `token`: `113e5051d99d2857e9ce99981531101ada`
+
+Here is documentation on the API:
+Base url: {api_url}
+Endpoints:
+{api_docs}
+
 Begin!
 
 Background: {background}
@@ -119,10 +127,12 @@ class Caller(Chain):
     early_stopping_method: str = "force"
     simple_parser: bool = False
     with_response: bool = False
+    entity_cache: Optional[EntityCache] = None
+    parse_memo: Optional[ParseMemo] = None
     output_key: str = "result"
 
-    def __init__(self, llm: BaseLLM, plan_llm: BaseLLM, api_spec: ReducedOpenAPISpec, scenario: str, requests_wrapper: RequestsWrapper, simple_parser: bool = False, with_response: bool = False) -> None:
-        super().__init__(llm=llm, plan_llm=plan_llm, api_spec=api_spec, scenario=scenario, requests_wrapper=requests_wrapper, simple_parser=simple_parser, with_response=with_response)
+    def __init__(self, llm: BaseLLM, plan_llm: BaseLLM, api_spec: ReducedOpenAPISpec, scenario: str, requests_wrapper: RequestsWrapper, simple_parser: bool = False, with_response: bool = False, entity_cache: Optional[EntityCache] = None, parse_memo: Optional[ParseMemo] = None) -> None:
+        super().__init__(llm=llm, plan_llm=plan_llm, api_spec=api_spec, scenario=scenario, requests_wrapper=requests_wrapper, simple_parser=simple_parser, with_response=with_response, entity_cache=entity_cache, parse_memo=parse_memo)
 
     @property
     def _chain_type(self) -> str:
@@ -210,7 +220,15 @@ class Caller(Chain):
                     action_input = action_input.split(stop_token)[0]
 
             action_input = action_input.strip().strip('`')
-            action_input = fix_json_error(action_input)
+            try:
+                repaired = repair_json(action_input)
+            except JSONRepairError as e:
+                logger.info(f"JSON repair: could not repair the operation input: {e}")
+            else:
+                if repaired.repairs:
+                    # fixed here rather than by another Caller iteration
+                    logger.info(f"JSON repair: {repaired.summary()}")
+                    action_input = repaired.text
             
             return action, action_input
         
@@ -230,42 +248,69 @@ class Caller(Chain):
         desc = data.get("description", "No description")
         query = data.get("output_instructions", None)
 
-        params, request_body = None, None
+        params, request_body, page_stream = None, None, None
         if action == "GET":
-            if 'params' in data:
-                params = data.get("params")
-                response = self.requests_wrapper.get(data.get("url"), params=params)
+            # let the server trim the response: page size, projection, sub-resources, filters
+            matched_endpoints = get_matched_endpoint(self.api_spec, f"GET {data.get('url')}")
+            endpoint = self.api_spec.get_endpoint(matched_endpoints[0]) if matched_endpoints else None
+            param_names = list(endpoint.param_names) if endpoint is not None else []
+            pushdown = default_pushdown()
+            requested_params = data.get("params")
+            params, pushed = pushdown.rewrite(
+                data.get("url"), requested_params, query, param_names,
+                docs=endpoint.frozen_docs if endpoint is not None and "fields" in param_names else None,
+            )
+            if isinstance(self.requests_wrapper, PooledRequestsWrapper):
+                # list endpoints: keep the response headers so further pages can be followed on demand
+                page_stream = PageStream.open(
+                    self.requests_wrapper, data.get("url"), params,
+                    param_names=param_names, exhaustive=needs_all_pages(query),
+                )
+                response = page_stream.first_text
+                transferred = page_stream.bytes
             else:
-                response = self.requests_wrapper.get(data.get("url"))
+                response = self.requests_wrapper.get(data.get("url"), params=params)
+                transferred = len(response.encode('utf-8')) if isinstance(response, str) else len(response.content)
+            baseline = None
+            if pushed and pushdown.measure:
+                baseline = len(self.requests_wrapper.get(data.get("url"), params=requested_params).encode('utf-8'))
+            pushdown.record(data.get("url"), pushed, transferred, baseline)
         elif action == "POST":
             params = data.get("params")
             request_body = data.get("data")
-            response = self.requests_wrapper.post(data["url"], params=params, data=request_body)
+            response = self._send("POST", data["url"], params=params, data=request_body)
         elif action == "PUT":
             params = data.get("params")
             request_body = data.get("data")
-            response = self.requests_wrapper.put(data["url"], params=params, data=request_body)
+            response = self._send("PUT", data["url"], params=params, data=request_body)
         elif action == "DELETE":
             params = data.get("params")
             request_body = data.get("data")
-            response = self.requests_wrapper.delete(data["url"], params=params, json=request_body)
+            response = self._send("DELETE", data["url"], params=params, json=request_body)
         elif action == "PATCH":
             params = data.get("params")
             request_body = data.get("data")
-            response = self.requests_wrapper.patch(data["url"], params=params, data=request_body)
+            response = self._send("PATCH", data["url"], params=params, data=request_body)
         else:
             raise NotImplementedError
         
+        # None when the wrapper only gives the text
+        status_code = page_stream.status_code if page_stream is not None else None
         if isinstance(response, requests.models.Response):
-            if response.status_code != 200:
-                return response.text
+            status_code = response.status_code
             response_text = response.text
         elif isinstance(response, str):
             response_text = response
         else:
             raise NotImplementedError
         logger.info(f"response_text is {response_text}")
-        return response_text, params, request_body, desc, query
+        return response_text, params, request_body, desc, query, page_stream, status_code
+
+    def _send(self, method: str, url: str, **kwargs: Any) -> Union[requests.Response, str]:
+        """The response object if the wrapper can return it (so its status is kept), else its text."""
+        if isinstance(self.requests_wrapper, PooledRequestsWrapper):
+            return self.requests_wrapper.response(method, url, **kwargs)
+        return getattr(self.requests_wrapper, method.lower())(url, **kwargs)
     
     def _call(self, inputs: Dict[str, str]) -> Dict[str, str]:
         iterations = 0
@@ -276,11 +321,11 @@ class Caller(Chain):
         api_plan = inputs['api_plan']
         api_url = self.api_spec.servers[0]['url']
         matched_endpoints = get_matched_endpoint(self.api_spec, api_plan)
-        endpoint_docs_by_name = {name: docs for name, _, docs in self.api_spec.endpoints}
         api_doc_for_caller = ""
         assert len(matched_endpoints) == 1, f"Found {len(matched_endpoints)} matched endpoints, but expected 1."
         endpoint_name = matched_endpoints[0]
-        tmp_docs = deepcopy(endpoint_docs_by_name.get(endpoint_name))
+        # Endpoint.docs decodes a private copy, so it can be trimmed in place
+        tmp_docs = self.api_spec.get_endpoint(endpoint_name).docs
         
         # === FIX 2: 安全地提取 Response Schema (修复 KeyError) ===
         if 'responses' in tmp_docs and 'content' in tmp_docs['responses']:
@@ -298,19 +343,16 @@ class Caller(Chain):
         if not self.with_response and 'responses' in tmp_docs:
             tmp_docs.pop("responses")
         tmp_docs = yaml.dump(tmp_docs)
-        encoder = tiktoken.encoding_for_model('text-davinci-003')
+        encoder = get_encoder()
         encoded_docs = encoder.encode(tmp_docs)
         if len(encoded_docs) > 1500:
             tmp_docs = encoder.decode(encoded_docs[:1500])
         api_doc_for_caller += f"== Docs for {endpoint_name} == \n{tmp_docs}\n"
 
-        caller_prompt = PromptTemplate(
-            template=CALLER_PROMPT,
-            partial_variables={
-                "api_url": api_url,
-                "api_docs": api_doc_for_caller,
-            },
-            input_variables=["api_plan", "background", "agent_scratchpad"],
+        # instructions first, then the endpoint's docs, then background and plan: see model/prompts.py
+        caller_prompt = stable_prompt(
+            "caller", CALLER_PROMPT, ["api_plan", "background", "agent_scratchpad"],
+            api_url=api_url, api_docs=api_doc_for_caller,
         )
         
         caller_chain = LLMChain(llm=self.llm, prompt=caller_prompt)
@@ -329,13 +371,23 @@ class Caller(Chain):
                 return {"result": action_input}
             else:
                 logger.info(f"executing operation {action}, task is {action_input}")
-            response, params, request_body, desc, query = self._get_response(action, action_input)
+            response, params, request_body, desc, query, page_stream, status_code = self._get_response(action, action_input)
+            if status_code is not None and not 200 <= status_code < 300:
+                # a failed call is not a result: the Caller sees the error, and nothing is parsed, memoized or learned
+                logger.info(f"Caller: {action} returned {status_code}")
+                intermediate_steps.append((caller_chain_output, f"The call failed with status {status_code}: {response[:MAX_ERROR_CHARS]}"))
+                iterations += 1
+                time_elapsed = time.time() - start_time
+                continue
 
             called_endpoint_name = action + ' ' + json.loads(action_input)['url']
             called_endpoint_name = get_matched_endpoint(self.api_spec, called_endpoint_name)[0]
             api_path = api_url + called_endpoint_name.split(' ')[-1]
-            api_doc_for_parser = endpoint_docs_by_name.get(called_endpoint_name)
+            called_endpoint = self.api_spec.get_endpoint(called_endpoint_name)
+            # read-only and shared: the parser never gets a copy of its own
+            api_doc_for_parser = called_endpoint.frozen_docs
             if self.scenario == 'spotify' and endpoint_name == "GET /search":
+                search_type = None
                 if params is not None and 'type' in params:
                     search_type = params['type'] + 's'
                 else:
@@ -344,27 +396,43 @@ class Caller(Chain):
                         if 'type=' in param:
                             search_type = param.split('=')[-1] + 's'
                             break
-                api_doc_for_parser['responses']['content']['application/json']["schema"]['properties'] = {search_type: api_doc_for_parser['responses']['content']['application/json']["schema"]['properties'][search_type]}
-
-            if not self.simple_parser:
-                response_parser = ResponseParser(
-                    llm=self.llm,
-                    api_path=api_path,
-                    api_doc=api_doc_for_parser,
-                )
-            else:
-                response_parser = SimpleResponseParser(
-                    llm=self.llm,
-                    api_path=api_path,
-                    api_doc=api_doc_for_parser,
-                )
+                # the schema narrowed to this type was derived at load time (scenario_utils.add_search_variants)
+                api_doc_for_parser = called_endpoint.variant(search_variant(search_type)) or api_doc_for_parser
 
             params_or_data = {
                 "params": params if params is not None else "No parameters",
                 "data": request_body if request_body is not None else "No request body",
             }
-            parsing_res = response_parser.run(query=query, response_description=desc, api_param=params_or_data, json=response)
+            # the same response, query and parameters parse to the same result: see utils/parse_memo.py
+            memo_key = None
+            parsing_res = None
+            if self.parse_memo is not None and first_page_only(page_stream):
+                memo_key = self.parse_memo.key(("simple " if self.simple_parser else "") + api_path, response, query, params_or_data)
+                parsing_res = self.parse_memo.get(memo_key)
+                if parsing_res is not None:
+                    logger.info(f"Parse memo: hit for {api_path}")
+
+            if parsing_res is None:
+                if not self.simple_parser:
+                    response_parser = ResponseParser(
+                        llm=stage_llm(self.llm, "parser"),
+                        api_path=api_path,
+                        api_doc=api_doc_for_parser,
+                        query=query,
+                    )
+                else:
+                    response_parser = SimpleResponseParser(
+                        llm=stage_llm(self.llm, "parser"),
+                        api_path=api_path,
+                        api_doc=api_doc_for_parser,
+                    )
+                parsing_res = response_parser.run(query=query, response_description=desc, api_param=params_or_data, json=response, pages=page_stream)
+                if memo_key is not None and parsing_res.strip() and first_page_only(page_stream):
+                    self.parse_memo.put(memo_key, parsing_res, api_path)
             logger.info(f"Parser: {parsing_res}")
+            if self.entity_cache is not None and action == "GET":
+                # remember the names this response resolved for later queries
+                self.entity_cache.learn(json.loads(action_input)['url'], params, response, route=called_endpoint.path)
 
             intermediate_steps.append((caller_chain_output, parsing_res))
 
@@ -1,7 +1,10 @@
 import json
+import time
 import logging
-from typing import Any, Dict, List, Optional
-import sys
+import threading
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
 from io import StringIO
 
 from pydantic import BaseModel, Field, Extra
@@ -10,16 +13,28 @@ import tiktoken
 
 from langchain.chains.base import Chain
 from langchain.chains.llm import LLMChain
-from langchain.prompts.prompt import PromptTemplate
+from langchain.prompts.base import BasePromptTemplate
 from langchain.llms.base import BaseLLM
 
-from utils import simplify_json
+from utils import simplify_json, get_encoder
+from utils.columnar import HELPERS_DOC, parser_helpers
+from utils.resilience import race
+from utils.schema_index import schema_index
+
+from .prompts import stable_prompt
+from .routing import stage_llm, record_outcome
 
 logger = logging.getLogger(__name__)
 
 RESPONSE_SCHEMA_MAX_LENGTH = 5000
+# tokens of response schema in the code prompts: the whole schema up to SCHEMA_MAX_TOKENS,
+# or, when the parser knows its query, the fields relevant to it within QUERY_SCHEMA_MAX_TOKENS
+SCHEMA_MAX_TOKENS = 2500
+QUERY_SCHEMA_MAX_TOKENS = 1200
 
 
+# Each template starts with its fixed instructions, followed by what is fixed for the
+# endpoint (path, description, schema) and only then the values of the call; see model/prompts.py.
 CODE_PARSING_SCHEMA_TEMPLATE = """Here is an API response schema from an OAS and a query. 
 The API's response will follow the schema and be a JSON. 
 Assume you are given a JSON response which is stored in a python dict variable called 'data', your task is to generate Python code to extract information I need from the API response.
@@ -31,11 +46,16 @@ The example result format are:
 "The movies directed by Wong Kar-Wai are In the Mood for Love (843), My Blueberry Nights (1989), Chungking Express (11104)"
 Note you should generate only Python code.
 DO NOT use fields that are not in the response schema.
+""" + HELPERS_DOC + """
+
+The code you generate should satisfy the following requirements:
+1. The code you generate should contain the filter in the query. For example, if the query is "what is the name and id of the director of this movie" and the response is the cast and crew for the movie, instead of directly selecting the first result in the crew list (director_name = data['crew'][0]['name']), the code you generate should have a filter for crews where the job is a "Director" (item['job'] == 'Director').
+2. If the response is something about X, e.g., the movies credits of Lee Chang-dong, then the filter condition cannot include searching for X (e.g., Lee Chang-dong). For example, the API response is the movie credits of Akira Kurosawa and the instruction is what are the ids of the movies directed by him. Then the your code should not contain "movie['title'] == 'Akira Kurosawa'" or "movie['name'] == 'Akira Kurosawa'"
+3. Do not use f-string in the print function. Use "format" instead. For example, use "print('The release date of the album is {{}}'.format(date))" instead of "print(f'The release date of the album is {{date}}')
+4. Please print the final result as brief as possible. If the result is a list, just print it in one sentence. Do not print each item in a new line.
 
 API: {api_path}
 API description: {api_description}
-Parameters or body for this API call:
-{api_param}
 
 Response JSON schema defined in the OAS:
 {response_schema}
@@ -43,16 +63,13 @@ Response JSON schema defined in the OAS:
 Example:
 {response_example}
 
+Parameters or body for this API call:
+{api_param}
+
 The response is about: {response_description}
 
 Query: {query}
 
-The code you generate should satisfy the following requirements:
-1. The code you generate should contain the filter in the query. For example, if the query is "what is the name and id of the director of this movie" and the response is the cast and crew for the movie, instead of directly selecting the first result in the crew list (director_name = data['crew'][0]['name']), the code you generate should have a filter for crews where the job is a "Director" (item['job'] == 'Director').
-2. If the response is something about X, e.g., the movies credits of Lee Chang-dong, then the filter condition cannot include searching for X (e.g., Lee Chang-dong). For example, the API response is the movie credits of Akira Kurosawa and the instruction is what are the ids of the movies directed by him. Then the your code should not contain "movie['title'] == 'Akira Kurosawa'" or "movie['name'] == 'Akira Kurosawa'"
-3. Do not use f-string in the print function. Use "format" instead. For example, use "print('The release date of the album is {{}}'.format(date))" instead of "print(f'The release date of the album is {{date}}')
-4. Please print the final result as brief as possible. If the result is a list, just print it in one sentence. Do not print each item in a new line.
-
 Begin!
 Python Code:
 """
@@ -66,15 +83,17 @@ The example result format are:
 "The id of the person is 12345"
 Note you should generate only Python code.
 DO NOT use fields that are not in the response schema.
+""" + HELPERS_DOC + """
 
 API: {api_path}
 API description: {api_description}
-Parameters for this API call:
-{api_param}
 
 Response JSON schema defined in the OAS:
 {response_schema}
 
+Parameters for this API call:
+{api_param}
+
 JSON snippet:
 {json}
 
@@ -82,7 +101,10 @@ Query: {query}
 Python Code:
 """
 
-LLM_PARSING_TEMPLATE = """Here is an API JSON response with its corresponding API description:
+LLM_PARSING_TEMPLATE = """Here is an API JSON response with its corresponding API description.
+Your task is to extract some information from it according to the instructions given after the response.
+When working with API objects, you should usually use ids over names.
+If the response indicates an error, you should instead output a summary of the error.
 
 API: {api_path}
 API description: {api_description}
@@ -95,14 +117,15 @@ JSON response:
 The response is about: {response_description}
 
 ====
-Your task is to extract some information according to these instructions: {query}
-When working with API objects, you should usually use ids over names.
-If the response indicates an error, you should instead output a summary of the error.
+Instructions: {query}
 
 Output:
 """
 
-LLM_SUMMARIZE_TEMPLATE = """Here is an API JSON response with its corresponding API description:
+LLM_SUMMARIZE_TEMPLATE = """Here is an API JSON response with its corresponding API description.
+Your task is to extract some information from it according to the instructions given after the response.
+If the response does not contain the needed information, you should translate the response JSON into natural language.
+If the response indicates an error, you should instead output a summary of the error.
 
 API: {api_path}
 API description: {api_description}
@@ -115,9 +138,7 @@ JSON response:
 The response is about: {response_description}
 
 ====
-Your task is to extract some information according to these instructions: {query}
-If the response does not contain the needed information, you should translate the response JSON into natural language.
-If the response indicates an error, you should instead output a summary of the error.
+Instructions: {query}
 
 Output:
 """
@@ -161,27 +182,121 @@ class PythonREPL(BaseModel):
 
     def run(self, command: str) -> str:
         """Run command with own globals/locals and returns anything printed."""
-        old_stdout = sys.stdout
-        sys.stdout = mystdout = StringIO()
+        # the command gets its own `print` rather than a swapped sys.stdout, which is process-wide:
+        # parsers run concurrently (service workers, parser races) and would capture each other's output
+        mystdout = StringIO()
+
+        def _print(*args: Any, **kwargs: Any) -> None:
+            kwargs.setdefault("file", mystdout)
+            print(*args, **kwargs)
+
+        self.globals["print"] = _print
         try:
             exec(command, self.globals, self.locals)
-            sys.stdout = old_stdout
             output = mystdout.getvalue()
         except Exception as e:
-            sys.stdout = old_stdout
             print(str(e))
             output = None
         return output
 
 
+def valid_output(output: Optional[str]) -> bool:
+    return output is not None and bool(output.strip())
+
+
+def _is_set(event: Optional[threading.Event]) -> bool:
+    return event is not None and event.is_set()
+
+
+@dataclass
+class ParserRacePolicy:
+    # race the schema code against LLM extraction; off keeps the sequential code -> retry -> LLM order
+    enabled: bool = False
+    # races remembered per endpoint
+    window: int = 20
+    min_samples: int = 5
+    # an endpoint whose code wins at least this share runs the code alone (LLM extraction as fallback) ...
+    code_first_rate: float = 0.8
+    # ... and one whose code wins at most this share runs the LLM extraction alone (code as fallback)
+    llm_first_rate: float = 0.2
+    # every n-th call of a settled endpoint races anyway, so its choice can change
+    explore_every: int = 10
+
+    @classmethod
+    def from_config(cls, config: Any) -> "ParserRacePolicy":
+        """From the `parser_racing` config value: a bool or the fields of this class."""
+        if isinstance(config, bool):
+            return cls(enabled=config)
+        return cls(**(config or {}))
+
+
+class ParserStrategies:
+    """Per-endpoint record of which parsing strategy produced the answer, and the mode it implies.
+
+    Modes: "race" (code and LLM extraction concurrently, first valid output
+    wins), "code" (the original sequential order) and "llm" (LLM extraction
+    first). Shared by every parser of the process.
+    """
+
+    def __init__(self, policy: Optional[ParserRacePolicy] = None):
+        self.policy = policy or ParserRacePolicy()
+        self._winners: Dict[str, Deque[Optional[str]]] = defaultdict(lambda: deque(maxlen=self.policy.window))
+        self._calls: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def mode(self, endpoint: str) -> str:
+        policy = self.policy
+        if not policy.enabled:
+            return "code"
+        with self._lock:
+            self._calls[endpoint] += 1
+            calls = self._calls[endpoint]
+            winners = [winner for winner in self._winners.get(endpoint, ()) if winner is not None]
+        if len(winners) < policy.min_samples or calls % policy.explore_every == 0:
+            return "race"
+        code_rate = winners.count("code") / len(winners)
+        if code_rate >= policy.code_first_rate:
+            return "code"
+        if code_rate <= policy.llm_first_rate:
+            return "llm"
+        return "race"
+
+    def record(self, endpoint: str, winner: Optional[str]) -> None:
+        if not self.policy.enabled:
+            return
+        with self._lock:
+            self._winners[endpoint].append(winner)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                endpoint: {"code": winners.count("code"), "llm": winners.count("llm"), "neither": winners.count(None)}
+                for endpoint, winners in self._winners.items()
+            }
+
+
+_default_parser_strategies: Optional[ParserStrategies] = None
+_default_parser_strategies_lock = threading.Lock()
+
+
+def default_parser_strategies() -> ParserStrategies:
+    global _default_parser_strategies
+    if _default_parser_strategies is None:
+        with _default_parser_strategies_lock:
+            if _default_parser_strategies is None:
+                _default_parser_strategies = ParserStrategies()
+    return _default_parser_strategies
+
+
 class ResponseParser(Chain):
     """Implements Program-Aided Language Models."""
 
     llm: BaseLLM
-    code_parsing_schema_prompt: PromptTemplate = None
-    code_parsing_response_prompt: PromptTemplate = None
-    llm_parsing_prompt: PromptTemplate = None
-    postprocess_prompt: PromptTemplate = None
+    api_path: str = ""
+    code_parsing_schema_prompt: BasePromptTemplate = None
+    code_parsing_response_prompt: BasePromptTemplate = None
+    llm_parsing_prompt: BasePromptTemplate = None
+    postprocess_prompt: BasePromptTemplate = None
     python_globals: Optional[Dict[str, Any]] = None
     python_locals: Optional[Dict[str, Any]] = None
     encoder: tiktoken.Encoding = None
@@ -192,17 +307,14 @@ class ResponseParser(Chain):
     return_intermediate_steps: bool = False
 
 
-    def __init__(self, llm: BaseLLM, api_path: str, api_doc: Dict, with_example: bool = False) -> None:
+    def __init__(self, llm: BaseLLM, api_path: str, api_doc: Dict, with_example: bool = False,
+                 query: Optional[str] = None) -> None:
         if 'responses' not in api_doc or 'content' not in api_doc['responses']:
-            llm_parsing_prompt = PromptTemplate(
-                template=LLM_SUMMARIZE_TEMPLATE,
-                partial_variables={
-                    "api_path": api_path,
-                    "api_description": api_doc.get('description', api_doc.get('summary', '')),
-                },
-                input_variables=["query", "json", "api_param", "response_description"]
+            llm_parsing_prompt = stable_prompt(
+                "parser_llm", LLM_SUMMARIZE_TEMPLATE, ["query", "json", "api_param", "response_description"],
+                api_path=api_path, api_description=api_doc.get('description', api_doc.get('summary', '')),
             )
-            super().__init__(llm=llm, llm_parsing_prompt=llm_parsing_prompt)
+            super().__init__(llm=llm, api_path=api_path, llm_parsing_prompt=llm_parsing_prompt)
             return
 
         # === FIX: 智能 Schema 提取 (兼容 Array 和 Object) ===
@@ -213,65 +325,37 @@ class ResponseParser(Chain):
             target_content = api_doc['responses']['content']['application/json; charset=utf-8']
         
         response_schema = "{}" # 默认值
+        encoder = get_encoder()
         if target_content and 'schema' in target_content:
-            schema = target_content['schema']
-            
-            if 'properties' in schema:
-                final_schema = schema['properties']
-            elif 'items' in schema:
-                if 'properties' in schema['items']:
-                    final_schema = [schema['items']['properties']]
-                else:
-                    final_schema = [schema['items']]
-            else:
-                final_schema = schema
-            
-            response_schema = json.dumps(final_schema, indent=4)
-        encoder = tiktoken.encoding_for_model('text-davinci-003')
-        encoded_schema = encoder.encode(response_schema)
-        max_schema_length = 2500
-        if len(encoded_schema) > max_schema_length:
-            response_schema = encoder.decode(encoded_schema[:max_schema_length]) + '...'
-        # if len(response_schema) > RESPONSE_SCHEMA_MAX_LENGTH:
-        #     response_schema = response_schema[:RESPONSE_SCHEMA_MAX_LENGTH] + '...'
+            # only the fields relevant to the query when the whole schema is too long (see utils/schema_index.py)
+            index = schema_index(api_path, target_content['schema'], encoder)
+            max_schema_length = QUERY_SCHEMA_MAX_TOKENS if query and index.root is not None else SCHEMA_MAX_TOKENS
+            response_schema, n_fields = index.render(query, max_schema_length)
+            if n_fields < len(index.fields):
+                logger.info(f"Schema: {api_path} kept {n_fields} of {len(index.fields)} fields")
         if with_example and 'examples' in api_doc['responses']['content']['application/json']:
             response_example = simplify_json(api_doc['responses']['content']['application/json']["examples"]['response']['value'])
             response_example = json.dumps(response_example, indent=4)
         else:
             response_example = "No example provided"
-        code_parsing_schema_prompt = PromptTemplate(
-            template=CODE_PARSING_SCHEMA_TEMPLATE,
-            partial_variables={
-                "api_path": api_path,
-                "api_description": api_doc.get('description', api_doc.get('summary', '')),
-                "response_schema": response_schema,
-                "response_example": response_example,
-            },
-            input_variables=["query", "response_description", "api_param"]
-        )
-        code_parsing_response_prompt = PromptTemplate(
-            template=CODE_PARSING_RESPONSE_TEMPLATE,
-            partial_variables={
-                "api_path": api_path,
-                "api_description": api_doc.get('description', api_doc.get('summary', '')),
-                "response_schema": response_schema,
-            },
-            input_variables=["query", "json", "api_param"]
+        api_description = api_doc.get('description', api_doc.get('summary', ''))
+        code_parsing_schema_prompt = stable_prompt(
+            "parser_code", CODE_PARSING_SCHEMA_TEMPLATE, ["query", "response_description", "api_param"],
+            api_path=api_path, api_description=api_description,
+            response_schema=response_schema, response_example=response_example,
         )
-        llm_parsing_prompt = PromptTemplate(
-            template=LLM_PARSING_TEMPLATE,
-            partial_variables={
-                "api_path": api_path,
-                "api_description": api_doc.get('description', api_doc.get('summary', '')),
-            },
-            input_variables=["query", "json", "api_param", "response_description"]
+        code_parsing_response_prompt = stable_prompt(
+            "parser_code_retry", CODE_PARSING_RESPONSE_TEMPLATE, ["query", "json", "api_param"],
+            api_path=api_path, api_description=api_description, response_schema=response_schema,
         )
-        postprocess_prompt = PromptTemplate(
-            template=POSTPROCESS_TEMPLATE,
-            input_variables=["truncated_str"]
+        llm_parsing_prompt = stable_prompt(
+            "parser_llm", LLM_PARSING_TEMPLATE, ["query", "json", "api_param", "response_description"],
+            api_path=api_path, api_description=api_description,
         )
+        postprocess_prompt = stable_prompt("parser_postprocess", POSTPROCESS_TEMPLATE, ["truncated_str"])
 
         super().__init__(llm=llm, 
+                         api_path=api_path,
                          code_parsing_schema_prompt=code_parsing_schema_prompt, 
                          code_parsing_response_prompt=code_parsing_response_prompt, 
                          llm_parsing_prompt=llm_parsing_prompt, 
@@ -303,56 +387,115 @@ class ResponseParser(Chain):
 
     def _call(self, inputs: Dict[str, str]) -> Dict[str, str]:
         if self.code_parsing_schema_prompt is None or inputs['query'] is None:
-            extract_code_chain = LLMChain(llm=self.llm, prompt=self.llm_parsing_prompt)
+            extract_code_chain = LLMChain(llm=stage_llm(self.llm, "parser_llm"), prompt=self.llm_parsing_prompt)
             output = extract_code_chain.predict(query=inputs['query'], json=inputs['json'], api_param=inputs['api_param'], response_description=inputs['response_description'])
             return {"result": output}
-        
-        extract_code_chain = LLMChain(llm=self.llm, prompt=self.code_parsing_schema_prompt)
+
+        strategies = default_parser_strategies()
+        pages = inputs.get("pages")
+        # the LLM only reads the first page: an aggregation over more pages needs the code
+        forced = pages is not None and pages.exhaustive and pages.has_more
+        mode = "code" if forced else strategies.mode(self.api_path)
+        if mode == "race":
+            start_time = time.time()
+            # the LLM extraction reads the first page, the code may fetch more meanwhile
+            first_page = inputs["json"]
+            winner, output = race(
+                {
+                    "code": lambda cancelled: self._parse_with_code(inputs, cancelled),
+                    "llm": lambda cancelled: self._parse_with_llm(inputs, "parser_llm", first_page, cancelled),
+                },
+                is_valid=valid_output,
+            )
+            logger.info(f"Parser race: {self.api_path} won by {winner or 'neither'} in {time.time() - start_time:.2f}s")
+        elif mode == "llm":
+            output = self._parse_with_llm(inputs, "parser_llm", inputs["json"])
+            winner = "llm"
+            if not valid_output(output):
+                output = self._parse_with_code(inputs)
+                winner = "code"
+        else:
+            output = self._parse_with_code(inputs)
+            winner = "code"
+            if not valid_output(output):
+                logger.info("Falling back to LLM parsing")
+                output = self._parse_with_llm(inputs, "parser_llm_fallback", self._response_json(inputs))
+                winner = "llm"
+        if not forced:
+            # only a free choice says which strategy suits the endpoint
+            strategies.record(self.api_path, winner if valid_output(output) else None)
+        output = output or ""
+
+        encoded_output = self.encoder.encode(output)
+        if len(encoded_output) > self.max_output_length:
+            output = self.encoder.decode(encoded_output[:self.max_output_length])
+            logger.info(f"Output too long, truncating to {self.max_output_length} tokens")
+            postprocess_chain = LLMChain(llm=stage_llm(self.llm, "parser_postprocess"), prompt=self.postprocess_prompt)
+            output = postprocess_chain.predict(truncated_str=output)
+
+        return {"result": output}
+
+    @staticmethod
+    def _response_json(inputs: Dict[str, Any]) -> str:
+        pages = inputs.get("pages")
+        return pages.text if pages is not None and pages.pages > 1 else inputs["json"]
+
+    def _parse_with_code(self, inputs: Dict[str, Any], cancelled: Optional[threading.Event] = None) -> Optional[str]:
+        """Code generated from the schema, then (if that printed nothing) from a sample of the response."""
+        if _is_set(cancelled):
+            return None
+        code_llm = stage_llm(self.llm, "parser_code")
+        extract_code_chain = LLMChain(llm=code_llm, prompt=self.code_parsing_schema_prompt)
         code = extract_code_chain.predict(query=inputs['query'], response_description=inputs['response_description'], api_param=inputs['api_param'])
         logger.info(f"Code: \n{code}")
-        json_data = json.loads(inputs["json"])
-        repl = PythonREPL(_globals={"data": json_data})
+        pages = inputs.get("pages")
+        json_data = json.loads(inputs["json"]) if pages is None or pages.data is None else pages.data
+        repl = PythonREPL(_globals={"data": json_data, **parser_helpers()})
         res = repl.run(code)
         output = res
-
-        if output is None or len(output) == 0:
-            extract_code_chain = LLMChain(llm=self.llm, prompt=self.code_parsing_response_prompt)
-            json_data = json.loads(inputs["json"])
-            encoded_json = self.encoder.encode(inputs["json"])
+        # the code only depends on the schema, so it is simply rerun as further pages arrive;
+        # lookups stop at the first page that yields a result, aggregations read every page
+        while pages is not None and (not (output or "").strip() or pages.exhaustive) and not _is_set(cancelled) and pages.fetch_next():
+            output = PythonREPL(_globals={"data": pages.data, **parser_helpers()}).run(code)
+        record_outcome(code_llm, ok=bool(output))
+
+        if (output is None or len(output) == 0) and not _is_set(cancelled):
+            extract_code_chain = LLMChain(llm=stage_llm(self.llm, "parser_code_retry"), prompt=self.code_parsing_response_prompt)
+            json_text = self._response_json(inputs)
+            json_data = json.loads(json_text)
+            encoded_json = self.encoder.encode(json_text)
             if len(encoded_json) > self.max_json_length_1:
                 simplified_json_data = self.encoder.decode(encoded_json[:self.max_json_length_1]) + '...'
             else:
-                simplified_json_data = inputs["json"]
+                simplified_json_data = json_text
             # simplified_json_data = json.dumps(simplify_json(json_data), indent=4)
             code = extract_code_chain.predict(query=inputs['query'], json=simplified_json_data, api_param=inputs['api_param'])
             logger.info(f"Code: \n{code}")
-            repl = PythonREPL(_globals={"data": json_data})
+            repl = PythonREPL(_globals={"data": json_data, **parser_helpers()})
             res = repl.run(code)
             output = res
+        return output
 
-        if output is None or len(output) == 0:
-            extract_code_chain = LLMChain(llm=self.llm, prompt=self.llm_parsing_prompt)
-            if len(encoded_json) > self.max_json_length_2:
-                simplified_json_data = self.encoder.decode(encoded_json[:self.max_json_length_2]) + '...'
-            output = extract_code_chain.predict(query=inputs['query'], json=simplified_json_data, api_param=inputs['api_param'], response_description=inputs['response_description'])
-
-        encoded_output = self.encoder.encode(output)
-        if len(encoded_output) > self.max_output_length:
-            output = self.encoder.decode(encoded_output[:self.max_output_length])
-            logger.info(f"Output too long, truncating to {self.max_output_length} tokens")
-            postprocess_chain = LLMChain(llm=self.llm, prompt=self.postprocess_prompt)
-            output = postprocess_chain.predict(truncated_str=output)
+    def _parse_with_llm(self, inputs: Dict[str, Any], stage: str, json_text: str,
+                        cancelled: Optional[threading.Event] = None) -> Optional[str]:
+        """Ask the LLM to extract the answer from (the start of) the response itself."""
+        # a race already won by the code must not still pay (in tokens and budget) for the model call
+        if _is_set(cancelled):
+            return None
+        extract_code_chain = LLMChain(llm=stage_llm(self.llm, stage), prompt=self.llm_parsing_prompt)
+        encoded_json = self.encoder.encode(json_text)
+        if len(encoded_json) > self.max_json_length_2:
+            json_text = self.encoder.decode(encoded_json[:self.max_json_length_2]) + '...'
+        return extract_code_chain.predict(query=inputs['query'], json=json_text, api_param=inputs['api_param'], response_description=inputs['response_description'])
 
-        return {"result": output}
 
-    
 
 
 class SimpleResponseParser(Chain):
     """Implements Program-Aided Language Models."""
 
     llm: Any
-    llm_parsing_prompt: PromptTemplate = None
+    llm_parsing_prompt: BasePromptTemplate = None
     encoder: tiktoken.Encoding = None
     max_json_length: int = 1000
     output_key: str = "result"
@@ -361,28 +504,20 @@ class SimpleResponseParser(Chain):
 
     def __init__(self, llm: Any, api_path: str, api_doc: Dict, with_example: bool = False) -> None:
         if 'responses' not in api_doc or 'content' not in api_doc['responses']:
-            llm_parsing_prompt = PromptTemplate(
-                template=LLM_SUMMARIZE_TEMPLATE,
-                partial_variables={
-                    "api_path": api_path,
-                    "api_description": api_doc['description'],
-                },
-                input_variables=["query", "json", "api_param", "response_description"]
+            llm_parsing_prompt = stable_prompt(
+                "parser_llm", LLM_SUMMARIZE_TEMPLATE, ["query", "json", "api_param", "response_description"],
+                api_path=api_path, api_description=api_doc['description'],
             )
-            encoder = tiktoken.encoding_for_model('text-davinci-003')
+            encoder = get_encoder()
             super().__init__(llm=llm, llm_parsing_prompt=llm_parsing_prompt, encoder=encoder)
             return
 
-        llm_parsing_prompt = PromptTemplate(
-            template=LLM_PARSING_TEMPLATE,
-            partial_variables={
-                "api_path": api_path,
-                "api_description": api_doc['description'],
-            },
-            input_variables=["query", "json", "api_param", "response_description"]
+        llm_parsing_prompt = stable_prompt(
+            "parser_llm", LLM_PARSING_TEMPLATE, ["query", "json", "api_param", "response_description"],
+            api_path=api_path, api_description=api_doc['description'],
         )
 
-        encoder = tiktoken.encoding_for_model('text-davinci-003')
+        encoder = get_encoder()
 
         super().__init__(llm=llm, llm_parsing_prompt=llm_parsing_prompt, encoder=encoder)
 
@@ -4,9 +4,11 @@ import logging
 logger = logging.getLogger(__name__)
 from langchain.chains.base import Chain
 from langchain.chains.llm import LLMChain
-from langchain.prompts.prompt import PromptTemplate
+from langchain.prompts.base import BasePromptTemplate
 from langchain.llms.base import BaseLLM
 
+from .prompts import stable_prompt
+
 icl_examples = {
     "tmdb": """Example 1:
 User query: give me some movies performed by Tony Leung.
@@ -100,10 +102,12 @@ class Planner(Chain):
     llm: BaseLLM
     scenario: str
     planner_prompt: str
+    prompt: BasePromptTemplate
     output_key: str = "result"
 
     def __init__(self, llm: BaseLLM, scenario: str, planner_prompt=PLANNER_PROMPT) -> None:
-        super().__init__(llm=llm, scenario=scenario, planner_prompt=planner_prompt)
+        prompt = stable_prompt("planner", planner_prompt, ["input", "agent_scratchpad"], icl_examples=icl_examples[scenario])
+        super().__init__(llm=llm, scenario=scenario, planner_prompt=planner_prompt, prompt=prompt)
 
     @property
     def _chain_type(self) -> str:
@@ -148,17 +152,13 @@ class Planner(Chain):
     def _call(self, inputs: Dict[str, str]) -> Dict[str, str]:
         scratchpad = self._construct_scratchpad(inputs['history'])
         # print("Scrachpad: \n", scratchpad)
-        planner_prompt = PromptTemplate(
-            template=self.planner_prompt,
-            partial_variables={
-                "agent_scratchpad": scratchpad,
-                "icl_examples": icl_examples[self.scenario],
-            },
-            input_variables=["input"]
-        )
-        planner_chain = LLMChain(llm=self.llm, prompt=planner_prompt)
-        logger.info(f"planner received input: {inputs["input"]}")
-        planner_chain_output = planner_chain.run(input=inputs['input'])
+        planner_chain = LLMChain(llm=self.llm, prompt=self.prompt)
+        logger.info(f"planner received input: {inputs['input']}")
+        query = inputs['input']
+        if inputs.get('known_entities'):
+            # ids resolved by earlier queries, so the plan can use them instead of searching again
+            query += "\n" + inputs['known_entities']
+        planner_chain_output = planner_chain.run(input=query, agent_scratchpad=scratchpad)
         logger.info(planner_chain_output)
         # planner_chain_output = re.sub(r"Plan step \d+: ", "", planner_chain_output).strip()
 
@@ -0,0 +1,123 @@
+"""Stable-prefix prompt assembly.
+
+Providers cache the longest prefix a prompt shares with their recent
+requests (OpenAI from 1024 tokens on, in 128-token steps), so every stage
+keeps its instructions and examples first, then what is fixed for the
+scenario or endpoint (API list, docs, schema), then the per-call values.
+`stable_prompt` renders everything up to the first per-call variable once
+per stage and static values; each call only appends the rest.
+`PrefixCacheEstimator` tells how many prompt tokens such a cache can serve.
+"""
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from string import Formatter
+from typing import Any, Dict, List, Sequence, Tuple
+
+from langchain.prompts.base import StringPromptTemplate
+
+MAX_CACHED_PROMPTS = 256
+
+
+class StablePrompt(StringPromptTemplate):
+    """A template split into a pre-rendered prefix and a suffix of (static or per-call) segments."""
+
+    stage: str
+    prefix: str
+    # (literal text, variable name or None)
+    suffix: List[Tuple[str, Any]]
+    static_values: Dict[str, str]
+
+    @property
+    def _prompt_type(self) -> str:
+        return "stable_prefix"
+
+    def format(self, **kwargs: Any) -> str:
+        values = {**self.static_values, **kwargs}
+        parts = [self.prefix]
+        for literal, name in self.suffix:
+            parts.append(literal)
+            if name is not None:
+                parts.append(str(values[name]))
+        return "".join(parts)
+
+
+def _build(stage: str, template: str, input_variables: Sequence[str], static_values: Dict[str, str]) -> StablePrompt:
+    prefix: List[str] = []
+    suffix: List[Tuple[str, Any]] = []
+    for literal, name, _, _ in Formatter().parse(template):
+        if suffix:
+            suffix.append((literal, name))
+        elif name in input_variables:
+            prefix.append(literal)
+            suffix.append(("", name))
+        else:
+            prefix.append(literal)
+            if name is not None:
+                prefix.append(str(static_values[name]))
+    return StablePrompt(
+        stage=stage, prefix="".join(prefix), suffix=suffix,
+        static_values=static_values, input_variables=list(input_variables),
+    )
+
+
+_prompts: "OrderedDict[tuple, StablePrompt]" = OrderedDict()
+_prompts_lock = threading.Lock()
+
+
+def stable_prompt(stage: str, template: str, input_variables: Sequence[str], **static_values: str) -> StablePrompt:
+    """The `StablePrompt` for `template` with `static_values` filled in, built once and reused."""
+    key = (stage, template, tuple(input_variables), tuple(sorted(static_values.items())))
+    with _prompts_lock:
+        prompt = _prompts.get(key)
+        if prompt is not None:
+            _prompts.move_to_end(key)
+            return prompt
+    prompt = _build(stage, template, input_variables, static_values)
+    with _prompts_lock:
+        _prompts[key] = prompt
+        while len(_prompts) > MAX_CACHED_PROMPTS:
+            _prompts.popitem(last=False)
+    return prompt
+
+
+class PrefixCacheEstimator:
+    """Estimates the prompt tokens a provider-side prefix cache serves, per model.
+
+    Modelled on OpenAI's prompt caching: a prefix counts once it is at least
+    `min_tokens` long, in steps of `block_tokens`, and was sent to the same
+    model within the last `ttl` seconds.
+    """
+
+    def __init__(self, min_tokens: int = 1024, block_tokens: int = 128, ttl: float = 300.0, max_entries: int = 20000):
+        self.min_tokens = min_tokens
+        self.block_tokens = block_tokens
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._seen: "OrderedDict[Tuple[str, bytes], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, model: str, tokens: Sequence[Any]) -> int:
+        """Record a prompt sent to `model` and return how many of its tokens were cached."""
+        digest = hashlib.blake2b(digest_size=16)
+        boundaries = []
+        for end in range(self.block_tokens, len(tokens) + 1, self.block_tokens):
+            digest.update(",".join(map(str, tokens[end - self.block_tokens:end])).encode())
+            if end >= self.min_tokens:
+                boundaries.append((end, digest.digest()))
+        now = time.monotonic()
+        cached = 0
+        with self._lock:
+            for end, prefix_digest in boundaries:
+                seen = self._seen.get((model, prefix_digest))
+                if seen is None or now - seen > self.ttl:
+                    break
+                cached = end
+            for _, prefix_digest in boundaries:
+                self._seen[(model, prefix_digest)] = now
+                self._seen.move_to_end((model, prefix_digest))
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+        return cached
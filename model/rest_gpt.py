@@ -14,7 +14,14 @@ from langchain.requests import RequestsWrapper
 from .planner import Planner
 from .api_selector import APISelector
 from .caller import Caller
+from .routing import ModelRouter
 from utils import ReducedOpenAPISpec
+from utils.checkpoint import current_checkpoint
+from utils.budget import BudgetExceeded, BudgetPolicy, budget_scope, check_budget
+from utils.resilience import DeadlineExceeded, deadline_scope
+from utils.entity_cache import EntityCache
+from utils.parse_memo import ParseMemo
+from utils.transport import host_key
 
 
 logger = logging.getLogger(__name__)
@@ -29,6 +36,10 @@ class RestGPT(Chain):
     api_selector: APISelector
     scenario: str = "tmdb"
     requests_wrapper: RequestsWrapper
+    model_router: ModelRouter
+    entity_cache: Optional[EntityCache] = None
+    parse_memo: Optional[ParseMemo] = None
+    budget_policy: Optional[BudgetPolicy] = None
     simple_parser: bool = False
     return_intermediate_steps: bool = False
     max_iterations: Optional[int] = 15
@@ -45,6 +56,10 @@ class RestGPT(Chain):
         caller_doc_with_response: bool = False,
         parser_with_example: bool = False,
         simple_parser: bool = False,
+        model_router: Optional[ModelRouter] = None,
+        entity_cache: Optional[EntityCache] = None,
+        parse_memo: Optional[ParseMemo] = None,
+        budget_policy: Optional[BudgetPolicy] = None,
         callback_manager: Optional[BaseCallbackManager] = None,
         **kwargs: Any,
     ) -> None:
@@ -55,13 +70,17 @@ class RestGPT(Chain):
         # if scenario not in ['tmdb', 'spotify']:
         #     raise ValueError(f"Invalid scenario {scenario}")
         
-        planner = Planner(llm=planner_llm, scenario=scenario)
-        api_selector = APISelector(llm=tool_llm, scenario=scenario, api_spec=api_spec)
+        # the planner model by default only plans; tool stages are escalated to it per call
+        if model_router is None:
+            model_router = ModelRouter(small_llm=tool_llm, large_llm=planner_llm)
+        planner = Planner(llm=model_router.llm("planner"), scenario=scenario)
+        api_selector = APISelector(llm=model_router.llm("api_selector"), scenario=scenario, api_spec=api_spec)
 
         super().__init__(
             planner_llm=planner_llm, tool_llm = tool_llm,
             api_spec=api_spec, planner=planner, api_selector=api_selector, scenario=scenario,
-            requests_wrapper=requests_wrapper, simple_parser=simple_parser, callback_manager=callback_manager, **kwargs
+            requests_wrapper=requests_wrapper, model_router=model_router, entity_cache=entity_cache, parse_memo=parse_memo,
+            budget_policy=budget_policy or BudgetPolicy(), simple_parser=simple_parser, callback_manager=callback_manager, **kwargs
         )
 
     def save(self, file_path: Union[Path, str]) -> None:
@@ -116,10 +135,11 @@ class RestGPT(Chain):
             final_output["intermediate_steps"] = intermediate_steps
         return final_output
 
-    def _get_api_selector_background(self, planner_history: List[Tuple[str, str]]) -> str:
-        if len(planner_history) == 0:
+    def _get_api_selector_background(self, planner_history: List[Tuple[str, str]], known_entities: Optional[str] = None) -> str:
+        background = ([known_entities] if known_entities else []) + [step[1] for step in planner_history]
+        if len(background) == 0:
             return "No background"
-        return "\n".join([step[1] for step in planner_history])
+        return "\n".join(background)
 
     def _should_continue_plan(self, plan) -> bool:
         if re.search("Continue", plan):
@@ -136,25 +156,65 @@ class RestGPT(Chain):
         inputs: Dict[str, Any],
         run_manager: Optional[CallbackManagerForChainRun] = None,
     ) -> Dict[str, Any]:
+        # max_execution_time also bounds the LLM and REST calls (timeouts, retries) inside the loop
+        with budget_scope(self.budget_policy) as budget, deadline_scope(self.max_execution_time):
+            planner_history: List[Tuple[str, str]] = []
+            try:
+                return self._plan_and_execute(inputs, planner_history)
+            except (BudgetExceeded, DeadlineExceeded) as e:
+                logger.info(f"RestGPT: stopped after {len(planner_history)} steps: {e}")
+                return {"result": self._partial_answer(planner_history, e)}
+            finally:
+                if budget is not None:
+                    logger.info(f"Budget: used {budget.summary()}")
+
+    def _partial_answer(self, planner_history: List[Tuple[str, str]], reason: Exception) -> str:
+        """The answer of a query stopped early: why, and what the finished steps found."""
+        answer = f"Final Answer: The query was stopped before it finished ({reason})."
+        if not planner_history:
+            return answer + " No results were obtained."
+        steps = "\n".join(f"- {plan.strip()}: {result.strip()}" for plan, result in planner_history)
+        return f"{answer} Partial results:\n{steps}"
+
+    def _plan_and_execute(self, inputs: Dict[str, Any], planner_history: List[Tuple[str, str]]) -> Dict[str, Any]:
         query = inputs['query']
 
-        planner_history: List[Tuple[str, str]] = []
         iterations = 0
         time_elapsed = 0.0
         start_time = time.time()
         logger.info(f"query is {query}")
-        plan = self.planner.run(input=query, history=planner_history)
+        known_entities = None
+        if self.entity_cache is not None:
+            hosts = [host_key(server['url']) for server in self.api_spec.servers]
+            known_entities = self.entity_cache.background(hosts, query)
+        checkpoint = current_checkpoint()
+        state = checkpoint.load() if checkpoint is not None else None
+        # the plan a "Continue" refers back to while its step is under way, and that step's API calls
+        step_plan: Optional[str] = None
+        api_selector_history: List[Tuple[str, str, str]] = []
+        if state is not None:
+            # resume after the last completed step instead of planning it again
+            planner_history.extend(tuple(step) for step in state["planner_history"])
+            api_selector_history.extend(tuple(step) for step in state["api_selector_history"])
+            plan, step_plan, iterations = state["plan"], state["step_plan"], state["iterations"]
+            logger.info(f"RestGPT: resuming after {len(planner_history)} steps")
+        else:
+            plan = self.planner.run(input=query, history=planner_history, known_entities=known_entities)
         logger.info(f"Planner: {plan}")
 
         while self._should_continue(iterations, time_elapsed):
-            tmp_planner_history = [plan]
-            api_selector_history: List[Tuple[str, str, str]] = []
-            api_selector_background = self._get_api_selector_background(planner_history)
-            api_plan = self.api_selector.run(plan=plan, background=api_selector_background)
+            check_budget()
+            api_selector_background = self._get_api_selector_background(planner_history, known_entities)
+            if step_plan is None:
+                step_plan = plan
+                api_selector_history = []
+                api_plan = self.api_selector.run(plan=plan, background=api_selector_background)
+            else:
+                api_plan = self.api_selector.run(plan=step_plan, background=api_selector_background, history=api_selector_history, instruction=plan)
 
             finished = re.match(r"No API call needed.(.*)", api_plan)
             if not finished:
-                executor = Caller(llm=self.tool_llm,plan_llm=self.planner_llm, api_spec=self.api_spec, scenario=self.scenario, simple_parser=self.simple_parser, requests_wrapper=self.requests_wrapper)
+                executor = Caller(llm=self.model_router.llm("caller"), plan_llm=self.planner_llm, api_spec=self.api_spec, scenario=self.scenario, simple_parser=self.simple_parser, requests_wrapper=self.requests_wrapper, entity_cache=self.entity_cache, parse_memo=self.parse_memo)
                 execution_res = executor.run(api_plan=api_plan, background=api_selector_background)
             else:
                 execution_res = finished.group(1)
@@ -162,30 +222,19 @@ class RestGPT(Chain):
             planner_history.append((plan, execution_res))
             api_selector_history.append((plan, api_plan, execution_res))
 
-            plan = self.planner.run(input=query, history=planner_history)
+            plan = self.planner.run(input=query, history=planner_history, known_entities=known_entities)
             logger.info(f"Planner: {plan}")
 
-            while self._should_continue_plan(plan):
-                api_selector_background = self._get_api_selector_background(planner_history)
-                api_plan = self.api_selector.run(plan=tmp_planner_history[0], background=api_selector_background, history=api_selector_history, instruction=plan)
-                
-                finished = re.match(r"No API call needed.(.*)", api_plan)
-                if not finished:
-                    executor = Caller(llm=self.tool_llm, plan_llm=self.planner_llm, api_spec=self.api_spec, scenario=self.scenario, simple_parser=self.simple_parser, requests_wrapper=self.requests_wrapper)
-                    execution_res = executor.run(api_plan=api_plan, background=api_selector_background)
-                else:
-                    execution_res = finished.group(1)
-
-                planner_history.append((plan, execution_res))
-                api_selector_history.append((plan, api_plan, execution_res))
-
-                plan = self.planner.run(input=query, history=planner_history)
-                logger.info(f"Planner: {plan}")
-
-            if self._should_end(plan):
-                break
-
-            iterations += 1
-            time_elapsed = time.time() - start_time
+            if not self._should_continue_plan(plan):
+                if self._should_end(plan):
+                    break
+                step_plan = None
+                iterations += 1
+                time_elapsed = time.time() - start_time
+            if checkpoint is not None:
+                checkpoint.save({
+                    "planner_history": planner_history, "plan": plan, "step_plan": step_plan,
+                    "iterations": iterations, "api_selector_history": api_selector_history,
+                })
 
         return {"result": plan}
@@ -0,0 +1,222 @@
+"""Per-call model routing between the planner LLM and the tool LLM.
+
+Every stage talks to a `RoutedLLM`, which asks the shared `ModelRouter`
+which of the two models to use for this particular prompt. The decision
+depends on the stage, the prompt size and how often the stage failed
+recently; each call is logged with its latency, token counts and, if prices
+are configured, its cost, so the policy can be tuned from the logs.
+"""
+
+import time
+import logging
+import threading
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, FrozenSet, List, Optional, Tuple
+
+from langchain.callbacks.manager import CallbackManagerForLLMRun
+from langchain.llms.base import LLM, BaseLLM
+
+from utils import get_encoder
+from utils.budget import current_budget
+from utils.resilience import CircuitBreakerRegistry, RetryPolicy, attempt_timeout, hedged_call, is_transient_error, retry_call
+from utils.single_flight import SingleFlight
+
+from .prompts import PrefixCacheEstimator
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RoutingPolicy:
+    # stages that always get the large (planner) model
+    large_stages: FrozenSet[str] = frozenset({"planner"})
+    # second attempts after the small model's code returned nothing
+    escalation_stages: FrozenSet[str] = frozenset({"parser_code_retry", "parser_llm_fallback"})
+    # prompts longer than this go to the large model; None disables the check
+    max_small_prompt_tokens: Optional[int] = None
+    # a stage whose recent failure rate reaches this is escalated
+    failure_rate_threshold: float = 0.5
+    failure_window: int = 20
+    min_failure_samples: int = 5
+    # model_name -> (USD per 1k prompt tokens, USD per 1k completion tokens)
+    prices: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    # transient LLM errors are retried this often (with jittered backoff, within the query deadline)
+    max_attempts: int = 3
+    # start a duplicate request when a call takes longer than this many seconds; None disables hedging
+    hedge_after: Optional[float] = None
+    # provider-side prompt caching, used to report cached-prefix tokens (OpenAI's rules by default)
+    prefix_cache_min_tokens: int = 1024
+    prefix_cache_block_tokens: int = 128
+    prefix_cache_ttl: float = 300.0
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> "RoutingPolicy":
+        """Build from the `model_routing` section of config.yaml (lists instead of sets and tuples)."""
+        config = dict(config or {})
+        for key in ("large_stages", "escalation_stages"):
+            if key in config:
+                config[key] = frozenset(config[key])
+        if "prices" in config:
+            config["prices"] = {name: tuple(price) for name, price in config["prices"].items()}
+        return cls(**config)
+
+
+def model_name(llm: BaseLLM) -> str:
+    return getattr(llm, "model_name", None) or type(llm).__name__
+
+
+def accepts_request_timeout(llm: BaseLLM) -> bool:
+    """Whether `llm` passes a `request_timeout` call argument on to its client (LangChain's OpenAI LLMs)."""
+    return type(llm).__module__.startswith("langchain.llms.openai")
+
+
+class ModelRouter:
+    """Chooses between `small_llm` and `large_llm` per call and keeps per-stage stats.
+
+    Shared by all chains of a `RestGPT` (and all queries of a service), so
+    state is guarded by a lock. Stages feed back success or failure through
+    `record_outcome`; a failure rate at or above the threshold escalates the
+    stage until the calls on the large model bring it back down.
+    """
+
+    def __init__(self, small_llm: BaseLLM, large_llm: BaseLLM, policy: Optional[RoutingPolicy] = None):
+        self.small_llm = small_llm
+        self.large_llm = large_llm
+        self.policy = policy or RoutingPolicy()
+        self._outcomes: Dict[str, Deque[bool]] = defaultdict(lambda: deque(maxlen=self.policy.failure_window))
+        self._stats: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(
+            lambda: {"calls": 0, "prompt_tokens": 0, "cached_prefix_tokens": 0, "completion_tokens": 0, "latency": 0.0, "cost": 0.0}
+        )
+        self._lock = threading.Lock()
+        self.retry_policy = RetryPolicy(max_attempts=self.policy.max_attempts, timeout=None)
+        self.breakers = CircuitBreakerRegistry()
+        # identical prompts in flight at the same time (e.g. from concurrent queries) share one call
+        self.single_flight = SingleFlight()
+        self.prefix_cache = PrefixCacheEstimator(
+            self.policy.prefix_cache_min_tokens, self.policy.prefix_cache_block_tokens, self.policy.prefix_cache_ttl
+        )
+
+    def llm(self, stage: str) -> "RoutedLLM":
+        return RoutedLLM(router=self, stage=stage)
+
+    def failure_rate(self, stage: str) -> Optional[float]:
+        with self._lock:
+            outcomes = list(self._outcomes.get(stage, ()))
+        if len(outcomes) < self.policy.min_failure_samples:
+            return None
+        return outcomes.count(False) / len(outcomes)
+
+    def record_outcome(self, stage: str, ok: bool) -> None:
+        with self._lock:
+            self._outcomes[stage].append(ok)
+
+    def choose(self, stage: str, prompt_tokens: int) -> Tuple[BaseLLM, str]:
+        policy = self.policy
+        if stage in policy.large_stages:
+            return self.large_llm, "stage"
+        if stage in policy.escalation_stages:
+            return self.large_llm, "escalation"
+        if policy.max_small_prompt_tokens is not None and prompt_tokens > policy.max_small_prompt_tokens:
+            return self.large_llm, "prompt_size"
+        failure_rate = self.failure_rate(stage)
+        if failure_rate is not None and failure_rate >= policy.failure_rate_threshold:
+            return self.large_llm, f"failure_rate={failure_rate:.2f}"
+        return self.small_llm, "default"
+
+    def call(self, stage: str, prompt: str, stop: Optional[List[str]] = None, **kwargs: Any) -> str:
+        encoder = get_encoder()
+        tokens = encoder.encode(prompt)
+        prompt_tokens = len(tokens)
+        llm, reason = self.choose(stage, prompt_tokens)
+        name = model_name(llm)
+        cached_prefix_tokens = self.prefix_cache.observe(name, tokens)
+
+        breaker = self.breakers.get(name)
+        budget = current_budget()
+        if budget is not None:
+            budget.charge(llm_calls=1, prompt_tokens=prompt_tokens)
+
+        def attempt() -> str:
+            breaker.before_call()
+            # each attempt may take at most what is left of the query deadline
+            timeout = attempt_timeout(None)
+            call_kwargs = {**kwargs, "request_timeout": timeout} if timeout is not None and accepts_request_timeout(llm) else kwargs
+            try:
+                result = llm(prompt, stop=stop, **call_kwargs)
+            except Exception as e:
+                if is_transient_error(e):
+                    breaker.record_failure()
+                raise
+            breaker.record_success()
+            return result
+
+        start_time = time.time()
+        key = (name, prompt, tuple(stop or ()), repr(sorted(kwargs.items())))
+        output, shared = self.single_flight.do(key, lambda: retry_call(
+            lambda: hedged_call(attempt, self.policy.hedge_after),
+            self.retry_policy,
+            description=f"{stage} on {name}",
+        ))
+        latency = time.time() - start_time
+        completion_tokens = len(encoder.encode(output))
+        if budget is not None:
+            budget.record(completion_tokens=completion_tokens)
+        if shared:
+            logger.info(f"Model router: stage={stage} model={name} reason={reason} coalesced latency={latency:.2f}s")
+            return output
+
+        price = self.policy.prices.get(name)
+        cost = (prompt_tokens * price[0] + completion_tokens * price[1]) / 1000 if price else None
+        with self._lock:
+            stats = self._stats[(stage, name)]
+            stats["calls"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["cached_prefix_tokens"] += cached_prefix_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["latency"] += latency
+            stats["cost"] += cost or 0.0
+        cost_str = f" cost=${cost:.5f}" if cost is not None else ""
+        logger.info(
+            f"Model router: stage={stage} model={name} reason={reason} "
+            f"prompt_tokens={prompt_tokens} cached_prefix_tokens={cached_prefix_tokens} completion_tokens={completion_tokens} latency={latency:.2f}s{cost_str}"
+        )
+        return output
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Totals per `stage/model`, e.g. for a benchmark summary."""
+        with self._lock:
+            return {f"{stage}/{name}": dict(stats) for (stage, name), stats in self._stats.items()}
+
+
+class RoutedLLM(LLM):
+    """LLM facade for one stage; the actual model is picked by the router on every call."""
+
+    router: Any
+    stage: str
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        return self.router.call(self.stage, prompt, stop=stop, **kwargs)
+
+
+def stage_llm(llm: BaseLLM, stage: str) -> BaseLLM:
+    """`llm` re-targeted at `stage` if it is routed; plain LLMs are returned unchanged."""
+    if isinstance(llm, RoutedLLM):
+        return llm.router.llm(stage)
+    return llm
+
+
+def record_outcome(llm: BaseLLM, ok: bool) -> None:
+    """Report whether the output of `llm`'s stage was usable; a no-op for plain LLMs."""
+    if isinstance(llm, RoutedLLM):
+        llm.router.record_outcome(llm.stage, ok)
@@ -1,70 +1,90 @@
 import os
 import json
 import logging
+import argparse
 import time
-import yaml
 
-from langchain.requests import Requests
-from langchain import OpenAI
-
-from utils import reduce_openapi_spec, ColorPrint, MyRotatingFileHandler
-from model import RestGPT
+from utils import load_config, apply_config_env
+from utils.checkpoint import RunCheckpoint, QueryCheckpoint, checkpoint_scope
+from utils.logging_utils import setup_logging
 
 logger = logging.getLogger()
 
 
-def run(query, api_spec, requests_wrapper, simple_parser=False):
-    llm = OpenAI(model_name="text-davinci-003", temperature=0.0, max_tokens=256)
-    # llm = OpenAI(model_name="gpt-3.5-turbo-0301", temperature=0.0, max_tokens=256)
-    rest_gpt = RestGPT(llm, api_spec=api_spec, scenario='tmdb', requests_wrapper=requests_wrapper, simple_parser=simple_parser)
+def load_queries(path):
+    """The queries of a dataset: a JSON list (RestBench) or JSON lines, of objects with a "query"."""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            items = [json.loads(line) for line in f if line.strip()]
+        else:
+            items = json.load(f)
+    return [item['query'] for item in items]
+
 
+def run(idx, query, rest_gpt, checkpoint, resume=False):
     logger.info(f"Query: {query}")
 
     start_time = time.time()
-    rest_gpt.run(query)
+    # the chain saves its plan after every completed step; on resume it continues from there
+    with checkpoint_scope(QueryCheckpoint(checkpoint, idx, query, resume=resume)):
+        result = rest_gpt.run(query)
     logger.info(f"Execution Time: {int(time.time() - start_time)} seconds")
+    checkpoint.finish(idx, query, result=result, seconds=round(time.time() - start_time, 2))
 
 
 def main():
-    config = yaml.load(open('config.yaml', 'r'), Loader=yaml.FullLoader)
-    os.environ["OPENAI_API_KEY"] = config['openai_api_key']
-    os.environ["TMDB_ACCESS_TOKEN"] = config['tmdb_access_token']
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--dataset", default="datasets/tmdb.json", help="a .json list or .jsonl file of {\"query\": ...}")
+    parser.add_argument("--checkpoint", default=os.path.join("logs", "restgpt_tmdb", "checkpoint.sqlite3"),
+                        help="SQLite file with the results and progress of the run (results are also appended to its .jsonl)")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip the queries already answered and continue the interrupted one from its last step")
+    args = parser.parse_args()
+
+    from run import build_chain
+
+    config = load_config(args.config)
+    apply_config_env(config)
 
     log_dir = os.path.join("logs", "restgpt_tmdb")
     if not os.path.exists(log_dir):
         os.mkdir(log_dir)
 
-    file_handler = MyRotatingFileHandler(os.path.join(log_dir, f"tmdb.log"), encoding='utf-8')
-    logging.basicConfig(
-        format="%(message)s",
-        handlers=[logging.StreamHandler(ColorPrint()), file_handler],
+    # one rotated (and gzipped) log per query, written off the hot path
+    log_pipeline = setup_logging(
+        log_file=os.path.join(log_dir, "tmdb.log"),
+        jsonl_file=os.path.join(log_dir, "tmdb.jsonl"),
+        rotating=True,
+        compress_rotated=True,
     )
-    logger.setLevel(logging.INFO)
-
-    with open("specs/tmdb_oas.json") as f:
-        raw_tmdb_api_spec = json.load(f)
-
-    api_spec = reduce_openapi_spec(raw_tmdb_api_spec, only_required=False)
-
-    access_token = os.environ["TMDB_ACCESS_TOKEN"]
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
-
-    requests_wrapper = Requests(headers=headers)
 
-    queries = json.load(open('datasets/tmdb.json', 'r'))
-    queries = [item['query'] for item in queries]
+    rest_gpt = build_chain(config, 'tmdb')
+    queries = load_queries(args.dataset)
+
+    checkpoint = RunCheckpoint(args.checkpoint)
+    # a query only counts as done if the dataset still has the same query at that index
+    finished = checkpoint.finished() if args.resume else {}
+    done = {idx for idx, query in finished.items() if idx <= len(queries) and queries[idx - 1] == query}
+    if args.resume:
+        logger.info(f"Checkpoint: {len(done)} of {len(queries)} queries already answered in {args.checkpoint}")
+
+    try:
+        for idx, query in enumerate(queries, 1):
+            if idx in done:
+                continue
+            try:
+                print('#' * 20 + f" Query-{idx} " + '#' * 20)
+                run(idx, query, rest_gpt, checkpoint, resume=args.resume)
+            except Exception as e:
+                print(f"Query: {query}\nError: {e}")
+                # failed queries are run again on resume, from their last completed step
+                checkpoint.finish(idx, query, error=str(e))
+            finally:
+                log_pipeline.rollover()
+    finally:
+        checkpoint.close()
 
-    for idx, query in enumerate(queries, 1):
-        try:
-            print('#' * 20 + f" Query-{idx} " + '#' * 20)
-            run(query, api_spec, requests_wrapper, simple_parser=False)
-        except Exception as e:
-            print(f"Query: {query}\nError: {e}")
-        finally:
-            file_handler.doRollover()
-    
 
 if __name__ == '__main__':
     main()
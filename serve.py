@@ -0,0 +1,343 @@
+"""Long-running RestGPT service.
+
+Keeps the reduced spec, request pool and RestGPT chain of every scenario warm
+and answers queries over a small local HTTP/JSON API:
+
+    POST /query   {"scenario": "gitlab", "query": "..."}
+                  (scenario "chatops" routes the query to the right systems)
+                  -> application/x-ndjson stream of {"type": "trace", ...}
+                     lines followed by one {"type": "result", ...} line
+    GET  /health  -> warm scenarios, spec versions and worker usage
+
+Spec files are watched (`--watch-specs`) and reloaded without a restart:
+queries already running finish on the spec they started with.
+"""
+
+import json
+import queue
+import contextvars
+import logging
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import ExitStack
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+from utils import load_config, apply_config_env, build_llms, get_encoder, PooledRequestsWrapper, EntityCache, ParseMemo, BudgetPolicy
+from utils.router import ChatOpsRouter, SpecIndex
+from utils.scenario_utils import CHATOPS_SYSTEMS
+from utils.spec_registry import SpecRegistry, SpecVersion
+from utils.resilience import deadline_scope
+from utils.logging_utils import setup_logging, PayloadCapFilter, DEFAULT_MAX_PAYLOAD_BYTES
+from model import RestGPT, ModelRouter, RoutingPolicy
+from model.parser import ParserRacePolicy, default_parser_strategies
+
+logger = logging.getLogger()
+
+DEFAULT_SCENARIOS = ['tmdb', 'github', 'gitlab', 'docker', 'kubernetes', 'jenkins', 'chatops']
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+_trace_queue: contextvars.ContextVar[Optional[queue.Queue]] = contextvars.ContextVar("restgpt_trace_queue", default=None)
+
+
+class QueryTraceHandler(logging.Handler):
+    """Routes log records to the trace queue of the query they are logged for.
+
+    The queue is a context variable rather than per thread: hedged calls and
+    parser races run on a shared pool under a copy of the query's context,
+    and their records belong to its trace too.
+    """
+
+    def attach(self, trace_queue: queue.Queue) -> contextvars.Token:
+        return _trace_queue.set(trace_queue)
+
+    def detach(self, token: contextvars.Token) -> None:
+        _trace_queue.reset(token)
+
+    def emit(self, record):
+        trace_queue = _trace_queue.get()
+        if trace_queue is None:
+            return
+        try:
+            trace_queue.put({"type": "trace", "logger": record.name, "message": self.format(record)})
+        except Exception:
+            self.handleError(record)
+
+
+class RestGPTService:
+    def __init__(self, max_workers: int = 4, max_pending: int = 16, trace_handler: Optional[QueryTraceHandler] = None,
+                 routing_policy: Optional[RoutingPolicy] = None, deadline: Optional[float] = None,
+                 entity_cache: Optional[EntityCache] = None, spec_registry: Optional[SpecRegistry] = None,
+                 budget_policy: Optional[BudgetPolicy] = None, parse_memo: Optional[ParseMemo] = None):
+        self.planner_llm, self.tool_llm = build_llms()
+        self.deadline = deadline
+        # limits for each query (LLM calls, tokens, HTTP calls and bytes); over budget a query answers partially
+        self.budget_policy = budget_policy
+        self.entity_cache = entity_cache
+        self.parse_memo = parse_memo
+        # specs are re-read when their files change; chains are rebuilt on the next query
+        self.spec_registry = spec_registry or SpecRegistry()
+        # one router for every chain, so its failure rates and stats cover all traffic
+        self.model_router = ModelRouter(small_llm=self.tool_llm, large_llm=self.planner_llm, policy=routing_policy)
+        self.trace_handler = trace_handler
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="restgpt")
+        self.max_workers = max_workers
+        # running + queued jobs; beyond this the service answers 503 instead of queueing forever
+        self.slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self.rest_gpts: Dict[str, Tuple[SpecVersion, RestGPT]] = {}
+        self.router: Optional[ChatOpsRouter] = None
+        # (router, spec versions it was built from, chains per system set), swapped as one
+        self.router_state: Optional[Tuple[ChatOpsRouter, Dict[str, SpecVersion], Dict[FrozenSet[str], RestGPT]]] = None
+        self.router_generation = -1
+        self.warm_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.running = 0
+        self.served = 0
+
+    def warm_router(self) -> ChatOpsRouter:
+        with self.warm_lock:
+            if self.router is None or self.router_generation != self.spec_registry.chatops_generation:
+                start_time = time.time()
+                generation = self.spec_registry.chatops_generation
+                versions = {system: self.spec_registry.get(system) for system in CHATOPS_SYSTEMS}
+                self.router = ChatOpsRouter(
+                    SpecIndex({system: version.api_spec for system, version in versions.items()}),
+                    requests_wrapper=self.router.requests_wrapper if self.router is not None else None,
+                )
+                self.router_state = (self.router, versions, {})
+                self.router_generation = generation
+                logger.info(f"Service: warmed chatops router over {', '.join(self.router.index.systems)} in {time.time() - start_time:.2f}s")
+        return self.router
+
+    def routed(self, query: str) -> Tuple[List[SpecVersion], RestGPT]:
+        if self.router is None or self.router_generation != self.spec_registry.chatops_generation:
+            self.warm_router()
+        router, versions, routed_rest_gpts = self.router_state
+        route = router.route(query)
+        key = frozenset(route.systems)
+        rest_gpt = routed_rest_gpts.get(key)
+        if rest_gpt is None:
+            with self.warm_lock:
+                if key not in routed_rest_gpts:
+                    routed_rest_gpts[key] = RestGPT(
+                        planner_llm=self.planner_llm, tool_llm=self.tool_llm, api_spec=route.api_spec,
+                        scenario='chatops', requests_wrapper=route.requests_wrapper, simple_parser=False,
+                        model_router=self.model_router, entity_cache=self.entity_cache, parse_memo=self.parse_memo,
+                        budget_policy=self.budget_policy,
+                    )
+                rest_gpt = routed_rest_gpts[key]
+        return [versions[system] for system in route.systems], rest_gpt
+
+    def warm(self, scenario: str) -> Optional[Tuple[SpecVersion, RestGPT]]:
+        scenario = scenario.split("_")[0]
+        if scenario == 'chatops':
+            self.warm_router()
+            return None
+        version = self.spec_registry.get(scenario)
+        entry = self.rest_gpts.get(scenario)
+        if entry is not None and entry[0] is version:
+            return entry
+        with self.warm_lock:
+            entry = self.rest_gpts.get(scenario)
+            if entry is None or entry[0] is not version:
+                start_time = time.time()
+                # a new spec version gets a new chain, but keeps the connection pool
+                requests_wrapper = entry[1].requests_wrapper if entry is not None else PooledRequestsWrapper(headers=version.headers)
+                self.rest_gpts[scenario] = (version, RestGPT(
+                    planner_llm=self.planner_llm, tool_llm=self.tool_llm, api_spec=version.api_spec,
+                    scenario=version.prompt_scenario, requests_wrapper=requests_wrapper,
+                    simple_parser=False, model_router=self.model_router, entity_cache=self.entity_cache, parse_memo=self.parse_memo,
+                        budget_policy=self.budget_policy,
+                ))
+                logger.info(f"Service: warmed {scenario} v{version.version} ({len(version.api_spec.endpoints)} endpoints) in {time.time() - start_time:.2f}s")
+            entry = self.rest_gpts[scenario]
+        return entry
+
+    def submit(self, scenario: str, query: str) -> Iterator[dict]:
+        """Queue a query and return an iterator over its trace and result events."""
+        if scenario.split("_")[0] == 'chatops':
+            versions, rest_gpt = self.routed(query)
+        else:
+            version, rest_gpt = self.warm(scenario)
+            versions = [version]
+        if not self.slots.acquire(blocking=False):
+            raise ServiceBusy(f"{self.max_workers} workers busy and the queue is full")
+        events: queue.Queue = queue.Queue()
+        try:
+            self.executor.submit(self._run, rest_gpt, versions, query, events)
+        except Exception:
+            self.slots.release()
+            raise
+        return self._drain(events)
+
+    def _run(self, rest_gpt: RestGPT, versions: List[SpecVersion], query: str, events: queue.Queue) -> None:
+        with self.stats_lock:
+            self.running += 1
+        trace_token = self.trace_handler.attach(events) if self.trace_handler is not None else None
+        start_time = time.time()
+        try:
+            logger.info(f"Query: {query}")
+            # the query finishes on the spec versions it started with, even if newer ones are swapped in
+            with ExitStack() as stack, deadline_scope(self.deadline):
+                for version in versions:
+                    stack.enter_context(version.use())
+                result = rest_gpt.run(query)
+            execution_time = time.time() - start_time
+            logger.info(f"Execution Time: {execution_time}")
+            events.put({"type": "result", "result": result, "execution_time": execution_time})
+        except Exception as e:
+            logger.exception(f"Service: query failed: {e}")
+            events.put({"type": "error", "error": f"{type(e).__name__}: {e}", "execution_time": time.time() - start_time})
+        finally:
+            if trace_token is not None:
+                self.trace_handler.detach(trace_token)
+            with self.stats_lock:
+                self.running -= 1
+                self.served += 1
+            self.slots.release()
+            events.put(None)
+
+    @staticmethod
+    def _drain(events: queue.Queue) -> Iterator[dict]:
+        while True:
+            event = events.get()
+            if event is None:
+                return
+            yield event
+
+    def health(self) -> dict:
+        return {
+            "scenarios": sorted(self.rest_gpts) + (['chatops'] if self.router is not None else []),
+            "specs": self.spec_registry.versions(),
+            "workers": self.max_workers,
+            "running": self.running,
+            "served": self.served,
+            "models": self.model_router.stats(),
+            "parse_memo": self.parse_memo.stats() if self.parse_memo is not None else None,
+        }
+
+    def shutdown(self) -> None:
+        self.spec_registry.stop()
+        self.executor.shutdown(wait=True)
+        for _, rest_gpt in self.rest_gpts.values():
+            rest_gpt.requests_wrapper.transport.close()
+        if self.router is not None:
+            self.router.requests_wrapper.transport.close()
+        if self.entity_cache is not None:
+            self.entity_cache.close()
+        if self.parse_memo is not None:
+            self.parse_memo.close()
+
+
+def make_handler(service: RestGPTService):
+    class RestGPTRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, obj: dict) -> None:
+            body = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, service.health())
+            else:
+                self._send_json(404, {"error": f"unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/query":
+                self._send_json(404, {"error": f"unknown path {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                events = service.submit(payload["scenario"], payload["query"])
+            except ServiceBusy as e:
+                self._send_json(503, {"error": str(e)})
+                return
+            except (KeyError, ValueError, OSError) as e:
+                self._send_json(400, {"error": f"bad request: {e}"})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            try:
+                for event in events:
+                    self.wfile.write((json.dumps(event, ensure_ascii=False) + "\n").encode('utf-8'))
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # the client went away; the query still runs to completion in its worker
+                for _ in events:
+                    pass
+
+        def log_message(self, format, *args):
+            logging.getLogger("restgpt.http").debug(format % args)
+
+    return RestGPTRequestHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve RestGPT queries over HTTP with warm specs and pools.")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=4, help="queries executed concurrently")
+    parser.add_argument("--max-pending", type=int, default=16, help="queries allowed to wait for a worker")
+    parser.add_argument("--scenarios", nargs="*", default=DEFAULT_SCENARIOS,
+                        help="scenarios to warm at startup, others are warmed on first use")
+    parser.add_argument("--quiet", action="store_true", help="do not echo traces to stdout")
+    parser.add_argument("--deadline", type=float, default=None,
+                        help="seconds a query may take; LLM and REST calls are timed out and no longer retried past it")
+    parser.add_argument("--watch-specs", type=float, default=2.0, metavar="SECONDS",
+                        help="check the spec files for changes this often and reload them; 0 disables")
+    parser.add_argument("--log-jsonl", default=None, help="also write structured logs to this JSONL file")
+    parser.add_argument("--max-log-payload-bytes", type=int, default=DEFAULT_MAX_PAYLOAD_BYTES,
+                        help="log messages above this size are truncated and referenced by sha256")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    apply_config_env(config)
+
+    setup_logging(console=not args.quiet, jsonl_file=args.log_jsonl, max_payload_bytes=args.max_log_payload_bytes)
+    # the trace handler must run on the worker's own thread, so it sits beside the queue, not behind it
+    trace_handler = QueryTraceHandler()
+    trace_handler.setFormatter(logging.Formatter("%(message)s"))
+    trace_handler.addFilter(PayloadCapFilter(args.max_log_payload_bytes))
+    logging.getLogger().addHandler(trace_handler)
+
+    service = RestGPTService(max_workers=args.workers, max_pending=args.max_pending, trace_handler=trace_handler,
+                             routing_policy=RoutingPolicy.from_config(config.get("model_routing")),
+                             deadline=args.deadline,
+                             entity_cache=EntityCache.from_config(config.get("entity_cache")),
+                             budget_policy=BudgetPolicy.from_config(config.get("query_budget")),
+                             parse_memo=ParseMemo.from_config(config.get("parse_memo")),
+                             spec_registry=SpecRegistry(poll_interval=args.watch_specs))
+    if config.get("parser_racing"):
+        default_parser_strategies().policy = ParserRacePolicy.from_config(config["parser_racing"])
+    get_encoder()
+    for scenario in args.scenarios:
+        service.warm(scenario)
+    if args.watch_specs > 0:
+        service.spec_registry.start()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    logger.info(f"Service: listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+from analyze_logs import analyze_file
+
+
+def _log(tmp_path, text):
+    path = tmp_path / "restgpt_tmdb" / "tmdb.log"
+    path.parent.mkdir()
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_execution_time_of_run_py_and_run_tmdb_py(tmp_path):
+    path = _log(tmp_path, (
+        "Query: the id of Sofia Coppola\n"
+        "Planner: Final Answer: 1769\n"
+        "Execution Time: 12 seconds\n"
+        "Query: the id of Tony Leung\n"
+        "Planner: Final Answer: 1337\n"
+        "Execution Time: 7.25\n"
+    ))
+    _, runs, error = analyze_file(path)
+    assert error is None
+    assert [run["execution_time"] for run in runs] == [12.0, 7.25]
+    assert all(run["unparsed"] == [] for run in runs)
+
+
+def test_unreadable_execution_time_is_reported(tmp_path):
+    path = _log(tmp_path, "Query: q\nExecution Time: unknown\n")
+    _, runs, error = analyze_file(path)
+    assert error is None
+    assert runs[0]["execution_time"] is None
+    assert runs[0]["unparsed"] == ["Execution Time: unknown"]
@@ -0,0 +1,40 @@
+import pytest
+
+from utils.budget import BudgetExceeded, BudgetPolicy, budget_scope, check_budget, current_budget
+from utils.resilience import hedged_call, remaining_time
+
+
+def test_charge_refuses_a_call_over_the_limit_without_charging_it():
+    with budget_scope(BudgetPolicy(max_llm_calls=2)) as budget:
+        budget.charge(llm_calls=1, prompt_tokens=100)
+        budget.charge(llm_calls=1, prompt_tokens=100)
+        with pytest.raises(BudgetExceeded) as raised:
+            budget.charge(llm_calls=1, prompt_tokens=100)
+        assert raised.value.resource == "llm_calls"
+        assert budget.usage()["prompt_tokens"] == 200
+        # once exceeded, every later check fails with the same error
+        with pytest.raises(BudgetExceeded):
+            check_budget()
+
+
+def test_recorded_usage_counts_against_later_charges():
+    with budget_scope(BudgetPolicy(max_llm_calls=None, max_completion_tokens=100)) as budget:
+        budget.record(completion_tokens=100)
+        with pytest.raises(BudgetExceeded):
+            budget.charge(completion_tokens=1)
+
+
+def test_scope_sets_the_deadline_and_is_seen_by_hedge_threads():
+    with budget_scope(BudgetPolicy(max_seconds=30)) as budget:
+        assert 0 < remaining_time() <= 30
+        assert hedged_call(current_budget, hedge_after=1.0) is budget
+    assert current_budget() is None
+    check_budget()  # no budget outside a scope
+
+
+def test_from_config():
+    policy = BudgetPolicy.from_config({"max_seconds": 300, "max_http_calls": 40})
+    assert policy.limits()["seconds"] == 300
+    assert policy.limits()["http_calls"] == 40
+    assert policy.limits()["llm_calls"] == 80
+    assert BudgetPolicy.from_config(None) == BudgetPolicy()
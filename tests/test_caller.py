@@ -0,0 +1,87 @@
+import json
+
+import pytest
+import requests
+from langchain.llms.fake import FakeListLLM
+
+import model.caller
+from model.caller import Caller
+from utils import PooledRequestsWrapper
+from utils.oas_utils import Endpoint, ReducedOpenAPISpec
+
+ISSUE_PATH = "/repos/octocat/hello-world/issues/99"
+
+
+class RecordingLLM(FakeListLLM):
+    prompts: list = []
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(prompt)
+        return super()._call(prompt, stop=stop, run_manager=run_manager, **kwargs)
+
+
+class FakeTransport:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def request(self, method, url, **kwargs):
+        response = requests.Response()
+        response.status_code = self.status_code
+        response._content = json.dumps(self.body).encode()
+        response.url = url
+        return response
+
+
+class WordEncoder:
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+class StubParser:
+    runs = []
+
+    def __init__(self, **kwargs):
+        pass
+
+    def run(self, **kwargs):
+        StubParser.runs.append(kwargs["json"])
+        return "The title is Found a bug."
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    monkeypatch.setattr(model.caller, "get_encoder", lambda: WordEncoder())
+    monkeypatch.setattr(model.caller, "ResponseParser", StubParser)
+    StubParser.runs = []
+
+
+def _call(status_code, body):
+    api_spec = ReducedOpenAPISpec(
+        servers=[{"url": "https://api.github.com"}],
+        description="GitHub",
+        endpoints=[Endpoint("GET /repos/{owner}/{repo}/issues/{issue_number}", "Get an issue.", {"parameters": []})],
+    )
+    operation = json.dumps({"url": ISSUE_PATH, "description": "Get issue 99.", "output_instructions": "the title of the issue"})
+    llm = RecordingLLM(responses=[f"Operation: GET\nInput: {operation}", "Execution Result: done"], prompts=[])
+    caller = Caller(
+        llm=llm, plan_llm=llm, api_spec=api_spec, scenario="github",
+        requests_wrapper=PooledRequestsWrapper(transport=FakeTransport(status_code, body)),
+    )
+    caller({"api_plan": "GET /repos/octocat/hello-world/issues/99 to get the issue", "background": ""})
+    return llm.prompts
+
+
+def test_failed_call_is_shown_to_the_caller_and_not_parsed():
+    prompts = _call(404, {"message": "Not Found"})
+    assert StubParser.runs == []
+    assert 'The call failed with status 404: {"message": "Not Found"}' in prompts[1]
+
+
+def test_successful_call_is_parsed():
+    prompts = _call(200, {"number": 99, "title": "Found a bug"})
+    assert StubParser.runs == [json.dumps({"number": 99, "title": "Found a bug"})]
+    assert "The title is Found a bug." in prompts[1]
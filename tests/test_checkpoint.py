@@ -0,0 +1,48 @@
+import json
+
+from utils.checkpoint import QueryCheckpoint, RunCheckpoint, checkpoint_scope, current_checkpoint
+
+STATE = {"planner_history": [["step 1", "result 1"]], "plan": "step 2", "step_plan": None,
+         "iterations": 1, "api_selector_history": []}
+
+
+def test_state_and_results_survive_a_restart(tmp_path):
+    path = str(tmp_path / "checkpoint.sqlite3")
+    run = RunCheckpoint(path)
+    run.save_state(2, "q2", STATE)
+    run.finish(1, "q1", result="Final Answer: 1", seconds=1.5)
+    run.close()
+
+    run = RunCheckpoint(path)
+    assert run.finished() == {1: "q1"}
+    assert run.state(2, "q2") == STATE
+    # a different query at the same index (the dataset changed) does not resume
+    assert run.state(2, "another query") is None
+    run.close()
+    with open(str(tmp_path / "checkpoint.jsonl"), encoding="utf-8") as f:
+        assert [json.loads(line)["idx"] for line in f] == [1]
+
+
+def test_failed_query_keeps_its_state_and_is_not_finished(tmp_path):
+    run = RunCheckpoint(str(tmp_path / "checkpoint.sqlite3"))
+    run.save_state(1, "q", STATE)
+    run.finish(1, "q", error="ReadTimeout")
+    assert run.finished() == {}
+    assert run.state(1, "q") == STATE
+    run.finish(1, "q", result="Final Answer: 42")
+    assert run.finished() == {1: "q"}
+    assert run.state(1, "q") is None
+    assert [record["status"] for record in run.results()] == ["done"]
+    run.close()
+
+
+def test_query_checkpoint_only_loads_when_resuming(tmp_path):
+    run = RunCheckpoint(str(tmp_path / "checkpoint.sqlite3"))
+    run.save_state(1, "q", STATE)
+    assert QueryCheckpoint(run, 1, "q", resume=False).load() is None
+    checkpoint = QueryCheckpoint(run, 1, "q")
+    with checkpoint_scope(checkpoint):
+        assert current_checkpoint() is checkpoint
+        assert current_checkpoint().load() == STATE
+    assert current_checkpoint() is None
+    run.close()
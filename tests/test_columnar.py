@@ -0,0 +1,66 @@
+import pytest
+
+from utils import columnar
+from utils.columnar import Table, filter_by, group_count, pluck, sort_by, top_k
+
+CREW = [
+    {"name": "Ann", "job": "Director", "popularity": 7.5, "user": {"login": "ann"}},
+    {"name": "Bob", "job": "Writer", "popularity": 9.0, "user": {"login": "bob"}},
+    {"name": "Cid", "job": "Director", "popularity": None},
+    {"name": "Dee", "job": "Producer", "popularity": 3.0},
+    {"name": "Eve", "job": "Writer", "popularity": 9.0},
+]
+
+
+@pytest.fixture(params=["numpy", "python"], autouse=True)
+def backend(request, monkeypatch):
+    # every helper must give the same answer with and without NumPy
+    if request.param == "python":
+        monkeypatch.setattr(columnar, "np", None)
+    return request.param
+
+
+def names(rows):
+    return [row["name"] for row in rows]
+
+
+def test_filter_by_equality_operators_and_nested_fields():
+    assert names(filter_by(CREW, job="Director")) == ["Ann", "Cid"]
+    assert names(filter_by(CREW, popularity__gt=5)) == ["Ann", "Bob", "Eve"]
+    assert names(filter_by(CREW, name__contains="E")) == ["Dee", "Eve"]
+    assert names(filter_by(CREW, popularity__in=[3, 9])) == ["Bob", "Dee", "Eve"]
+    assert names(filter_by(CREW, **{"user.login": "bob"})) == ["Bob"]
+    assert names(filter_by(CREW, job="Writer", popularity__ge=9)) == ["Bob", "Eve"]
+
+
+def test_missing_values_only_match_not_equal():
+    assert "Cid" not in names(filter_by(CREW, popularity__lt=100))
+    assert "Cid" in names(filter_by(CREW, popularity__ne=7.5))
+
+
+def test_sort_by_is_stable_and_puts_missing_values_last():
+    assert names(sort_by(CREW, "popularity")) == ["Dee", "Ann", "Bob", "Eve", "Cid"]
+    assert names(sort_by(CREW, "popularity", reverse=True)) == ["Bob", "Eve", "Ann", "Dee", "Cid"]
+    assert names(sort_by(CREW, "name", reverse=True)) == ["Eve", "Dee", "Cid", "Bob", "Ann"]
+
+
+def test_top_k_largest_and_smallest():
+    assert names(top_k(CREW, "popularity", k=2)) == ["Bob", "Eve"]
+    assert names(top_k(CREW, "popularity", k=1, largest=False)) == ["Dee"]
+    # more rows asked for than have the field: only the rows that have it, in order
+    assert names(top_k(CREW, "popularity", k=4)) == ["Bob", "Eve", "Ann", "Dee"]
+
+
+def test_group_count_most_frequent_first():
+    assert group_count(CREW, "job") == {"Director": 2, "Writer": 2, "Producer": 1}
+    assert list(group_count(CREW, "popularity").items())[0] == (9, 2)
+
+
+def test_tables_chain_and_behave_like_lists():
+    table = filter_by(CREW, job="Director")
+    assert isinstance(table, Table)
+    assert table == CREW[:1] + CREW[2:3]
+    assert len(table) == 2 and table[0] is CREW[0]
+    assert pluck(sort_by(table, "name", reverse=True), "name") == ["Cid", "Ann"]
+    assert table["user.login"] == ["ann", None]
+    assert filter_by([], job="Director") == []
@@ -0,0 +1,51 @@
+import json
+
+from utils.entity_cache import EntityCache, extract_entities
+
+GITHUB = "https://api.github.com"
+
+
+def test_single_resource_kind_comes_from_the_route_template():
+    repo = {"id": 1296269, "name": "Hello-World", "full_name": "octocat/Hello-World"}
+    entities = extract_entities(f"{GITHUB}/repos/octocat/Hello-World", None, repo, route="/repos/{owner}/{repo}")
+    assert entities == [("repo", "Hello-World", "Hello-World", "1296269")]
+
+
+def test_single_resource_without_a_route_is_not_learned():
+    assert extract_entities(f"{GITHUB}/repos/octocat/Hello-World", None, {"id": 1, "name": "Hello-World"}) == []
+
+
+def test_sub_resource_routes_are_not_single_resources():
+    credits = {"id": 843, "name": "not the movie's name"}
+    assert extract_entities("https://api.themoviedb.org/3/movie/843/credits", None, credits,
+                            route="/movie/{movie_id}/credits") == []
+
+
+def test_user_is_also_known_by_login():
+    user = {"id": 583231, "login": "octocat", "name": "The Octocat"}
+    entities = extract_entities(f"{GITHUB}/users/octocat", None, user, route="/users/{username}")
+    assert entities == [
+        ("user", "The Octocat", "The Octocat", "583231"),
+        ("user", "octocat", "The Octocat", "583231"),
+    ]
+
+
+def test_search_resolves_the_query_to_a_matching_login():
+    data = {"total_count": 1, "items": [{"id": 583231, "login": "octocat", "name": "The Octocat"}]}
+    entities = extract_entities(f"{GITHUB}/search/users", {"q": "octocat"}, data)
+    assert ("user", "octocat", "The Octocat", "583231") in entities
+
+
+def test_search_ignores_a_top_hit_with_another_name():
+    data = {"results": [{"id": 1, "name": "Sofia Loren"}]}
+    assert extract_entities("https://api.themoviedb.org/3/search/person", {"query": "Sofia Coppola"}, data) == []
+
+
+def test_learned_login_is_mentioned_by_a_later_query():
+    cache = EntityCache(":memory:")
+    user = {"id": 583231, "login": "octocat", "name": "The Octocat"}
+    assert cache.learn(f"{GITHUB}/users/octocat", None, json.dumps(user), route="/users/{username}") == 2
+    assert cache.get("api.github.com", "octocat", kind="user") == "583231"
+    background = cache.background(["api.github.com"], "list the repositories of octocat")
+    assert "583231" in background
+    cache.close()
@@ -0,0 +1,57 @@
+import pytest
+
+from utils import fix_json_error
+from utils.json_repair import JSONRepairError, repair_json
+
+
+def kinds(result):
+    return [repair.kind for repair in result.repairs]
+
+
+def test_valid_json_needs_no_repair():
+    result = repair_json('{"url": "https://api.themoviedb.org/3/search/person", "params": {"query": "Sofia Coppola"}}')
+    assert result.value == {"url": "https://api.themoviedb.org/3/search/person", "params": {"query": "Sofia Coppola"}}
+    assert result.repairs == []
+
+
+@pytest.mark.parametrize("text, value, kind", [
+    ('{"a": 1 "b": 2}', {"a": 1, "b": 2}, "missing_comma"),
+    ('{"a": 1, "b": 2,}', {"a": 1, "b": 2}, "trailing_comma"),
+    ("{'a': 'x'}", {"a": "x"}, "single_quotes"),
+    ('{a: "x"}', {"a": "x"}, "unquoted_key"),
+    ('{"a": True, "b": None}', {"a": True, "b": None}, "python_literal"),
+    ('{"a": 1 // the id\n}', {"a": 1}, "comment"),
+    ('{"a": [1, 2}', {"a": [1, 2]}, "mismatched_bracket"),
+    ('{"a": {"b": 1}', {"a": {"b": 1}}, "unclosed_object"),
+    ('Operation input: {"a": 1}', {"a": 1}, "leading_text"),
+    ('{"a": "line\nbreak"}', {"a": "line\nbreak"}, "unescaped_newline"),
+])
+def test_common_mistakes_are_repaired(text, value, kind):
+    result = repair_json(text)
+    assert result.value == value
+    assert kind in kinds(result)
+
+
+def test_unescaped_quotes_inside_a_string_are_kept():
+    result = repair_json('{"body": "He said "hi" and left"}')
+    assert result.value == {"body": 'He said "hi" and left'}
+    assert kinds(result) == ["unescaped_quote", "unescaped_quote"]
+
+
+@pytest.mark.parametrize("text", [
+    '{"body": "He said "hi", then left"}',
+    '{"a": "x", "b": "say "yo", ok", "c": 1}',
+])
+def test_unescaped_quote_before_a_comma_is_not_split_into_keys(text):
+    with pytest.raises(JSONRepairError):
+        repair_json(text)
+
+
+def test_fix_json_error_returns_the_input_when_the_repair_is_ambiguous():
+    text = '{"body": "He said "hi", then left"}'
+    assert fix_json_error(text) == text
+
+
+def test_no_object_or_array():
+    with pytest.raises(JSONRepairError):
+        repair_json("no json here")
@@ -0,0 +1,25 @@
+import io
+import sys
+import logging
+
+from utils.logging_utils import setup_logging
+
+
+def test_console_writes_to_the_current_stdout(monkeypatch):
+    root = logging.getLogger()
+    saved_handlers, saved_level = list(root.handlers), root.level
+    pipeline = setup_logging(console=True)
+    try:
+        # stdout redirected after the handler was created, as notebooks and pytest capture do
+        captured = io.StringIO()
+        monkeypatch.setattr(sys, "stdout", captured)
+        logging.getLogger("model.parser").info("Code: print(data['id'])")
+        assert pipeline.flush()
+    finally:
+        pipeline.stop()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        for handler in saved_handlers:
+            root.addHandler(handler)
+        root.setLevel(saved_level)
+    assert "Code: print(data['id'])" in captured.getvalue()
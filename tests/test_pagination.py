@@ -0,0 +1,38 @@
+import pytest
+
+from utils.pagination import needs_all_pages, page_items
+
+
+@pytest.mark.parametrize("instruction", [
+    "How many movies did Sofia Coppola direct?",
+    "the number of open issues",
+    "count the repositories of the user",
+    "the total runtime of the episodes",
+    "list all projects in the group",
+    "every track of the album",
+    "the average rating of the results",
+])
+def test_aggregations_need_all_pages(instruction):
+    assert needs_all_pages(instruction)
+
+
+@pytest.mark.parametrize("instruction", [
+    "the most popular movie",
+    "the latest album of Lana Del Rey",
+    "the id of the highest rated show",
+    "the oldest open issue",
+    "list the names of the results",
+    "the id of each movie",
+    "the id of the person",
+    "",
+    None,
+])
+def test_lookups_and_superlatives_read_the_first_page_only(instruction):
+    assert not needs_all_pages(instruction)
+
+
+def test_page_items_finds_the_item_list():
+    assert page_items([1, 2]) == (None, [1, 2])
+    assert page_items({"page": 1, "results": [1]}) == ("results", [1])
+    assert page_items({"tracks": {"items": [1], "next": None}}) == ("tracks", [1])
+    assert page_items({"id": 1}) is None
@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+from utils.parse_memo import ParseMemo, first_page_only
+
+
+def _pages(pages=1, exhaustive=False, has_more=False):
+    return SimpleNamespace(pages=pages, exhaustive=exhaustive, has_more=has_more)
+
+
+def test_key_depends_on_every_input():
+    key = ParseMemo.key("GET /movie/{movie_id}", '{"id": 1}', "the title", {"params": {}})
+    assert key == ParseMemo.key("GET /movie/{movie_id}", '{"id": 1}', "  The   TITLE ", {"params": {}})
+    assert key != ParseMemo.key("GET /movie/{movie_id}", '{"id": 2}', "the title", {"params": {}})
+    assert key != ParseMemo.key("GET /movie/{movie_id}", '{"id": 1}', "the id", {"params": {}})
+    assert key != ParseMemo.key("GET /movie/{movie_id}", '{"id": 1}', "the title", {"params": {"page": 2}})
+
+
+def test_lru_eviction_by_bytes():
+    memo = ParseMemo(max_bytes=700)  # two entries of 301 bytes fit, three do not
+    memo.put("a", "x" * 100)
+    memo.put("b", "y" * 100)
+    assert memo.get("a") == "x" * 100
+    memo.put("c", "z" * 100)
+    assert memo.get("b") is None
+    assert memo.get("a") == "x" * 100
+
+
+def test_sqlite_entries_survive_a_new_instance(tmp_path):
+    path = str(tmp_path / "memo.sqlite3")
+    memo = ParseMemo(path=path)
+    memo.put("k", "42", "GET /movie/{movie_id}")
+    memo.close()
+    memo = ParseMemo(path=path)
+    assert memo.get("k") == "42"
+    memo.close()
+
+
+def test_only_first_page_parses_are_memoized():
+    assert first_page_only(None)
+    assert first_page_only(_pages())
+    # a lookup reads further pages only if the first one gives nothing, and empty outputs are never stored
+    assert first_page_only(_pages(has_more=True))
+    assert not first_page_only(_pages(exhaustive=True, has_more=True))
+    assert first_page_only(_pages(exhaustive=True, has_more=False))
+    assert not first_page_only(_pages(pages=3))
@@ -0,0 +1,96 @@
+import threading
+from types import SimpleNamespace
+
+import tiktoken
+from langchain.llms.fake import FakeListLLM
+
+import model.parser
+from model.parser import ParserRacePolicy, ParserStrategies, ResponseParser
+
+
+class CountingLLM(FakeListLLM):
+    calls: int = 0
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        return super()._call(prompt, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def _parser(llm):
+    # an endpoint without a documented response only needs the LLM parsing prompt
+    return ResponseParser(llm=llm, api_path="GET /movie/{movie_id}", api_doc={"description": "Get a movie."})
+
+
+def _inputs():
+    return {"query": "the title", "json": '{"title": "Up"}', "api_param": "{}", "response_description": ""}
+
+
+def test_cancelled_llm_branch_does_not_call_the_model():
+    llm = CountingLLM(responses=["Up"])
+    cancelled = threading.Event()
+    cancelled.set()
+    assert _parser(llm)._parse_with_llm(_inputs(), "parser_llm", '{"title": "Up"}', cancelled) is None
+    assert llm.calls == 0
+
+
+def test_cancelled_code_branch_does_not_call_the_model():
+    llm = CountingLLM(responses=["print(data['title'])"])
+    cancelled = threading.Event()
+    cancelled.set()
+    assert _parser(llm)._parse_with_code(_inputs(), cancelled) is None
+    assert llm.calls == 0
+
+
+class WordEncoder(tiktoken.Encoding):
+    """Offline stand-in for the tiktoken encoder the parser validates."""
+
+    def __init__(self):
+        pass
+
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def _race_parser(monkeypatch, calls, code_output="42"):
+    strategies = ParserStrategies(ParserRacePolicy(enabled=True))
+    monkeypatch.setattr(model.parser, "default_parser_strategies", lambda: strategies)
+    monkeypatch.setattr(model.parser, "get_encoder", lambda: WordEncoder())
+
+    def parse_with_code(self, inputs, cancelled=None):
+        calls.append("code")
+        return code_output
+
+    def parse_with_llm(self, inputs, stage, json_text, cancelled=None):
+        calls.append("llm")
+        return "20"
+
+    monkeypatch.setattr(ResponseParser, "_parse_with_code", parse_with_code)
+    monkeypatch.setattr(ResponseParser, "_parse_with_llm", parse_with_llm)
+    schema = {"type": "object", "properties": {"results": {"type": "array", "items": {"type": "object"}}}}
+    api_doc = {"description": "Search movies.", "responses": {"content": {"application/json": {"schema": schema}}}}
+    parser = ResponseParser(llm=CountingLLM(responses=[""]), api_path="GET /search/movie", api_doc=api_doc, query="how many movies")
+    return parser, strategies
+
+
+def test_aggregation_over_more_pages_runs_the_code_only(monkeypatch):
+    calls = []
+    parser, strategies = _race_parser(monkeypatch, calls)
+    pages = SimpleNamespace(exhaustive=True, has_more=True, pages=1, data=None)
+    output = parser.run(query="how many movies", json='{"results": []}', api_param="{}", response_description="", pages=pages)
+    assert output == "42"
+    assert calls == ["code"]
+    # a forced choice teaches the strategy stats nothing
+    assert strategies.stats() == {}
+
+
+def test_single_page_still_races(monkeypatch):
+    calls = []
+    parser, strategies = _race_parser(monkeypatch, calls, code_output=None)
+    pages = SimpleNamespace(exhaustive=True, has_more=False, pages=1, data=None)
+    output = parser.run(query="how many movies", json='{"results": []}', api_param="{}", response_description="", pages=pages)
+    assert output == "20"
+    assert sorted(calls) == ["code", "llm"]
+    assert strategies.stats() == {"GET /search/movie": {"code": 0, "llm": 1, "neither": 0}}
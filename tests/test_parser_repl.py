@@ -0,0 +1,36 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from model.parser import PythonREPL
+
+
+def test_run_returns_what_the_code_printed():
+    repl = PythonREPL(_globals={"data": {"results": [{"id": 1}, {"id": 2}]}})
+    assert repl.run("for item in data['results']:\n    print(item['id'])") == "1\n2\n"
+
+
+def test_run_returns_none_when_the_code_fails():
+    assert PythonREPL(_globals={"data": {}}).run("print(data['missing'])") is None
+
+
+def test_helper_functions_defined_by_the_code_print_to_the_same_buffer():
+    code = "def show(x):\n    print('value', x)\nshow(data)"
+    assert PythonREPL(_globals={"data": 3}).run(code) == "value 3\n"
+
+
+def test_concurrent_runs_do_not_capture_each_other():
+    stdout = sys.stdout
+    barrier = threading.Barrier(8)
+
+    def parse(n: int) -> str:
+        barrier.wait()
+        code = "import time\nfor _ in range(50):\n    print(data)\n    time.sleep(0.0005)"
+        return PythonREPL(_globals={"data": n}).run(code)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        outputs = list(pool.map(parse, range(8)))
+
+    for n, output in enumerate(outputs):
+        assert output == f"{n}\n" * 50
+    assert sys.stdout is stdout
@@ -0,0 +1,94 @@
+import os
+import json
+
+import pytest
+
+from utils.pushdown import Pushdown
+from utils.scenario_utils import reduce_scenario_spec
+
+SPECS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "specs")
+
+ISSUES = "https://api.github.com/repos/octocat/hello-world/issues"
+
+
+def rewrite(instruction, url=ISSUES, params=None, param_names=(), docs=None):
+    return Pushdown().rewrite(url, params, instruction, param_names=param_names, docs=docs)
+
+
+def test_first_n_asks_for_a_page_of_n():
+    params, added = rewrite("the titles of the first 3 issues")
+    assert added == {"per_page": 3}
+    assert params == {"per_page": 3}
+
+
+@pytest.mark.parametrize("instruction", [
+    "the first 3 open issues labelled bug",
+    "the top 5 issues with more than 10 comments",
+    "the latest 2 issues created after 2023-01-01",
+])
+def test_first_n_with_a_client_side_filter_asks_for_the_largest_page(instruction):
+    _, added = rewrite(instruction)
+    assert added == {"per_page": 100}
+
+
+def test_last_n_adds_no_page_size():
+    # the server returns the album's first tracks: a page of 3 would hide the last ones
+    url = "https://api.spotify.com/v1/albums/4aawyAB9vmqN3uQ7FjRGTy/tracks"
+    _, added = rewrite("the names of the last 3 tracks of the album", url=url, param_names=["limit", "offset"])
+    assert added == {}
+
+
+def test_latest_n_on_a_newest_first_list_asks_for_a_page_of_n():
+    _, added = rewrite("the titles of the latest 3 issues")
+    assert added == {"per_page": 3}
+    url = "https://api.spotify.com/v1/me/player/recently-played"
+    _, added = rewrite("the last 5 tracks I played", url=url, param_names=["limit"])
+    assert added == {"limit": 5}
+
+
+def test_aggregation_asks_for_the_largest_page():
+    _, added = rewrite("how many issues does the repository have")
+    assert added == {"per_page": 100}
+
+
+def test_lookup_adds_no_page_size():
+    _, added = rewrite("the title of the most recently updated issue")
+    assert added == {}
+
+
+def test_parameters_set_by_the_caller_are_kept():
+    params, added = rewrite("the first 3 issues", params={"per_page": 30})
+    assert added == {}
+    assert params == {"per_page": 30}
+
+
+def test_tmdb_sub_resources_are_appended():
+    url = "https://api.themoviedb.org/3/movie/603"
+    _, added = rewrite("who directed the movie and what is its trailer", url=url, param_names=["append_to_response"])
+    assert added == {"append_to_response": "credits,videos"}
+
+
+def test_docker_status_filter():
+    url = "http://localhost:2375/containers/json"
+    _, added = rewrite("the names of the exited containers", url=url)
+    assert json.loads(added["filters"]) == {"status": ["exited"]}
+    assert added["all"] == "true"
+
+
+@pytest.fixture(scope="module")
+def spotify_spec():
+    with open(os.path.join(SPECS, "spotify_oas.json")) as f:
+        return reduce_scenario_spec("spotify", json.load(f))
+
+
+@pytest.mark.parametrize("name, url", [
+    ("GET /playlists/{playlist_id}", "https://api.spotify.com/v1/playlists/37i9dQZF1DXcBWIGoYBM5M"),
+    ("GET /playlists/{playlist_id}/tracks", "https://api.spotify.com/v1/playlists/37i9dQZF1DXcBWIGoYBM5M/tracks"),
+])
+def test_spotify_projection_from_the_shared_read_only_docs(spotify_spec, name, url):
+    endpoint = spotify_spec.get_endpoint(name)
+    instruction = "the names and artists of the tracks"
+    _, added = rewrite(instruction, url=url, param_names=endpoint.param_names, docs=endpoint.frozen_docs)
+    _, from_copy = rewrite(instruction, url=url, param_names=endpoint.param_names, docs=endpoint.docs)
+    assert added == from_copy
+    assert "track(" in added["fields"] and "artists" in added["fields"]
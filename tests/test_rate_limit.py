@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+from utils.rate_limit import RateLimiter, credential_key, retry_after_seconds
+from utils.resilience import DeadlineExceeded, deadline_scope
+
+
+def test_credentials_get_their_own_bucket_without_keeping_the_secret():
+    key = credential_key("api.github.com", {"Authorization": "token secret"})
+    assert key.startswith("api.github.com#") and "secret" not in key
+    assert key != credential_key("api.github.com", {"Authorization": "token other"})
+    assert credential_key("api.github.com", {"Accept": "application/json"}) == "api.github.com"
+
+
+def test_burst_then_queue_at_the_host_rate():
+    limiter = RateLimiter({"api.example.com": (10.0, 2.0)})
+    waits = [limiter.reserve("api.example.com") for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(0.1, abs=0.01)
+    assert waits[3] == pytest.approx(0.2, abs=0.01)
+
+
+def test_concurrent_reservations_each_take_one_slot():
+    limiter = RateLimiter({"api.example.com": (1.0, 50.0)})
+    waits = []
+    lock = threading.Lock()
+
+    def reserve():
+        wait = limiter.reserve("api.example.com")
+        with lock:
+            waits.append(wait)
+
+    threads = [threading.Thread(target=reserve) for _ in range(60)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 50 from the burst, the other 10 queued one second apart
+    assert sum(wait == 0 for wait in waits) == 50
+    assert sorted(round(wait) for wait in waits if wait > 0) == list(range(1, 11))
+
+
+def test_exhausted_quota_blocks_until_the_reset():
+    limiter = RateLimiter({})
+    limiter.update("api.github.com", 403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "30"})
+    assert limiter.reserve("api.github.com") == pytest.approx(30, abs=0.5)
+    limiter.update("gitlab.com", 429, {"Retry-After": "5"})
+    assert limiter.reserve("gitlab.com") == pytest.approx(5, abs=0.5)
+    # other hosts are not affected
+    assert limiter.reserve("api.spotify.com") == 0
+
+
+def test_acquire_refuses_to_wait_past_the_deadline():
+    limiter = RateLimiter({})
+    limiter.update("api.github.com", 429, {"Retry-After": "60"})
+    with deadline_scope(1), pytest.raises(DeadlineExceeded):
+        limiter.acquire("api.github.com")
+
+
+def test_rate_limited_responses():
+    assert RateLimiter.is_rate_limited(429, {})
+    assert RateLimiter.is_rate_limited(403, {"X-RateLimit-Remaining": "0"})
+    assert not RateLimiter.is_rate_limited(403, {"X-RateLimit-Remaining": "12"})
+    assert retry_after_seconds("120") == 120
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT", now=1445412470) == 10
+    assert retry_after_seconds("soon") is None
@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from utils.resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceeded, RetryPolicy,
+    attempt_timeout, deadline_scope, hedged_call, race, remaining_time, retry_call,
+)
+
+NO_WAIT = RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0)
+
+
+def test_retry_call_retries_transient_errors():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("reset")
+        return "ok"
+
+    assert retry_call(flaky, NO_WAIT) == "ok"
+    assert len(attempts) == 3
+
+
+def test_retry_call_does_not_retry_other_errors():
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise KeyError("bug")
+
+    with pytest.raises(KeyError):
+        retry_call(broken, NO_WAIT)
+    assert len(attempts) == 1
+
+
+def test_retry_call_returns_the_last_retryable_result():
+    results = iter([503, 503, 503, 200])
+    assert retry_call(lambda: next(results), NO_WAIT, retry_on_result=lambda status: status == 503) == 503
+
+
+def test_nested_deadlines_only_shorten():
+    with deadline_scope(10):
+        with deadline_scope(100):
+            assert remaining_time() <= 10
+        with deadline_scope(0.001):
+            time.sleep(0.01)
+            with pytest.raises(DeadlineExceeded):
+                attempt_timeout(5)
+    assert remaining_time() is None
+
+
+def test_hedged_call_returns_the_first_copy_to_finish():
+    calls = []
+
+    def slow_then_fast():
+        calls.append(1)
+        time.sleep(0.5 if len(calls) == 1 else 0.0)
+        return len(calls)
+
+    start = time.monotonic()
+    assert hedged_call(slow_then_fast, hedge_after=0.02) == 2
+    assert time.monotonic() - start < 0.4
+
+
+def test_race_returns_the_first_valid_result_and_cancels_the_others():
+    seen_cancel = threading.Event()
+
+    def slow(cancelled):
+        cancelled.wait(2)
+        if cancelled.is_set():
+            seen_cancel.set()
+        return "slow"
+
+    def invalid(cancelled):
+        return ""
+
+    def fast(cancelled):
+        time.sleep(0.01)
+        return "fast"
+
+    assert race({"slow": slow, "invalid": invalid, "fast": fast}, is_valid=bool) == ("fast", "fast")
+    assert seen_cancel.wait(1)
+
+
+def test_race_without_a_valid_result():
+    name, result = race({"a": lambda cancelled: "", "b": lambda cancelled: ""}, is_valid=bool)
+    assert name is None and result == ""
+
+
+def test_race_raises_only_when_every_branch_failed():
+    def fail(cancelled):
+        raise ValueError("no")
+
+    assert race({"fail": fail, "ok": lambda cancelled: "yes"}, is_valid=bool) == ("ok", "yes")
+    with pytest.raises(ValueError):
+        race({"a": fail, "b": fail}, is_valid=bool)
+
+
+def test_circuit_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker("api.example.com", failure_threshold=2, reset_timeout=0.05)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    breaker.before_call()  # the single probe
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker("api.example.com", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
@@ -0,0 +1,70 @@
+import re
+import json
+
+from utils.schema_index import SchemaIndex, schema_index, words
+
+
+class WordEncoder:
+    """One token per word or punctuation mark, whitespace free, roughly like tiktoken on JSON."""
+
+    def encode(self, text):
+        return re.findall(r"\w+|[^\w\s]", text)
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def movie_credits_schema():
+    person = {
+        "id": {"type": "integer"},
+        "name": {"type": "string"},
+        "job": {"type": "string", "description": "The job of the crew member, e.g. Director"},
+        "department": {"type": "string"},
+        "profile_path": {"type": "string", "description": "Path of the profile image"},
+    }
+    properties = {
+        "id": {"type": "integer"},
+        "cast": {"type": "array", "items": {"type": "object", "properties": {**person, "character": {"type": "string"}}}},
+        "crew": {"type": "array", "items": {"type": "object", "properties": person}},
+    }
+    properties.update({f"padding_{i}": {"type": "string", "description": "unrelated " * 10} for i in range(20)})
+    return {"type": "object", "properties": properties}
+
+
+def test_words_splits_names_and_drops_stopwords():
+    assert words("Who directed the movies? profilePath crew_members") == {"directed", "movie", "profile", "path", "crew", "member"}
+
+
+def test_whole_schema_when_it_fits_or_without_a_query():
+    schema = movie_credits_schema()
+    index = SchemaIndex(schema, WordEncoder())
+    text, kept = index.render("who is the director", 10 ** 6)
+    assert json.loads(text) == schema["properties"]
+    assert kept == len(index.fields)
+    text, _ = index.render(None, 100)
+    assert text.endswith("...") and len(WordEncoder().encode(text[:-3])) == 100
+
+
+def test_pruned_schema_keeps_the_fields_of_the_query_within_budget():
+    index = SchemaIndex(movie_credits_schema(), WordEncoder())
+    text, kept = index.render("which crew member has the job Director", 300)
+    assert len(WordEncoder().encode(text)) <= 300
+    pruned = json.loads(text)
+    crew = pruned["crew"]["items"]["properties"]
+    # the matching field, with the ids and names beside it
+    assert {"job", "id", "name"} <= set(crew)
+    assert kept < len(index.fields)
+    assert "cast" not in pruned or "character" not in pruned["cast"]["items"]["properties"]
+
+
+def test_list_schemas_keep_their_shape():
+    schema = {"type": "array", "items": {"type": "object", "properties": movie_credits_schema()["properties"]}}
+    text, _ = SchemaIndex(schema, WordEncoder()).render("crew job", 300)
+    pruned = json.loads(text)
+    assert isinstance(pruned, list) and "crew" in pruned[0]
+
+
+def test_index_is_built_once_per_schema():
+    schema, encoder = movie_credits_schema(), WordEncoder()
+    assert schema_index("/movie/{movie_id}/credits", schema, encoder) is schema_index("/movie/{movie_id}/credits", schema, encoder)
+    assert schema_index("/movie/{movie_id}/credits", movie_credits_schema(), encoder) is not schema_index("/movie/{movie_id}/credits", schema, encoder)
@@ -0,0 +1,58 @@
+import queue
+import logging
+import threading
+
+from serve import QueryTraceHandler
+from utils.resilience import race
+
+logger = logging.getLogger("restgpt.test_serve")
+
+
+def _traced(handler, fn):
+    trace_queue = queue.Queue()
+    token = handler.attach(trace_queue)
+    try:
+        fn()
+    finally:
+        handler.detach(token)
+    return [trace_queue.get_nowait()["message"] for _ in range(trace_queue.qsize())]
+
+
+def test_records_from_race_threads_reach_the_query_trace():
+    handler = QueryTraceHandler()
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    try:
+        def query():
+            logger.info("Query: how many stars")
+            race({"code": lambda cancelled: logger.info("Code: print(data['stargazers_count'])") or "42"}, is_valid=bool)
+
+        messages = _traced(handler, query)
+    finally:
+        logger.removeHandler(handler)
+    assert messages == ["Query: how many stars", "Code: print(data['stargazers_count'])"]
+
+
+def test_concurrent_queries_keep_their_own_traces():
+    handler = QueryTraceHandler()
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    barrier = threading.Barrier(2)
+    traces = {}
+
+    def run(name):
+        def query():
+            barrier.wait(2)
+            race({"llm": lambda cancelled: logger.info(f"Parser: {name}") or name}, is_valid=bool)
+        traces[name] = _traced(handler, query)
+
+    try:
+        threads = [threading.Thread(target=run, args=(name,)) for name in ("a", "b")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        logger.info("outside any query")
+    finally:
+        logger.removeHandler(handler)
+    assert traces == {"a": ["Parser: a"], "b": ["Parser: b"]}
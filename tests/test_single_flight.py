@@ -0,0 +1,128 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.resilience import DeadlineExceeded, deadline_scope
+from utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_with_one_key_run_once():
+    flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def fetch():
+        runs.append(1)
+        release.wait(2)
+        return "body"
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futures = [pool.submit(flight.do, "GET /movie/603", fetch) for _ in range(5)]
+        while flight.stats()["calls"] < 5:
+            time.sleep(0.001)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(runs) == 1
+    assert [result for result, _ in results] == ["body"] * 5
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+
+
+def test_followers_get_the_leaders_error():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(2)
+        raise ConnectionError("reset")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [pool.submit(flight.do, "k", fail) for _ in range(2)]
+        while flight.stats()["calls"] < 2:
+            time.sleep(0.001)
+        release.set()
+        for future in futures:
+            with pytest.raises(ConnectionError):
+                future.result()
+
+
+def test_nothing_is_cached_after_the_call_returns():
+    flight = SingleFlight()
+    assert flight.do("k", lambda: 1) == (1, False)
+    assert flight.do("k", lambda: 2) == (2, False)
+
+
+def test_followers_wait_at_most_until_the_deadline():
+    flight = SingleFlight()
+    release = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        leader = pool.submit(flight.do, "k", lambda: release.wait(2))
+        while flight.stats()["calls"] < 1:
+            time.sleep(0.001)
+        with deadline_scope(0.05), pytest.raises(DeadlineExceeded):
+            flight.do("k", lambda: None)
+        release.set()
+        assert leader.result() == (True, False)
+
+
+def test_followers_retry_when_the_leader_runs_out_of_its_own_deadline():
+    flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def fetch():
+        runs.append(1)
+        if len(runs) == 1:
+            release.wait(2)
+            raise DeadlineExceeded("the leader's query ran out of time")
+        # long enough for the other follower to join this call
+        time.sleep(0.1)
+        return "body"
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(flight.do, "k", fetch) for _ in range(3)]
+        while flight.stats()["calls"] < 3:
+            time.sleep(0.001)
+        release.set()
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append(future.result()[0])
+            except DeadlineExceeded:
+                outcomes.append("deadline")
+
+    # only the leader fails; one follower leads the second call, the other shares it
+    assert sorted(outcomes) == ["body", "body", "deadline"]
+    assert len(runs) == 2
+
+
+def test_followers_retry_after_a_timeout_cut_short_by_the_leaders_deadline():
+    flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def fetch():
+        runs.append(1)
+        if len(runs) == 1:
+            release.wait(2)
+            raise TimeoutError("read timed out")
+        return "body"
+
+    def leader():
+        with deadline_scope(0.2):
+            return flight.do("k", fetch)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leading = pool.submit(leader)
+        while flight.stats()["calls"] < 1:
+            time.sleep(0.001)
+        following = pool.submit(flight.do, "k", fetch)
+        while flight.stats()["calls"] < 2:
+            time.sleep(0.001)
+        time.sleep(0.2)
+        release.set()
+        with pytest.raises(TimeoutError):
+            leading.result()
+        assert following.result() == ("body", False)
@@ -0,0 +1,64 @@
+import json
+
+from utils.scenario_utils import reduce_scenario_spec
+from utils.spec_store import SpecStore, build_spec_store, open_spec_store
+
+
+def write_spec(spec_dir, description="Get the details of a movie."):
+    spec = {
+        "openapi": "3.0.0",
+        "info": {"title": "TMDB", "description": "The Movie Database"},
+        "servers": [{"url": "https://api.themoviedb.org/3"}],
+        "paths": {
+            "/movie/{movie_id}": {"get": {
+                "description": description,
+                "parameters": [{"name": "movie_id", "in": "path", "required": True, "schema": {"type": "integer"}}],
+                "responses": {"200": {"description": "OK", "content": {"application/json": {"schema": {
+                    "type": "object", "properties": {"id": {"type": "integer"}, "title": {"type": "string"}},
+                }}}}},
+            }},
+            "/search/movie": {"get": {
+                "description": "Search for movies by title.",
+                "parameters": [{"name": "query", "in": "query", "required": True, "schema": {"type": "string"}}],
+                "responses": {"200": {"description": "OK"}},
+            }},
+        },
+    }
+    spec_dir.mkdir(exist_ok=True)
+    (spec_dir / "tmdb_oas.json").write_text(json.dumps(spec))
+
+
+def test_store_roundtrip_matches_the_reduced_spec(tmp_path):
+    write_spec(tmp_path / "specs")
+    path = build_spec_store("tmdb", str(tmp_path / "tmdb.spec"), spec_dir=str(tmp_path / "specs"))
+    expected = reduce_scenario_spec("tmdb", json.loads((tmp_path / "specs" / "tmdb_oas.json").read_text()))
+    store = SpecStore(path)
+    try:
+        assert store.api_spec.servers == expected.servers
+        assert store.api_spec.description == expected.description
+        assert [e.name for e in store.api_spec.endpoints] == ["GET /movie/{movie_id}", "GET /search/movie"]
+        for endpoint in expected.endpoints:
+            mapped = store.api_spec.get_endpoint(endpoint.name)
+            assert (mapped.description, list(mapped.param_names)) == (endpoint.description, list(endpoint.param_names))
+            assert mapped.docs == endpoint.docs
+            assert json.loads(mapped.raw_docs().tobytes()) == endpoint.docs
+    finally:
+        store.close()
+
+
+def test_open_rebuilds_only_when_the_spec_changes(tmp_path):
+    spec_dir, store_dir = tmp_path / "specs", str(tmp_path / "store")
+    write_spec(spec_dir)
+    first = open_spec_store("tmdb", store_dir=store_dir, spec_dir=str(spec_dir))
+    second = open_spec_store("tmdb", store_dir=store_dir, spec_dir=str(spec_dir))
+    assert second.source_digest == first.source_digest
+    write_spec(spec_dir, description="Primary information about a movie.")
+    third = open_spec_store("tmdb", store_dir=store_dir, spec_dir=str(spec_dir))
+    try:
+        assert third.source_digest != first.source_digest
+        assert third.api_spec.get_endpoint("GET /movie/{movie_id}").description == "Primary information about a movie."
+        # a store mapped before the rebuild still reads its own copy
+        assert first.api_spec.get_endpoint("GET /movie/{movie_id}").description == "Get the details of a movie."
+    finally:
+        for store in (first, second, third):
+            store.close()
@@ -0,0 +1,64 @@
+import json
+import os
+
+import wash_oas_dict
+from wash_oas_dict import MANIFEST_NAME, build_specs
+
+
+def _raw_spec(path):
+    return {
+        "openapi": "3.0.0",
+        "servers": [{"url": "https://example.com"}],
+        "paths": {path: {"get": {"description": f"get {path}", "responses": {"200": {"description": "ok"}}}}},
+    }
+
+
+def _write(path, obj):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+    return path
+
+
+def _manifest(spec_dir):
+    with open(os.path.join(spec_dir, MANIFEST_NAME), encoding="utf-8") as f:
+        return json.load(f)["files"]
+
+
+def test_partial_build_keeps_the_cache_of_other_specs(tmp_path, monkeypatch):
+    raw, spec_dir = tmp_path / "APIs", str(tmp_path / "specs")
+    gitlab = _write(str(raw / "gitlab" / "projects.json"), _raw_spec("/projects"))
+    docker = _write(str(raw / "docker" / "containers.json"), _raw_spec("/containers/json"))
+    assert build_specs({"gitlab": [gitlab], "docker": [docker]}, spec_dir=spec_dir, max_workers=1) == {}
+    assert set(_manifest(spec_dir)) == {gitlab, docker}
+
+    reduced = []
+    original = wash_oas_dict.ProcessPoolExecutor
+
+    class RecordingPool(original):
+        def map(self, fn, paths, **kwargs):
+            paths = list(paths)
+            reduced.extend(paths)
+            return super().map(fn, paths, **kwargs)
+
+    monkeypatch.setattr(wash_oas_dict, "ProcessPoolExecutor", RecordingPool)
+    # a partial, forced rebuild of gitlab keeps docker's entry ...
+    assert build_specs({"gitlab": [gitlab]}, spec_dir=spec_dir, max_workers=1, force=True) == {}
+    assert reduced == [gitlab]
+    assert set(_manifest(spec_dir)) == {gitlab, docker}
+    # ... so the next full build re-reduces nothing
+    reduced.clear()
+    build_specs({"gitlab": [gitlab], "docker": [docker]}, spec_dir=spec_dir, max_workers=1)
+    assert reduced == []
+
+
+def test_deleted_files_leave_the_manifest(tmp_path):
+    raw, spec_dir = tmp_path / "APIs", str(tmp_path / "specs")
+    kept = _write(str(raw / "gitlab" / "projects.json"), _raw_spec("/projects"))
+    removed = _write(str(raw / "gitlab" / "issues.json"), _raw_spec("/issues"))
+    build_specs({"gitlab": [kept, removed]}, spec_dir=spec_dir, max_workers=1)
+    os.remove(removed)
+    build_specs({"gitlab": [kept]}, spec_dir=spec_dir, max_workers=1)
+    assert set(_manifest(spec_dir)) == {kept}
+    with open(os.path.join(spec_dir, "gitlab.json"), encoding="utf-8") as f:
+        assert list(json.load(f)["paths"]) == ["/projects"]
@@ -1,2 +1,53 @@
-from .utils import simplify_json, get_matched_endpoint, ColorPrint, fix_json_error, MyRotatingFileHandler, init_spotify
-from .oas_utils import ReducedOpenAPISpec, reduce_openapi_spec
\ No newline at end of file
+# Names are resolved on first use (PEP 562) so that importing one helper does
+# not drag in LangChain, tiktoken or requests for scripts that never need them.
+import importlib
+
+_LAZY_ATTRS = {
+    'simplify_json': '.utils',
+    'get_matched_endpoint': '.utils',
+    'ColorPrint': '.utils',
+    'fix_json_error': '.utils',
+    'MyRotatingFileHandler': '.utils',
+    'init_spotify': '.utils',
+    'get_encoder': '.utils',
+    'ReducedOpenAPISpec': '.oas_utils',
+    'reduce_openapi_spec': '.oas_utils',
+    'load_config': '.scenario_utils',
+    'apply_config_env': '.scenario_utils',
+    'load_scenario': '.scenario_utils',
+    'build_llms': '.scenario_utils',
+    'HttpTransport': '.transport',
+    'PooledRequestsWrapper': '.transport',
+    'RetryPolicy': '.resilience',
+    'CircuitBreakerRegistry': '.resilience',
+    'deadline_scope': '.resilience',
+    'BudgetPolicy': '.budget',
+    'budget_scope': '.budget',
+    'RateLimiter': '.rate_limit',
+    'PageStream': '.pagination',
+    'Pushdown': '.pushdown',
+    'SingleFlight': '.single_flight',
+    'EntityCache': '.entity_cache',
+    'ParseMemo': '.parse_memo',
+    'SpecRegistry': '.spec_registry',
+    'RunCheckpoint': '.checkpoint',
+    'checkpoint_scope': '.checkpoint',
+    'SpecStore': '.spec_store',
+    'open_spec_store': '.spec_store',
+    'LogPipeline': '.logging_utils',
+    'setup_logging': '.logging_utils',
+}
+
+__all__ = list(_LAZY_ATTRS)
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,132 @@
+"""Per-query resource budgets with cooperative cancellation.
+
+A query runs inside `budget_scope(policy)`. The LLM router and the HTTP
+transport charge the current `Budget` (a context variable, so hedge threads
+started from the query charge it too) before every call and refuse the call
+with `BudgetExceeded` once a limit is reached; the chains' loops call
+`check_budget()` between steps. RestGPT catches the error and answers with
+what it has so far. The wall-time limit becomes the query deadline, which
+also shortens each HTTP and LLM timeout.
+"""
+
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Iterator, Optional
+
+from .resilience import deadline_scope
+
+logger = logging.getLogger(__name__)
+
+
+class BudgetExceeded(RuntimeError):
+    def __init__(self, resource: str, used: float, limit: float):
+        super().__init__(f"query budget exhausted: {resource} {used:g} of {limit:g}")
+        self.resource = resource
+        self.used = used
+        self.limit = limit
+
+
+@dataclass
+class BudgetPolicy:
+    # None leaves a resource unlimited
+    max_seconds: Optional[float] = None
+    max_llm_calls: Optional[int] = 80
+    max_prompt_tokens: Optional[int] = None
+    max_completion_tokens: Optional[int] = None
+    max_http_calls: Optional[int] = None
+    max_http_bytes: Optional[int] = None
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> "BudgetPolicy":
+        """Build from the `query_budget` section of config.yaml."""
+        return cls(**(config or {}))
+
+    def limits(self) -> Dict[str, Optional[float]]:
+        return {f.name[len("max_"):]: getattr(self, f.name) for f in fields(self)}
+
+
+class Budget:
+    """What one query has used so far against its `BudgetPolicy`; safe to charge from several threads."""
+
+    def __init__(self, policy: BudgetPolicy):
+        self.policy = policy
+        self.limits = policy.limits()
+        self.used: Dict[str, float] = {resource: 0 for resource in self.limits}
+        self.start_time = time.monotonic()
+        # the first limit that was hit; every later charge or check fails with it
+        self.exceeded: Optional[BudgetExceeded] = None
+        self._lock = threading.Lock()
+
+    def _fail(self, resource: str, used: float) -> None:
+        if self.exceeded is None:
+            self.exceeded = BudgetExceeded(resource, used, self.limits[resource])
+            logger.info(f"Budget: {self.exceeded}, cancelling the query")
+        raise self.exceeded
+
+    def check(self) -> None:
+        """Raise `BudgetExceeded` if any limit has been reached."""
+        with self._lock:
+            if self.exceeded is not None:
+                raise self.exceeded
+            elapsed = time.monotonic() - self.start_time
+            if self.limits["seconds"] is not None and elapsed >= self.limits["seconds"]:
+                self._fail("seconds", elapsed)
+
+    def charge(self, **amounts: float) -> None:
+        """Add `amounts` (e.g. `llm_calls=1, prompt_tokens=812`) if they fit, else raise without charging."""
+        self.check()
+        with self._lock:
+            for resource, amount in amounts.items():
+                limit = self.limits[resource]
+                if limit is not None and self.used[resource] + amount > limit:
+                    self._fail(resource, self.used[resource] + amount)
+            for resource, amount in amounts.items():
+                self.used[resource] += amount
+
+    def record(self, **amounts: float) -> None:
+        """Add what a finished call used (completion tokens, response bytes); later charges see it."""
+        with self._lock:
+            for resource, amount in amounts.items():
+                self.used[resource] += amount
+
+    def usage(self) -> Dict[str, float]:
+        with self._lock:
+            usage = dict(self.used)
+        usage["seconds"] = round(time.monotonic() - self.start_time, 2)
+        return usage
+
+    def summary(self) -> str:
+        return " ".join(f"{resource}={amount:g}" for resource, amount in self.usage().items())
+
+
+_budget: contextvars.ContextVar[Optional[Budget]] = contextvars.ContextVar("restgpt_budget", default=None)
+
+
+@contextmanager
+def budget_scope(policy: Optional[BudgetPolicy]) -> Iterator[Optional[Budget]]:
+    """Run the block on a fresh `Budget`; its wall-time limit is also applied as a deadline."""
+    if policy is None:
+        yield None
+        return
+    budget = Budget(policy)
+    token = _budget.set(budget)
+    try:
+        with deadline_scope(policy.max_seconds):
+            yield budget
+    finally:
+        _budget.reset(token)
+
+
+def current_budget() -> Optional[Budget]:
+    return _budget.get()
+
+
+def check_budget() -> None:
+    """Cancellation point for loops: raise `BudgetExceeded` if the current query is out of budget."""
+    budget = _budget.get()
+    if budget is not None:
+        budget.check()
@@ -0,0 +1,125 @@
+"""Durable progress of batch runs, so a crashed or interrupted run can resume.
+
+A `RunCheckpoint` is a SQLite file with one row per finished query (its
+answer, or the error it failed with) and one row per query in flight with
+the state of its plan: the planner history, the next plan and the API
+selector history of the step under way. Every write is its own
+transaction. RestGPT saves the plan state after each completed step
+through `checkpoint_scope`, and on resume continues from it instead of
+planning (and paying for) the finished steps again. Finished queries are
+also appended to a JSONL file next to the database.
+"""
+
+import json
+import time
+import sqlite3
+import threading
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+
+class RunCheckpoint:
+    """Finished queries and in-flight plan states of one batch run, by query index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.jsonl_path = str(Path(path).with_suffix(".jsonl"))
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " idx INTEGER PRIMARY KEY, query TEXT NOT NULL, status TEXT NOT NULL,"
+                " result TEXT, error TEXT, seconds REAL, finished_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS progress ("
+                " idx INTEGER PRIMARY KEY, query TEXT NOT NULL, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def finished(self) -> Dict[int, str]:
+        """{index: query} of the queries that returned an answer (failed ones are run again)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT idx, query FROM results WHERE status = 'done'").fetchall()
+        return dict(rows)
+
+    def state(self, index: int, query: str) -> Optional[Dict[str, Any]]:
+        """The last saved plan state of query `index`, if it was saved for this same query."""
+        with self._lock:
+            row = self._conn.execute("SELECT query, state FROM progress WHERE idx = ?", (index,)).fetchone()
+        if row is None or row[0] != query:
+            return None
+        return json.loads(row[1])
+
+    def save_state(self, index: int, query: str, state: Dict[str, Any]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO progress VALUES (?, ?, ?, ?)",
+                (index, query, json.dumps(state, ensure_ascii=False), time.time()),
+            )
+
+    def finish(self, index: int, query: str, result: Optional[str] = None, error: Optional[str] = None,
+               seconds: Optional[float] = None) -> None:
+        """Record the outcome of query `index`; a failed query keeps its plan state to resume from."""
+        record = {
+            "idx": index, "query": query, "status": "error" if error is not None else "done",
+            "result": result, "error": error, "seconds": seconds, "finished_at": time.time(),
+        }
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results VALUES (:idx, :query, :status, :result, :error, :seconds, :finished_at)",
+                    record,
+                )
+                if error is None:
+                    self._conn.execute("DELETE FROM progress WHERE idx = ?", (index,))
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def results(self) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM results ORDER BY idx")
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        return (dict(zip(columns, row)) for row in rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class QueryCheckpoint:
+    """The plan state of one query of a `RunCheckpoint`; what RestGPT saves and resumes from."""
+
+    def __init__(self, run: RunCheckpoint, index: int, query: str, resume: bool = True):
+        self.run = run
+        self.index = index
+        self.query = query
+        self.resume = resume
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        return self.run.state(self.index, self.query) if self.resume else None
+
+    def save(self, state: Dict[str, Any]) -> None:
+        self.run.save_state(self.index, self.query, state)
+
+
+_checkpoint: contextvars.ContextVar[Optional[QueryCheckpoint]] = contextvars.ContextVar("restgpt_checkpoint", default=None)
+
+
+@contextmanager
+def checkpoint_scope(checkpoint: Optional[QueryCheckpoint]) -> Iterator[Optional[QueryCheckpoint]]:
+    """Run the block with `checkpoint` as the one RestGPT saves its plan state to."""
+    token = _checkpoint.set(checkpoint)
+    try:
+        yield checkpoint
+    finally:
+        _checkpoint.reset(token)
+
+
+def current_checkpoint() -> Optional[QueryCheckpoint]:
+    return _checkpoint.get()
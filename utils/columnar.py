@@ -0,0 +1,209 @@
+"""Columnar view of JSON item lists and the helpers parser code can call on it.
+
+Parser code used to walk `data` with hand-written loops. `Table` wraps a
+list of dicts (`data['results']`, `data['crew']`, ...) and builds one
+column per field on first use: a NumPy array when NumPy is installed
+(numbers as float with NaN for missing values, everything else as
+objects), a plain list otherwise. `filter_by`, `sort_by`, `top_k` and
+`group_count` then work on whole columns and return another `Table` over
+the same row dicts, which iterates, indexes and prints like a list.
+"""
+
+import math
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Union
+
+try:
+    import numpy as np
+except ImportError:  # the helpers fall back to plain Python
+    np = None
+
+OPERATORS = ("gt", "ge", "lt", "le", "ne", "in", "contains")
+
+
+def _get(row: Any, field: str) -> Any:
+    for part in field.split("."):
+        if not isinstance(row, dict):
+            return None
+        row = row.get(part)
+    return row
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class Table:
+    """Rows (the original dicts) with lazily built columns; a field may be a dotted path."""
+
+    __slots__ = ("rows", "_columns")
+
+    def __init__(self, rows: Iterable[Any]):
+        self.rows: List[Any] = rows.rows if isinstance(rows, Table) else list(rows)
+        self._columns: Dict[str, Any] = {}
+
+    def column(self, field: str) -> Any:
+        column = self._columns.get(field)
+        if column is None:
+            values = [_get(row, field) for row in self.rows]
+            if np is not None:
+                if values and all(value is None or _is_number(value) for value in values):
+                    column = np.array([math.nan if value is None else value for value in values], dtype=float)
+                else:
+                    column = np.empty(len(values), dtype=object)
+                    column[:] = values
+            else:
+                column = values
+            self._columns[field] = column
+        return column
+
+    def take(self, indices: Iterable[int]) -> "Table":
+        return Table([self.rows[i] for i in indices])
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.rows)
+
+    def __getitem__(self, key: Union[int, slice, str]) -> Any:
+        if isinstance(key, str):
+            return pluck(self, key)
+        if isinstance(key, slice):
+            return Table(self.rows[key])
+        return self.rows[key]
+
+    def __eq__(self, other: Any) -> bool:
+        return list(self.rows) == list(other.rows if isinstance(other, Table) else other)
+
+    def __repr__(self) -> str:
+        return repr(self.rows)
+
+
+def as_table(items: Any) -> Table:
+    return items if isinstance(items, Table) else Table(items or [])
+
+
+def _compare(value: Any, op: str, expected: Any) -> bool:
+    try:
+        if op == "eq":
+            return expected(value) if callable(expected) else value == expected
+        if op == "ne":
+            return value != expected
+        if op == "in":
+            return value in expected
+        if op == "contains":
+            if isinstance(value, str):
+                return str(expected).lower() in value.lower()
+            return value is not None and expected in value
+        if value is None:
+            return False
+        return {"gt": value > expected, "ge": value >= expected, "lt": value < expected, "le": value <= expected}[op]
+    except TypeError:
+        return False
+
+
+def _mask(column: Any, op: str, expected: Any) -> Any:
+    if np is not None and column.dtype == float and (_is_number(expected) or op == "in"):
+        # NaN (missing) compares False everywhere except for !=
+        if op == "eq":
+            return column == expected
+        if op == "ne":
+            return column != expected
+        if op == "in":
+            return np.isin(column, [value for value in expected if _is_number(value)])
+        if op in ("gt", "ge", "lt", "le"):
+            with np.errstate(invalid="ignore"):
+                return {"gt": column > expected, "ge": column >= expected, "lt": column < expected, "le": column <= expected}[op]
+    values = [_compare(value, op, expected) for value in column]
+    return np.array(values, dtype=bool) if np is not None else values
+
+
+def filter_by(items: Any, **conditions: Any) -> Table:
+    """Rows matching every condition: `field=value` (or a predicate), or `field__op=value`.
+
+    `op` is one of gt, ge, lt, le, ne, in, contains (case-insensitive for
+    strings). Nested fields: `filter_by(items, **{'user.login': 'harry'})`.
+    """
+    table = as_table(items)
+    if np is not None:
+        keep = np.ones(len(table), dtype=bool)
+    else:
+        keep = [True] * len(table)
+    for key, expected in conditions.items():
+        field, _, op = key.rpartition("__") if key.rsplit("__", 1)[-1] in OPERATORS else (key, "", "eq")
+        mask = _mask(table.column(field), op, expected)
+        keep = keep & mask if np is not None else [a and b for a, b in zip(keep, mask)]
+    indices = np.flatnonzero(keep) if np is not None else [i for i, ok in enumerate(keep) if ok]
+    return table.take(indices)
+
+
+def _sort_key(value: Any) -> tuple:
+    # missing values last, numbers before everything else
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return (2, 0)
+    return (0, value) if _is_number(value) else (1, str(value))
+
+
+def sort_by(items: Any, field: str, reverse: bool = False) -> Table:
+    """Rows sorted by `field` (stable); missing values always come last."""
+    table = as_table(items)
+    column = table.column(field)
+    if np is not None and column.dtype == float:
+        present = np.flatnonzero(~np.isnan(column))
+        order = present[np.argsort(-column[present] if reverse else column[present], kind="stable")]
+        return table.take(list(order) + list(np.flatnonzero(np.isnan(column))))
+    keys = [_sort_key(value) for value in column]
+    present = sorted((i for i, key in enumerate(keys) if key[0] != 2), key=lambda i: keys[i], reverse=reverse)
+    return table.take(present + [i for i, key in enumerate(keys) if key[0] == 2])
+
+
+def top_k(items: Any, field: str, k: int = 5, largest: bool = True) -> Table:
+    """The `k` rows with the largest (or smallest) `field`, in order."""
+    table = as_table(items)
+    column = table.column(field)
+    if np is not None and column.dtype == float and k < len(table):
+        present = np.flatnonzero(~np.isnan(column))
+        values = -column[present] if largest else column[present]
+        if k < len(present):
+            # partial selection, then a stable sort of just the k candidates
+            candidates = present[np.argpartition(values, k - 1)[:k]]
+            values = -column[candidates] if largest else column[candidates]
+            return table.take(candidates[np.argsort(values, kind="stable")])
+        return table.take(present[np.argsort(values, kind="stable")])
+    return sort_by(table, field, reverse=largest)[:k]
+
+
+def group_count(items: Any, field: str) -> Dict[Any, int]:
+    """{value: number of rows}, most frequent first; rows without the field are not counted."""
+    table = as_table(items)
+    column = table.column(field)
+    if np is not None and column.dtype == float:
+        values, counts = np.unique(column[~np.isnan(column)], return_counts=True)
+        pairs = [(int(v) if float(v).is_integer() else float(v), int(c)) for v, c in zip(values, counts)]
+    else:
+        pairs = list(Counter(value for value in column if value is not None and not isinstance(value, (dict, list))).items())
+    return dict(sorted(pairs, key=lambda pair: -pair[1]))
+
+
+def pluck(items: Any, field: str) -> List[Any]:
+    """The values of `field`, one per row (None where missing)."""
+    return [_get(row, field) for row in as_table(items)]
+
+
+def parser_helpers() -> Dict[str, Callable]:
+    """Globals the parser's REPL gets besides `data`."""
+    return {
+        "table": as_table, "filter_by": filter_by, "sort_by": sort_by,
+        "top_k": top_k, "group_count": group_count, "pluck": pluck,
+    }
+
+
+# described to the LLM in the parser's code prompts (braces doubled for the templates)
+HELPERS_DOC = """Besides 'data', these helpers are defined (do not import or redefine them). `items` is a list of dicts such as data['results'] or data['crew'], and a field may be nested with dots (e.g. 'user.login'). They are much faster than loops on long lists, so prefer them:
+- filter_by(items, **conditions): rows where every condition holds, e.g. filter_by(data['crew'], job='Director'). Add __gt, __ge, __lt, __le, __ne, __in or __contains (case-insensitive substring) to a field to compare, e.g. filter_by(items, vote_count__gt=100, title__contains='love'); nested fields: filter_by(items, **{{'user.login': 'harry'}})
+- sort_by(items, field, reverse=False): rows sorted by the field
+- top_k(items, field, k=5, largest=True): the k rows with the largest (or smallest) value of the field
+- group_count(items, field): {{value: count}}, most frequent first
+- pluck(items, field): the list of the field's values
+The rows returned can be iterated, indexed, sliced and passed to len() and to the other helpers."""
@@ -0,0 +1,245 @@
+"""Cross-session cache of resolved entities (name -> id), kept in SQLite.
+
+Most plans start by resolving names: "search person Tony Leung" -> 1337,
+"GitHub user harry" -> 583231, "search artist Coldplay" -> 4gzpq5... The
+cache learns these from the responses the parser worked on and hands the
+ones a new query mentions to the planner and the API selector as
+background, so known ids skip the search round trip. Entries expire per
+entity type: people and movies hardly change their id, playlists and users
+may be renamed or deleted.
+"""
+
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from .pagination import page_items
+from .transport import host_key
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 3600
+
+# seconds an entry of each type stays valid; other types get DEFAULT_TTL
+DEFAULT_TTLS: Dict[str, float] = {
+    "person": 30 * DAY, "movie": 30 * DAY, "tv": 30 * DAY, "company": 30 * DAY,
+    "collection": 30 * DAY, "keyword": 30 * DAY, "network": 30 * DAY,
+    "artist": 30 * DAY, "album": 30 * DAY, "track": 30 * DAY, "show": 30 * DAY, "episode": 30 * DAY,
+    "user": 7 * DAY, "group": 7 * DAY, "project": 7 * DAY, "repo": 7 * DAY,
+    "playlist": 1 * DAY,
+}
+DEFAULT_TTL = 7 * DAY
+
+NAME_FIELDS = ("name", "title", "login", "username")
+# handles queries use rather than the display name ("octocat", not "The Octocat"); learned as aliases
+ALIAS_FIELDS = ("login", "username")
+QUERY_PARAMS = ("query", "q")
+MIN_NAME_LENGTH = 3
+MAX_BACKGROUND_ENTITIES = 10
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", name.lower()).split())
+
+
+def _singular(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def _display_name(item: Any) -> Optional[str]:
+    if not isinstance(item, dict):
+        return None
+    for field in NAME_FIELDS:
+        if isinstance(item.get(field), str) and item[field].strip():
+            return item[field].strip()
+    return None
+
+
+def _aliases(item: Any, name: str) -> List[str]:
+    """The handles of `item` other than its display name `name`."""
+    aliases = []
+    for field in ALIAS_FIELDS:
+        value = item.get(field) if isinstance(item, dict) else None
+        if isinstance(value, str) and value.strip() and normalize_name(value) != normalize_name(name):
+            aliases.append(value.strip())
+    return list(dict.fromkeys(aliases))
+
+
+def _route_kind(route: Optional[str]) -> Optional[str]:
+    """The kind of resource a route template returns one of: the literal segment before its trailing
+    parameters (`/movie/{movie_id}` -> movie, `/repos/{owner}/{repo}` -> repo); None for other routes."""
+    if not route:
+        return None
+    segments = [s for s in urlparse(route).path.split("/") if s]
+    while segments and segments[-1].startswith("{"):
+        if len(segments) >= 2 and not segments[-2].startswith("{") and segments[-2].isalpha():
+            return _singular(segments[-2].lower())
+        segments.pop()
+    return None
+
+
+def _entity_id(item: Any) -> Optional[str]:
+    entity_id = item.get("id") if isinstance(item, dict) else None
+    return str(entity_id) if isinstance(entity_id, (int, str)) and not isinstance(entity_id, bool) else None
+
+
+def extract_entities(url: str, params: Optional[Mapping[str, Any]], data: Any,
+                     route: Optional[str] = None) -> List[Tuple[str, str, str, str]]:
+    """(kind, name it is known by, display name, id) resolved by one GET response.
+
+    A search (`/search/person?query=...`, `/search?q=...&type=artist`,
+    `/search/users?q=...`) resolves its query to the first hit when the names
+    agree; a single resource resolves its own name, with the kind taken from
+    the endpoint's `route` template (`/users/{username}`, `/movie/{movie_id}`).
+    """
+    params = dict(params or {})
+    for key, values in parse_qs(urlparse(url).query).items():
+        params.setdefault(key, values[0])
+    segments = [s for s in urlparse(url).path.split("/") if s]
+    entities = []
+
+    if "search" in segments:
+        after = segments[segments.index("search") + 1:]
+        kind = after[0] if after else str(params.get("type", ""))
+        query = next((str(params[p]) for p in QUERY_PARAMS if params.get(p)), None)
+        items = page_items(data)
+        if kind and "," not in kind and query and items and items[1]:
+            first = items[1][0]
+            name, entity_id = _display_name(first), _entity_id(first)
+            if name and entity_id:
+                wanted, found = normalize_name(query), normalize_name(name)
+                known = {normalize_name(alias) for alias in _aliases(first, name)}
+                # only trust the top hit when it is the entity that was asked for
+                if wanted and (f" {wanted} " in f" {found} " or f" {found} " in f" {wanted} " or wanted in known):
+                    kind = _singular(kind)
+                    entities.append((kind, query, name, entity_id))
+                    if found != wanted:
+                        entities.append((kind, name, name, entity_id))
+                    entities.extend((kind, alias, name, entity_id) for alias in _aliases(first, name)
+                                    if normalize_name(alias) != wanted)
+        return entities
+
+    kind = _route_kind(route)
+    if kind is not None and isinstance(data, dict):
+        name, entity_id = _display_name(data), _entity_id(data)
+        if name and entity_id:
+            entities.append((kind, name, name, entity_id))
+            entities.extend((kind, alias, name, entity_id) for alias in _aliases(data, name))
+    return entities
+
+
+class EntityCache:
+    """Name -> id entries per API host and entity type, with a TTL per type.
+
+    Safe to share between the threads of a process; several processes may
+    use the same file.
+    """
+
+    def __init__(self, path: str, ttls: Optional[Mapping[str, float]] = None, default_ttl: float = DEFAULT_TTL):
+        self.path = path
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entities ("
+                " host TEXT NOT NULL, kind TEXT NOT NULL, key TEXT NOT NULL,"
+                " name TEXT NOT NULL, entity_id TEXT NOT NULL, expires_at REAL NOT NULL,"
+                " PRIMARY KEY (host, kind, key))"
+            )
+
+    def ttl(self, kind: str) -> float:
+        return self.ttls.get(kind, self.default_ttl)
+
+    def put(self, host: str, kind: str, name: str, entity_id: str, display_name: Optional[str] = None) -> None:
+        key = normalize_name(name)
+        if len(key) < MIN_NAME_LENGTH:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?, ?)",
+                (host, kind, key, display_name or name, str(entity_id), time.time() + self.ttl(kind)),
+            )
+
+    def get(self, host: str, name: str, kind: Optional[str] = None) -> Optional[str]:
+        sql = "SELECT entity_id FROM entities WHERE host = ? AND key = ? AND expires_at > ?"
+        args: list = [host, normalize_name(name), time.time()]
+        if kind is not None:
+            sql += " AND kind = ?"
+            args.append(kind)
+        with self._lock:
+            row = self._conn.execute(sql, args).fetchone()
+        return row[0] if row else None
+
+    def learn(self, url: str, params: Optional[Mapping[str, Any]], response_text: str, route: Optional[str] = None) -> int:
+        """Store the entities a GET response of the endpoint `route` resolves; returns how many."""
+        try:
+            data = json.loads(response_text)
+        except (TypeError, ValueError):
+            return 0
+        host = host_key(url)
+        entities = extract_entities(url, params, data, route)
+        for kind, name, display_name, entity_id in entities:
+            self.put(host, kind, name, entity_id, display_name)
+            logger.info(f"Entity cache: learned {kind} '{name}' = {entity_id} on {host}")
+        return len(entities)
+
+    def mentioned(self, hosts: Iterable[str], text: str) -> List[Tuple[str, str, str, str]]:
+        """(host, kind, name, id) of the live entries whose name occurs in `text`, longest names first."""
+        hosts = list(hosts)
+        if not hosts:
+            return []
+        normalized = f" {normalize_name(text)} "
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT host, kind, key, name, entity_id FROM entities"
+                f" WHERE host IN ({','.join('?' * len(hosts))}) AND expires_at > ?",
+                [*hosts, time.time()],
+            ).fetchall()
+        found: Dict[Tuple[str, str, str], Tuple[str, str, str, str]] = {}
+        for host, kind, key, name, entity_id in sorted(rows, key=lambda row: -len(row[2])):
+            if f" {key} " in normalized:
+                found.setdefault((host, kind, entity_id), (host, kind, name, entity_id))
+        return list(found.values())[:MAX_BACKGROUND_ENTITIES]
+
+    def background(self, hosts: Iterable[str], text: str) -> Optional[str]:
+        """A background line with the known ids `text` mentions, or None."""
+        hosts = list(hosts)
+        entities = self.mentioned(hosts, text)
+        if not entities:
+            return None
+        known = "; ".join(
+            f"{name} ({kind}{' on ' + host if len(hosts) > 1 else ''}) is {entity_id}"
+            for host, kind, name, entity_id in entities
+        )
+        logger.info(f"Entity cache: {len(entities)} known for the query: {known}")
+        return f"Known ids from earlier queries: {known}"
+
+    def purge(self) -> int:
+        """Drop expired entries; returns how many."""
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM entities WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @classmethod
+    def from_config(cls, config: Any) -> Optional["EntityCache"]:
+        """From the `entity_cache` config value: a path, or {path, ttls}; None/false disables the cache."""
+        if not config:
+            return None
+        if isinstance(config, str):
+            return cls(config)
+        return cls(config["path"], ttls=config.get("ttls"))
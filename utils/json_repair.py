@@ -0,0 +1,274 @@
+"""Tolerant single-pass parser for the JSON the LLM writes (e.g. the Caller's operation input).
+
+Repairs the usual mistakes while parsing, in one left-to-right pass:
+missing and trailing commas, single-quoted or unquoted strings and keys,
+unescaped quotes and newlines inside strings, Python literals
+(True/False/None), comments, unbalanced brackets and prose around the
+value. Every repair is reported, so callers can log what was fixed.
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, List
+
+WHITESPACE = " \t\r\n"
+# characters that may follow the closing quote of a string
+AFTER_STRING = ",:}]"
+# repairs that, after an unescaped quote, mean a string was cut short rather than fixed
+SPLIT_STRING_REPAIRS = ("missing_colon", "missing_value")
+LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+
+
+class JSONRepairError(ValueError):
+    pass
+
+
+@dataclass
+class Repair:
+    kind: str
+    position: int
+    detail: str = ""
+
+    def __str__(self) -> str:
+        return f"{self.kind} at {self.position}" + (f" ({self.detail})" if self.detail else "")
+
+
+@dataclass
+class RepairResult:
+    value: Any
+    repairs: List[Repair] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return json.dumps(self.value, ensure_ascii=False)
+
+    def summary(self) -> str:
+        return ", ".join(str(repair) for repair in self.repairs)
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.repairs: List[Repair] = []
+
+    def repair(self, kind: str, detail: str = "", position: int = None) -> None:
+        self.repairs.append(Repair(kind, self.pos if position is None else position, detail))
+
+    def peek(self) -> str:
+        return self.text[self.pos] if self.pos < len(self.text) else ""
+
+    def skip_whitespace(self) -> None:
+        text = self.text
+        while self.pos < len(text):
+            char = text[self.pos]
+            if char in WHITESPACE:
+                self.pos += 1
+            elif text.startswith("//", self.pos) or char == "#":
+                end = text.find("\n", self.pos)
+                self.repair("comment")
+                self.pos = len(text) if end == -1 else end
+            elif text.startswith("/*", self.pos):
+                end = text.find("*/", self.pos + 2)
+                self.repair("comment")
+                self.pos = len(text) if end == -1 else end + 2
+            else:
+                return
+
+    def parse(self) -> Any:
+        start = min((i for i in (self.text.find("{"), self.text.find("[")) if i != -1), default=-1)
+        if start == -1:
+            raise JSONRepairError("no JSON object or array found")
+        if self.text[:start].strip():
+            self.repair("leading_text", self.text[:start].strip()[:40], 0)
+        self.pos = start
+        value = self.value()
+        self.skip_whitespace()
+        if self.pos < len(self.text):
+            self.repair("trailing_text", self.text[self.pos:].strip()[:40])
+        return value
+
+    def value(self) -> Any:
+        self.skip_whitespace()
+        char = self.peek()
+        if char == "{":
+            return self.object()
+        if char == "[":
+            return self.array()
+        if char in "\"'":
+            return self.string()
+        if char == "-" or char.isdigit():
+            return self.number()
+        if not char:
+            self.repair("missing_value")
+            return None
+        return self.bare_word()
+
+    def object(self) -> dict:
+        self.pos += 1
+        result = {}
+        while True:
+            self.skip_whitespace()
+            char = self.peek()
+            if not char:
+                self.repair("unclosed_object")
+                return result
+            if char == "}":
+                self.pos += 1
+                return result
+            if char == "]":
+                self.repair("mismatched_bracket", "] closing an object")
+                self.pos += 1
+                return result
+            if char == ",":
+                self.repair("extra_comma")
+                self.pos += 1
+                continue
+            key_position = self.pos
+            key = self.string() if char in "\"'" else self.bare_word(as_key=True)
+            self.skip_whitespace()
+            if self.peek() == ":":
+                self.pos += 1
+            else:
+                self.repair("missing_colon", str(key), key_position)
+            result[str(key)] = self.value()
+            self.skip_whitespace()
+            char = self.peek()
+            if char == ",":
+                self.pos += 1
+                self.skip_whitespace()
+                if self.peek() == "}":
+                    self.repair("trailing_comma")
+            elif char not in "}]":
+                self.repair("missing_comma")
+
+    def array(self) -> list:
+        self.pos += 1
+        result = []
+        while True:
+            self.skip_whitespace()
+            char = self.peek()
+            if not char:
+                self.repair("unclosed_array")
+                return result
+            if char == "]":
+                self.pos += 1
+                return result
+            if char == "}":
+                self.repair("mismatched_bracket", "} closing an array")
+                self.pos += 1
+                return result
+            if char == ",":
+                self.repair("extra_comma")
+                self.pos += 1
+                continue
+            result.append(self.value())
+            self.skip_whitespace()
+            char = self.peek()
+            if char == ",":
+                self.pos += 1
+                self.skip_whitespace()
+                if self.peek() == "]":
+                    self.repair("trailing_comma")
+            elif char not in "]}":
+                self.repair("missing_comma")
+
+    def string(self) -> str:
+        text = self.text
+        quote = text[self.pos]
+        if quote == "'":
+            self.repair("single_quotes")
+        self.pos += 1
+        chars = []
+        while self.pos < len(text):
+            char = text[self.pos]
+            if char == "\\" and self.pos + 1 < len(text):
+                escaped = text[self.pos + 1]
+                if escaped == "u" and self.pos + 6 <= len(text):
+                    try:
+                        chars.append(chr(int(text[self.pos + 2:self.pos + 6], 16)))
+                        self.pos += 6
+                        continue
+                    except ValueError:
+                        pass
+                chars.append({"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}.get(escaped, escaped))
+                self.pos += 2
+                continue
+            if char == quote:
+                # a quote the LLM forgot to escape is followed by more text, not by , : } ] or the end
+                after = self.pos + 1
+                while after < len(text) and text[after] in WHITESPACE:
+                    after += 1
+                if after >= len(text) or text[after] in AFTER_STRING or text[after] in "\"'":
+                    self.pos += 1
+                    return "".join(chars)
+                self.repair("unescaped_quote")
+            elif char == "\n":
+                self.repair("unescaped_newline")
+            chars.append(char)
+            self.pos += 1
+        self.repair("unclosed_string")
+        return "".join(chars)
+
+    def number(self) -> Any:
+        start = self.pos
+        text = self.text
+        while self.pos < len(text) and (text[self.pos].isdigit() or text[self.pos] in "+-.eE"):
+            self.pos += 1
+        literal = text[start:self.pos]
+        try:
+            return json.loads(literal)
+        except ValueError:
+            try:
+                return float(literal)
+            except ValueError:
+                self.repair("bad_number", literal, start)
+                return literal
+
+    def bare_word(self, as_key: bool = False) -> Any:
+        """An unquoted key, a literal, or an unquoted string value (up to the next delimiter)."""
+        start = self.pos
+        text = self.text
+        stop = ":,}]\n" if as_key else ",}]\n"
+        while self.pos < len(text) and text[self.pos] not in stop:
+            self.pos += 1
+        word = text[start:self.pos].strip()
+        if not as_key and word in LITERALS:
+            if word not in ("true", "false", "null"):
+                self.repair("python_literal", word, start)
+            return LITERALS[word]
+        if self.pos == start:
+            # a delimiter where a value should be; consume it so parsing always advances
+            self.repair("unexpected_character", text[start:start + 1], start)
+            self.pos += 1
+            return None
+        self.repair("unquoted_key" if as_key else "unquoted_string", word[:40], start)
+        return word
+
+
+def repair_json(text: str) -> RepairResult:
+    """Parse `text` as JSON, repairing it where needed; raises JSONRepairError if there is no object or array."""
+    try:
+        return RepairResult(json.loads(text))
+    except (TypeError, ValueError):
+        pass
+    parser = _Parser(text)
+    value = parser.parse()
+    _check_quotes(parser.repairs)
+    return RepairResult(value, parser.repairs)
+
+
+def _check_quotes(repairs: List[Repair]) -> None:
+    """Refuse a repair that split a string at an unescaped quote into made-up keys.
+
+    In `{"body": "He said "hi", then left"}` the quote before `,` looks like the
+    end of the string, and what follows parses as a key without a colon or
+    value; returning that object would pass a fabricated structure on as a
+    successful repair.
+    """
+    quote = next((repair for repair in repairs if repair.kind == "unescaped_quote"), None)
+    if quote is None:
+        return
+    for repair in repairs:
+        if repair.position > quote.position and repair.kind in SPLIT_STRING_REPAIRS:
+            raise JSONRepairError(f"ambiguous unescaped quote at {quote.position}: {repair}")
@@ -0,0 +1,189 @@
+"""Queue-based logging pipeline.
+
+The chains log from the hot path: planner outputs, generated code and, above
+all, raw API responses that can be megabytes long. Records are capped and put
+on a queue; a background listener does the formatting and all file/console
+I/O.
+"""
+
+import os
+import json
+import gzip
+import queue
+import atexit
+import hashlib
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional
+
+from .utils import ColorPrint, MyRotatingFileHandler
+
+DEFAULT_MAX_PAYLOAD_BYTES = 4096
+
+
+class PayloadCapFilter(logging.Filter):
+    """Truncates messages above `max_bytes` and tags them with the sha256 of the full text.
+
+    Runs on the logging thread, so it only does the cheap part (slicing and
+    hashing); if `keep_payload` is set the full text rides along on the
+    record for `PayloadStoreHandler` to write in the background.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_PAYLOAD_BYTES, keep_payload: bool = False):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.keep_payload = keep_payload
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "payload_sha256", None) is not None:
+            return True  # already capped by another handler's filter
+        message = record.getMessage()
+        if self.max_bytes and len(message) > self.max_bytes // 4:
+            data = message.encode('utf-8')
+            if len(data) > self.max_bytes:
+                digest = hashlib.sha256(data).hexdigest()
+                head = data[:self.max_bytes].decode('utf-8', errors='ignore')
+                record.payload_bytes = len(data)
+                record.payload_sha256 = digest
+                if self.keep_payload:
+                    record.payload = message
+                message = f"{head}... [truncated {len(data) - self.max_bytes} of {len(data)} bytes, sha256={digest}]"
+        # freeze the (possibly truncated) message so the listener never re-renders args
+        record.msg, record.args = message, None
+        return True
+
+
+class JsonlFormatter(logging.Formatter):
+    """One JSON object per record; `stage` is the "Planner"/"Caller"/... prefix ColorPrint colours by."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        prefix = message.split(':', 1)[0]
+        entry = {
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "stage": prefix if ':' in message and len(prefix) < 32 else None,
+            "message": message,
+        }
+        if getattr(record, "payload_sha256", None):
+            entry["payload_sha256"] = record.payload_sha256
+            entry["payload_bytes"] = record.payload_bytes
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class PayloadStoreHandler(logging.Handler):
+    """Writes the full text of truncated records to `<payload_dir>/<sha256>.txt.gz`, once per content."""
+
+    def __init__(self, payload_dir: str):
+        super().__init__()
+        self.payload_dir = payload_dir
+        os.makedirs(payload_dir, exist_ok=True)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        payload = getattr(record, "payload", None)
+        if payload is None:
+            return
+        try:
+            path = os.path.join(self.payload_dir, f"{record.payload_sha256}.txt.gz")
+            if not os.path.exists(path):
+                with gzip.open(path + ".tmp", 'wt', encoding='utf-8') as f:
+                    f.write(payload)
+                os.replace(path + ".tmp", path)
+        except Exception:
+            self.handleError(record)
+
+
+class _FlushableQueueListener(QueueListener):
+    def handle(self, record: logging.LogRecord) -> None:
+        flush_event = getattr(record, "flush_event", None)
+        if flush_event is not None:
+            for handler in self.handlers:
+                handler.flush()
+            flush_event.set()
+            return
+        super().handle(record)
+
+
+class LogPipeline:
+    """Root-logger setup: capped records go through a queue to a background writer."""
+
+    def __init__(self, handlers: List[logging.Handler], max_payload_bytes: int = DEFAULT_MAX_PAYLOAD_BYTES,
+                 keep_payload: bool = False, level: int = logging.INFO):
+        self.queue: queue.Queue = queue.Queue(-1)
+        self.handlers = handlers
+        self.queue_handler = QueueHandler(self.queue)
+        self.queue_handler.addFilter(PayloadCapFilter(max_payload_bytes, keep_payload=keep_payload))
+        self.listener = _FlushableQueueListener(self.queue, *handlers, respect_handler_level=True)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.queue_handler)
+        root.setLevel(level)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def flush(self, timeout: Optional[float] = 10.0) -> bool:
+        """Block until every record queued so far has been written."""
+        record = logging.makeLogRecord({"msg": "", "flush_event": threading.Event()})
+        self.queue.put_nowait(record)
+        return record.flush_event.wait(timeout)
+
+    def rollover(self) -> None:
+        """Flush, then roll every `MyRotatingFileHandler` over (e.g. between batch queries)."""
+        self.flush()
+        for handler in self.handlers:
+            if isinstance(handler, MyRotatingFileHandler):
+                handler.acquire()
+                try:
+                    handler.doRollover()
+                finally:
+                    handler.release()
+
+    def stop(self) -> None:
+        if self.listener._thread is not None:
+            self.listener.stop()
+            for handler in self.handlers:
+                handler.close()
+
+
+def setup_logging(
+    log_file: Optional[str] = None,
+    jsonl_file: Optional[str] = None,
+    console: bool = True,
+    max_payload_bytes: int = DEFAULT_MAX_PAYLOAD_BYTES,
+    payload_dir: Optional[str] = None,
+    rotating: bool = False,
+    compress_rotated: bool = False,
+    level: int = logging.INFO,
+) -> LogPipeline:
+    """Install the pipeline on the root logger.
+
+    `log_file` keeps the plain "%(message)s" text format the existing logs
+    use, `jsonl_file` adds the structured stream next to it. With
+    `rotating`, both are `MyRotatingFileHandler`s that `LogPipeline.rollover`
+    rolls over, gzipping the rotated files if `compress_rotated`.
+    """
+    handlers: List[logging.Handler] = []
+    for path, formatter in ((log_file, logging.Formatter("%(message)s")), (jsonl_file, JsonlFormatter())):
+        if path is None:
+            continue
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if rotating:
+            handler = MyRotatingFileHandler(path, encoding='utf-8', compress=compress_rotated)
+        else:
+            handler = logging.FileHandler(path, encoding='utf-8')
+        handler.setFormatter(formatter)
+        handlers.append(handler)
+    if console:
+        console_handler = logging.StreamHandler(ColorPrint())
+        console_handler.setFormatter(logging.Formatter("%(message)s"))
+        handlers.append(console_handler)
+    if payload_dir is not None:
+        handlers.append(PayloadStoreHandler(payload_dir))
+    return LogPipeline(handlers, max_payload_bytes=max_payload_bytes, keep_payload=payload_dir is not None, level=level)
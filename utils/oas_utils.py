@@ -1,7 +1,10 @@
 """Quick and dirty representation for OpenAPI specs."""
 
-from dataclasses import dataclass
-from typing import Any, Dict, List, Tuple, Union
+import re
+import sys
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 
 def dereference_refs(spec_obj: dict, full_spec: dict) -> Union[dict, list]:
@@ -90,11 +93,149 @@ def merge_allof_properties(obj):
     return _merge_allof(obj)
 
 
+class FrozenDict(dict):
+    """A dict that refuses changes; `freeze` also turns the nested lists into tuples.
+
+    Still a dict for `json.dumps`, `in` and `.get`; `copy.deepcopy` returns
+    a plain, mutable copy.
+    """
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("endpoint docs are read-only; use Endpoint.docs for a private copy")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self) -> dict:
+        return dict(self)
+
+    def __deepcopy__(self, memo) -> dict:
+        return thaw(self)
+
+
+def freeze(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return FrozenDict({key: freeze(value) for key, value in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(value) for value in obj)
+    return obj
+
+
+def thaw(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {key: thaw(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [thaw(value) for value in obj]
+    return obj
+
+
+class Endpoint:
+    """Compact record for one endpoint of a reduced spec.
+
+    The fields the hot paths need (method, path template, parameter names)
+    are precomputed and interned; the docs are kept as one compact JSON
+    string. `docs` decodes a private copy for callers that edit it,
+    `frozen_docs` is a read-only view decoded once and shared, and
+    `variant(name)` looks up read-only docs derived from it at load time
+    (e.g. Spotify's search response narrowed to one type). For backward
+    compatibility an endpoint still unpacks and indexes like the old
+    `(name, description, docs)` tuple.
+    """
+
+    __slots__ = ("name", "method", "path", "description", "param_names", "required_params", "path_params", "_raw", "_pattern", "_frozen", "_variants")
+
+    def __init__(self, name: str, description: Optional[str], docs: Union[dict, str]):
+        method, _, path = name.partition(" ")
+        self.name = sys.intern(name)
+        self.method = sys.intern(method.upper())
+        self.path = sys.intern(path)
+        self.description = description
+        if isinstance(docs, str):
+            self._raw = docs
+            docs = json.loads(docs)
+        else:
+            self._raw = json.dumps(docs, separators=(",", ":"), ensure_ascii=False)
+        parameters = [p for p in docs.get("parameters", []) if isinstance(p, dict) and "name" in p]
+        self.param_names = tuple(sys.intern(p["name"]) for p in parameters)
+        self.required_params = tuple(sys.intern(p["name"]) for p in parameters if p.get("required"))
+        self.path_params = tuple(sys.intern(arg) for arg in re.findall(r"[{](.*?)[}]", path))
+        self._pattern = None
+        self._frozen = None
+        self._variants = None
+
+    @property
+    def docs(self) -> dict:
+        return json.loads(self._raw)
+
+    @property
+    def frozen_docs(self) -> FrozenDict:
+        if self._frozen is None:
+            self._frozen = freeze(json.loads(self._raw))
+        return self._frozen
+
+    def variant(self, name: str) -> Optional[FrozenDict]:
+        return self._variants.get(name) if self._variants else None
+
+    def add_variants(self, variants: Dict[str, dict]) -> None:
+        self._variants = {**(self._variants or {}), **{name: freeze(docs) for name, docs in variants.items()}}
+
+    @property
+    def pattern(self) -> "re.Pattern":
+        """Regex matching `METHOD concrete/path` against this path template."""
+        if self._pattern is None:
+            parts = re.split(r"[{].*?[}]", self.name)
+            self._pattern = re.compile("[^/]+".join(re.escape(part) for part in parts) + "$")
+        return self._pattern
+
+    def __iter__(self) -> Iterator:
+        return iter((self.name, self.description, self.docs))
+
+    def __getitem__(self, i):
+        if i in (0, -3):
+            return self.name
+        if i in (1, -2):
+            return self.description
+        return tuple(self)[i]
+
+    def __len__(self) -> int:
+        return 3
+
+    def __repr__(self) -> str:
+        return f"Endpoint({self.name!r})"
+
+
 @dataclass
 class ReducedOpenAPISpec:
     servers: List[dict]
     description: str
-    endpoints: List[Tuple[str, Union[str, None], dict]]
+    endpoints: List[Endpoint]
+    _by_name: Dict[str, Endpoint] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _by_method: Dict[str, List[Endpoint]] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.endpoints = [
+            endpoint if isinstance(endpoint, Endpoint) else Endpoint(*endpoint)
+            for endpoint in self.endpoints
+        ]
+        self._by_name = {endpoint.name: endpoint for endpoint in self.endpoints}
+        self._by_method = {}
+        for endpoint in self.endpoints:
+            self._by_method.setdefault(endpoint.method, []).append(endpoint)
+
+    def get_endpoint(self, name: str) -> Optional[Endpoint]:
+        return self._by_name.get(name)
+
+    def match_endpoint(self, plan_endpoint: str) -> Optional[Endpoint]:
+        """Find the endpoint whose template matches `METHOD concrete/path`."""
+        endpoint = self._by_name.get(plan_endpoint)
+        if endpoint is not None:
+            return endpoint
+        method = plan_endpoint.split(" ", 1)[0]
+        for endpoint in self._by_method.get(method, []):
+            if endpoint.pattern.match(plan_endpoint):
+                return endpoint
+        return None
 
 
 def reduce_openapi_spec(spec: dict, dereference: bool = True, only_required: bool = True, merge_allof: bool = False) -> ReducedOpenAPISpec:
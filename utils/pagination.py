@@ -0,0 +1,168 @@
+"""Follow paginated list endpoints page by page, within an item and byte budget."""
+
+import re
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGES = 10
+MAX_ITEMS = 1000
+MAX_BYTES = 2_000_000
+
+# Instructions that aggregate over every matching item rather than take the first hit.
+# Superlatives ("the most popular", "latest album") and plain listings are left out: list
+# endpoints are usually sorted already, so the first page answers them.
+EXHAUSTIVE_PATTERN = re.compile(
+    r"\b(how many|count|number of|total|all|every|sum|average)\b",
+    re.IGNORECASE,
+)
+
+LINK_NEXT_PATTERN = re.compile(r'<([^>]+)>\s*;\s*rel="?next"?')
+
+
+def needs_all_pages(instruction: Optional[str]) -> bool:
+    return bool(instruction and EXHAUSTIVE_PATTERN.search(instruction))
+
+
+def query_param_names(docs: Optional[Dict[str, Any]]) -> List[str]:
+    if not docs:
+        return []
+    return [
+        param.get("name") for param in docs.get("parameters", []) or []
+        if isinstance(param, dict) and param.get("in", "query") == "query"
+    ]
+
+
+def page_items(data: Any) -> Optional[Tuple[Optional[str], List[Any]]]:
+    """(key, items) of the list a page carries: the body itself or `results`/`items` (also one level down)."""
+    if isinstance(data, list):
+        return None, data
+    if isinstance(data, dict):
+        for key in ("results", "items"):
+            if isinstance(data.get(key), list):
+                return key, data[key]
+        if len(data) == 1:
+            (key, inner), = data.items()
+            if isinstance(inner, dict) and isinstance(inner.get("items"), list):
+                return key, inner["items"]
+    return None
+
+
+class PageStream:
+    """The pages of one GET, fetched lazily and merged into a single data view.
+
+    `data` always has the shape of the first page, with the item lists of
+    all pages fetched so far concatenated, so code written against the
+    response schema runs on it unchanged. The next page is found from the
+    `Link` header, a `next` URL in the body, `page`/`total_pages` in the body
+    or, if the spec declares them, `page` or `offset`/`limit` query
+    parameters.
+    """
+
+    def __init__(
+        self,
+        transport: Any,
+        url: str,
+        params: Optional[Dict[str, Any]],
+        first_response: Any,
+        param_names: Optional[List[str]] = None,
+        exhaustive: bool = False,
+        auth: Any = None,
+        max_pages: int = MAX_PAGES,
+        max_items: int = MAX_ITEMS,
+        max_bytes: int = MAX_BYTES,
+    ):
+        self.transport = transport
+        self.auth = auth
+        self.param_names = set(param_names or [])
+        self.exhaustive = exhaustive
+        self.max_pages = max_pages
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.first_text = first_response.text
+        self.status_code: int = first_response.status_code
+        self.pages = 1
+        self.bytes = len(first_response.content)
+        self.stop_reason: Optional[str] = None
+        try:
+            self.data = json.loads(self.first_text)
+        except ValueError:
+            self.data = None
+        items = page_items(self.data)
+        self.items_key = items[0] if items else None
+        self.items = len(items[1]) if items else 0
+        self._next = self._next_request(first_response, self.data, url, dict(params or {})) if items else None
+
+    @classmethod
+    def open(cls, requests_wrapper: Any, url: str, params: Optional[Dict[str, Any]] = None, **kwargs: Any) -> "PageStream":
+        """Fetch the first page through a `PooledRequestsWrapper`'s transport."""
+        response = requests_wrapper.transport.request("GET", url, params=params, auth=requests_wrapper.auth)
+        return cls(requests_wrapper.transport, url, params, response, auth=requests_wrapper.auth, **kwargs)
+
+    @property
+    def has_more(self) -> bool:
+        return self._next is not None and self.stop_reason is None
+
+    def _next_request(self, response: Any, data: Any, url: str, params: Dict[str, Any]) -> Optional[Tuple[str, Optional[Dict[str, Any]]]]:
+        if response.status_code != 200:
+            return None
+        match = LINK_NEXT_PATTERN.search(response.headers.get("Link", ""))
+        if match:
+            return match.group(1), None
+        paging = data
+        if isinstance(data, dict) and len(data) == 1 and isinstance(next(iter(data.values())), dict):
+            paging = next(iter(data.values()))
+        if isinstance(paging, dict) and isinstance(paging.get("next"), str) and paging["next"].startswith("http"):
+            return paging["next"], None
+        if isinstance(paging, dict) and isinstance(paging.get("page"), int) and isinstance(paging.get("total_pages"), int):
+            if paging["page"] < paging["total_pages"]:
+                return url, {**params, "page": paging["page"] + 1}
+            return None
+        items = page_items(data)
+        if not items or not items[1]:
+            return None
+        if "page" in self.param_names:
+            return url, {**params, "page": int(params.get("page", 1)) + 1}
+        if "offset" in self.param_names and "limit" in params and len(items[1]) >= int(params["limit"]):
+            return url, {**params, "offset": int(params.get("offset", 0)) + len(items[1])}
+        return None
+
+    def fetch_next(self) -> bool:
+        """Fetch and merge the next page; False once the pages or the budget are exhausted."""
+        if not self.has_more:
+            return False
+        if self.pages >= self.max_pages or self.items >= self.max_items or self.bytes >= self.max_bytes:
+            self.stop_reason = "budget"
+            return False
+        url, params = self._next
+        response = self.transport.request("GET", url, params=params, auth=self.auth)
+        try:
+            data = json.loads(response.text)
+        except ValueError:
+            data = None
+        items = page_items(data)
+        if response.status_code != 200 or not items or not items[1]:
+            self._next = None
+            return False
+        self.pages += 1
+        self.bytes += len(response.content)
+        self.items += len(items[1])
+        self._merge(items[1])
+        self._next = self._next_request(response, data, url, dict(params or {}))
+        logger.info(f"Pagination: fetched page {self.pages} ({self.items} items, {self.bytes} bytes)")
+        return True
+
+    def _merge(self, new_items: List[Any]) -> None:
+        if isinstance(self.data, list):
+            self.data.extend(new_items)
+        elif self.items_key in ("results", "items") and isinstance(self.data.get(self.items_key), list):
+            self.data[self.items_key].extend(new_items)
+        else:
+            self.data[self.items_key]["items"].extend(new_items)
+
+    @property
+    def text(self) -> str:
+        """The merged view as JSON (the first page verbatim if nothing else was fetched)."""
+        return self.first_text if self.pages == 1 else json.dumps(self.data, ensure_ascii=False)
@@ -0,0 +1,145 @@
+"""Content-addressed memo of parser outputs.
+
+The parser's output only depends on the endpoint, the response body, the
+query it was asked and the call's parameters, so the same four inputs (two
+plan steps reading the same page, two sessions asking the same question)
+can reuse the first output instead of generating and running code again.
+Entries are kept in memory up to a byte budget (least recently used out
+first) and, optionally, in SQLite so they survive restarts.
+"""
+
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_MAX_DISK_ENTRIES = 100000
+# rough per-entry overhead of the key, the OrderedDict node and the str objects
+ENTRY_OVERHEAD = 200
+
+
+def normalize_query(query: Optional[str]) -> str:
+    return " ".join((query or "").lower().split())
+
+
+def first_page_only(pages: Any) -> bool:
+    """Whether parsing `pages` (a `PageStream`, or None) reads the first page alone, which is all a key covers.
+
+    An aggregation over a list with further pages, or a parse that fetched them, is not memoized.
+    """
+    return pages is None or (pages.pages == 1 and not (pages.exhaustive and pages.has_more))
+
+
+class ParseMemo:
+    """Parser outputs by `key(endpoint, response, query, params)`; safe to share between threads."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, path: Optional[str] = None,
+                 max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+            with self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS parse_memo ("
+                    " key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, output TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+
+    @staticmethod
+    def key(endpoint: str, response: str, query: Optional[str], params: Any) -> str:
+        h = hashlib.sha256()
+        for part in (endpoint, hashlib.sha256(response.encode('utf-8')).hexdigest(), normalize_query(query),
+                     json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)):
+            h.update(part.encode('utf-8'))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    @staticmethod
+    def _size(key: str, output: str) -> int:
+        return len(key) + len(output.encode('utf-8')) + ENTRY_OVERHEAD
+
+    def _remember(self, key: str, output: str) -> None:
+        # caller holds the lock
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= self._size(key, old)
+        self._entries[key] = output
+        self._bytes += self._size(key, output)
+        while self._bytes > self.max_bytes and self._entries:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self._bytes -= self._size(evicted_key, evicted)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            output = self._entries.get(key)
+            if output is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return output
+            if self._conn is not None:
+                row = self._conn.execute("SELECT output FROM parse_memo WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.hits += 1
+                    return row[0]
+            self.misses += 1
+        return None
+
+    def put(self, key: str, output: str, endpoint: str = "") -> None:
+        with self._lock:
+            self._remember(key, output)
+            if self._conn is None:
+                return
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO parse_memo VALUES (?, ?, ?, ?)", (key, endpoint, output, time.time())
+                )
+                self._puts += 1
+                if self._puts % 100 == 0:
+                    # keep the newest max_disk_entries
+                    self._conn.execute(
+                        "DELETE FROM parse_memo WHERE key NOT IN"
+                        " (SELECT key FROM parse_memo ORDER BY created_at DESC LIMIT ?)",
+                        (self.max_disk_entries,),
+                    )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._bytes}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @classmethod
+    def from_config(cls, config: Any) -> Optional["ParseMemo"]:
+        """From the `parse_memo` config value: true (in memory), or {max_bytes, path, max_disk_entries}; false/None disables it."""
+        if not config:
+            return None
+        if config is True:
+            return cls()
+        return cls(
+            max_bytes=config.get("max_bytes", DEFAULT_MAX_BYTES),
+            path=config.get("path"),
+            max_disk_entries=config.get("max_disk_entries", DEFAULT_MAX_DISK_ENTRIES),
+        )
@@ -0,0 +1,226 @@
+"""Push projection, page size and filters of a GET down to the server.
+
+The Caller usually asks for whole resources and lets the parser (or the
+token truncation) throw most of them away. Where the backend can shrink the
+response itself, this module adds the matching query parameters from the
+endpoint's parameter list and the Caller's `output_instructions`:
+
+* page size (`per_page`, `limit`, `page_size`): "first/top N" asks for N
+  items (the largest page if the parser still filters them), and so does
+  "latest/last N" on lists the server sorts newest first; instructions
+  that need every item ask for the largest page;
+* Spotify `fields`: only the response fields the instruction mentions
+  (plus ids, names and the paging fields);
+* TMDB `append_to_response`: sub-resources (credits, videos, ...) the
+  instruction needs, fetched with the detail call instead of separately;
+* Docker `filters`: container status and quoted names.
+
+Parameters the LLM already set are never touched.
+"""
+
+import re
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+from .pagination import needs_all_pages
+from .transport import host_key
+
+logger = logging.getLogger(__name__)
+
+# Page-size parameters and their maximum, per parameter name.
+PAGE_SIZE_PARAMS = {"per_page": 100, "limit": 50, "page_size": 100}
+
+# Hosts whose reduced specs do not list the page-size parameter they accept.
+HOST_PAGE_SIZE_PARAMS = {
+    "api.github.com": "per_page",
+    "gitlab.com": "per_page",
+}
+
+APPEND_TO_RESPONSE = [
+    (re.compile(r"\b(cast|crew|director|directed|actor|actress|starring|writer|producer)", re.I), "credits"),
+    (re.compile(r"\b(trailer|video|teaser)", re.I), "videos"),
+    (re.compile(r"\b(image|poster|backdrop|photo|profile picture)", re.I), "images"),
+    (re.compile(r"\bkeyword", re.I), "keywords"),
+    (re.compile(r"\breview", re.I), "reviews"),
+    (re.compile(r"\bsimilar", re.I), "similar"),
+    (re.compile(r"\brecommend", re.I), "recommendations"),
+    (re.compile(r"\b(certification|age rating|release dates)", re.I), "release_dates"),
+    (re.compile(r"\b(movie credits|filmography|movies? (he|she|they) (acted|starred|appeared))", re.I), "movie_credits"),
+]
+
+DOCKER_STATUSES = ("created", "restarting", "running", "removing", "paused", "exited", "dead")
+DOCKER_NAME_FILTER_PATHS = re.compile(r"/(containers|networks|volumes)(/json)?/?$")
+
+FIRST_N_PATTERN = re.compile(r"\b(?:first|top)\s+(\d{1,3})\b", re.I)
+# "last 3 tracks of the album" are the end of the list, not its first page: only lists the server
+# returns newest first start with the latest N
+FIRST_OR_LATEST_N_PATTERN = re.compile(r"\b(?:first|top|latest|last|most recent|newest)\s+(\d{1,3})\b", re.I)
+NEWEST_FIRST_PATHS = {
+    "api.github.com": re.compile(r"^/repos/[^/]+/[^/]+/(issues|pulls|commits|releases|events)/?$"),
+    "gitlab.com": re.compile(r"^(/api/v4)?/projects/[^/]+/(issues|merge_requests|repository/commits|pipelines|releases|events)/?$"),
+    "api.spotify.com": re.compile(r"^(/v1)?/me/player/recently-played/?$"),
+}
+# Conditions the parser applies after the fetch ("first 3 open issues labelled bug", "top 5 tracks
+# released after 2015"): with one of them, the first N items of the server are not the N asked for.
+CLIENT_FILTER_PATTERN = re.compile(
+    r"\b(with|without|where|whose|that|which|who|label(?:l)?ed|tagged|containing|contains?|matching|named|called"
+    r"|after|before|since|until|between|over|under|above|below|more than|less than|at least|at most|only|not|except"
+    r"|excluding|open|closed|merged|draft|released|created|updated|published|starred|forked|private|public|archived)\b",
+    re.I,
+)
+QUOTED_PATTERN = re.compile(r"'([^'\s]{1,64})'|\"([^\"\s]{1,64})\"")
+
+# Fields kept in every Spotify projection: identity and what pagination needs.
+SPOTIFY_ALWAYS = ("id", "name")
+SPOTIFY_PAGING = ("next", "total", "offset", "limit")
+
+
+def response_schema(docs: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    responses = (docs or {}).get("responses") or {}
+    content = responses.get("content") or {}
+    for media_type in ("application/json", "application/json; charset=utf-8"):
+        if isinstance(content.get(media_type), dict) and "schema" in content[media_type]:
+            return content[media_type]["schema"]
+    return responses.get("schema")
+
+
+def _words(text: str) -> set:
+    words = set()
+    for word in re.findall(r"[a-z]+", text.lower()):
+        words.add(word)
+        if len(word) > 3 and word.endswith("s"):
+            words.add(word[:-1])
+    return words
+
+
+def _projection(schema: Any, words: set, depth: int = 0) -> Optional[str]:
+    """Spotify `fields` expression for the properties of `schema` named in `words`."""
+    if not isinstance(schema, dict) or depth > 3:
+        return None
+    if schema.get("type") == "array" or ("items" in schema and "properties" not in schema):
+        return _projection(schema.get("items"), words, depth)
+    properties = schema.get("properties")
+    if properties is None:
+        # union types (a playlist item is a track or an episode): offer the fields of every variant
+        properties = {}
+        # any sequence: the shared read-only docs (`Endpoint.frozen_docs`) hold tuples, not lists
+        for variant in [*schema.get("oneOf", ()), *schema.get("anyOf", ()), *schema.get("allOf", ())]:
+            if isinstance(variant, dict) and isinstance(variant.get("properties"), dict):
+                properties.update(variant["properties"])
+    if not isinstance(properties, dict) or not properties:
+        return None
+    selected = []
+    for name, sub_schema in properties.items():
+        nested = _projection(sub_schema, words, depth + 1)
+        if nested:
+            selected.append(f"{name}({nested})")
+        elif name in SPOTIFY_ALWAYS or (depth == 0 and name in SPOTIFY_PAGING) or name.lower() in words:
+            selected.append(name)
+    mentioned = [item for item in selected if item not in SPOTIFY_ALWAYS and item not in SPOTIFY_PAGING]
+    return ",".join(selected) if mentioned else None
+
+
+class Pushdown:
+    """Adds pushdown parameters to GETs and keeps transfer statistics.
+
+    With `measure`, each pushed-down request is also sent without the added
+    parameters, so the log and `stats()` show the bytes it saved; meant for
+    benchmarking, as it doubles those requests.
+    """
+
+    def __init__(self, measure: bool = False):
+        self.measure = measure
+        self._stats = {"requests": 0, "pushed": 0, "bytes": 0, "baseline_bytes": 0}
+        self._lock = threading.Lock()
+
+    def rewrite(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]],
+        instruction: Optional[str],
+        param_names: Sequence[str] = (),
+        docs: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """(params with pushdown applied, the added parameters)."""
+        params = dict(params or {})
+        already = set(params) | set(re.findall(r"[?&]([^=&]+)=", url))
+        added: Dict[str, Any] = {}
+        instruction = instruction or ""
+        host = host_key(url)
+        declared = set(param_names)
+
+        # page size
+        size_param = next((p for p in PAGE_SIZE_PARAMS if p in declared), HOST_PAGE_SIZE_PARAMS.get(host))
+        if size_param and size_param not in already:
+            newest_first = NEWEST_FIRST_PATHS.get(host)
+            first_n_pattern = FIRST_OR_LATEST_N_PATTERN if newest_first and newest_first.search(urlparse(url).path) else FIRST_N_PATTERN
+            first_n = first_n_pattern.search(instruction)
+            if first_n and int(first_n.group(1)) <= PAGE_SIZE_PARAMS[size_param]:
+                # a page of exactly N only if nothing filters it afterwards; else the largest page, to find N matches
+                filtered = CLIENT_FILTER_PATTERN.search(first_n_pattern.sub(" ", instruction))
+                added[size_param] = PAGE_SIZE_PARAMS[size_param] if filtered else int(first_n.group(1))
+            elif needs_all_pages(instruction):
+                added[size_param] = PAGE_SIZE_PARAMS[size_param]
+
+        # Spotify field projection
+        if "fields" in declared and "fields" not in already and "spotify" in host:
+            fields = _projection(response_schema(docs), _words(instruction))
+            if fields:
+                added["fields"] = fields
+
+        # TMDB sub-resources
+        if "append_to_response" in declared and "append_to_response" not in already:
+            wanted = [resource for pattern, resource in APPEND_TO_RESPONSE if pattern.search(instruction)]
+            if wanted:
+                added["append_to_response"] = ",".join(dict.fromkeys(wanted))
+
+        # Docker filters
+        if host.endswith(":2375") and "filters" not in already:
+            path = re.sub(r"^https?://[^/]+", "", url.split("?")[0])
+            filters: Dict[str, List[str]] = {}
+            if re.search(r"/containers/json/?$", path):
+                statuses = [status for status in DOCKER_STATUSES if re.search(rf"\b{status}\b", instruction, re.I)]
+                if statuses:
+                    filters["status"] = statuses
+                    if "all" not in already:
+                        added["all"] = "true"
+            if DOCKER_NAME_FILTER_PATHS.search(path):
+                names = [a or b for a, b in QUOTED_PATTERN.findall(instruction)]
+                if len(names) == 1:
+                    filters["name"] = names
+            if filters:
+                added["filters"] = json.dumps(filters)
+
+        params.update(added)
+        return (params or None), added
+
+    def record(self, url: str, added: Dict[str, Any], transferred: int, baseline: Optional[int] = None) -> None:
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["bytes"] += transferred
+            self._stats["baseline_bytes"] += transferred if baseline is None else baseline
+            if added:
+                self._stats["pushed"] += 1
+        if added:
+            was = f" (was {baseline} bytes)" if baseline is not None else ""
+            logger.info(f"Pushdown: GET {url} +{json.dumps(added, ensure_ascii=False)} {transferred} bytes{was}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+
+_default_pushdown: Optional[Pushdown] = None
+_default_pushdown_lock = threading.Lock()
+
+
+def default_pushdown() -> Pushdown:
+    global _default_pushdown
+    if _default_pushdown is None:
+        with _default_pushdown_lock:
+            if _default_pushdown is None:
+                _default_pushdown = Pushdown()
+    return _default_pushdown
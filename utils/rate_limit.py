@@ -0,0 +1,154 @@
+"""Per-host, per-credential rate limiting shared by every transport of a process."""
+
+import time
+import hashlib
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional, Tuple
+
+from .resilience import DeadlineExceeded, remaining_time
+
+logger = logging.getLogger(__name__)
+
+# Static limits (requests per second, burst) for hosts that do not announce
+# theirs in response headers.
+DEFAULT_HOST_RATES: Dict[str, Tuple[float, float]] = {
+    "api.themoviedb.org": (40.0, 40.0),
+}
+
+CREDENTIAL_HEADERS = ("authorization", "private-token", "x-api-key")
+
+
+def credential_key(host: str, headers: Mapping[str, str]) -> str:
+    """`host` plus a short digest of the credential headers; the secrets themselves are not kept."""
+    credentials = sorted((k.lower(), v) for k, v in headers.items() if k.lower() in CREDENTIAL_HEADERS)
+    if not credentials:
+        return host
+    digest = hashlib.sha256(repr(credentials).encode()).hexdigest()[:12]
+    return f"{host}#{digest}"
+
+
+def _header(headers: Mapping[str, str], *names: str) -> Optional[str]:
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            return value
+    return None
+
+
+def retry_after_seconds(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Parse a `Retry-After` value (delta seconds or HTTP date)."""
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - (now or time.time()), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    def __init__(self, rate: Optional[float], burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        # set from response headers: no request before this (monotonic) time
+        self.blocked_until = 0.0
+
+    def reserve(self, now: float) -> float:
+        """Take one token and return how long the caller has to wait before using it."""
+        wait = max(self.blocked_until - now, 0.0)
+        if self.rate is None:
+            return wait
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens < 0:
+            wait = max(wait, -self.tokens / self.rate)
+        return wait
+
+
+class RateLimiter:
+    """Token buckets keyed by host and credential, fed by the servers' rate-limit headers.
+
+    `reserve` hands out a slot and returns the delay before it may be used,
+    so it works for threads (`acquire` sleeps) as well as for async callers
+    (`await asyncio.sleep(limiter.reserve(key))`). Requests are queued, never
+    rejected, unless the wait would run past the current deadline.
+    """
+
+    def __init__(self, host_rates: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.host_rates = dict(DEFAULT_HOST_RATES if host_rates is None else host_rates)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate, burst = self.host_rates.get(key.split("#", 1)[0], (None, 1.0))
+            bucket = self._buckets.setdefault(key, TokenBucket(rate, burst))
+        return bucket
+
+    def reserve(self, key: str) -> float:
+        with self._lock:
+            return self._bucket(key).reserve(time.monotonic())
+
+    def acquire(self, key: str) -> None:
+        wait = self.reserve(key)
+        if wait <= 0:
+            return
+        remaining = remaining_time()
+        if remaining is not None and wait > remaining:
+            raise DeadlineExceeded(f"rate limit for {key.split('#', 1)[0]} frees up in {wait:.1f}s, past the deadline")
+        logger.info(f"Rate limit: waiting {wait:.1f}s for {key.split('#', 1)[0]}")
+        time.sleep(wait)
+
+    def update(self, key: str, status_code: int, headers: Mapping[str, str]) -> None:
+        """Learn from a response: block the bucket until the announced reset when the quota is spent."""
+        delay = None
+        if status_code in (403, 429) or status_code >= 500:
+            delay = retry_after_seconds(_header(headers, "Retry-After", "retry-after"))
+        remaining = _header(headers, "X-RateLimit-Remaining", "RateLimit-Remaining", "x-ratelimit-remaining", "ratelimit-remaining")
+        reset = _header(headers, "X-RateLimit-Reset", "RateLimit-Reset", "x-ratelimit-reset", "ratelimit-reset")
+        if delay is None and remaining is not None and reset is not None:
+            try:
+                if int(float(remaining)) <= 0:
+                    reset_value = float(reset)
+                    # GitHub and GitLab send an epoch timestamp, others a delta in seconds
+                    delay = max(reset_value - time.time(), 0.0) if reset_value > 1e9 else reset_value
+            except ValueError:
+                pass
+        if delay is None and status_code == 429:
+            delay = 1.0
+        if delay:
+            with self._lock:
+                bucket = self._bucket(key)
+                bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + delay)
+
+    @staticmethod
+    def is_rate_limited(status_code: int, headers: Mapping[str, str]) -> bool:
+        """429, or a 403 that only means the quota is used up (GitHub's style)."""
+        if status_code == 429:
+            return True
+        if status_code != 403:
+            return False
+        remaining = _header(headers, "X-RateLimit-Remaining", "RateLimit-Remaining")
+        return (remaining is not None and remaining.strip() == "0") or _header(headers, "Retry-After") is not None
+
+
+_default_limiter: Optional[RateLimiter] = None
+_default_limiter_lock = threading.Lock()
+
+
+def default_rate_limiter() -> RateLimiter:
+    """The process-wide limiter, so transports of different scenarios share one quota per credential."""
+    global _default_limiter
+    if _default_limiter is None:
+        with _default_limiter_lock:
+            if _default_limiter is None:
+                _default_limiter = RateLimiter()
+    return _default_limiter
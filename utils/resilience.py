@@ -0,0 +1,279 @@
+"""Retries, hedged requests, circuit breakers and deadlines for LLM and REST calls."""
+
+import time
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Iterator, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Errors worth another attempt, matched by class name so that neither openai
+# nor requests has to be imported here.
+TRANSIENT_ERROR_NAMES = frozenset({
+    "ConnectionError", "ConnectTimeout", "ReadTimeout", "Timeout", "ChunkedEncodingError",
+    "APIConnectionError", "APIError", "RateLimitError", "ServiceUnavailableError", "TryAgain",
+})
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitOpenError(ConnectionError):
+    pass
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    # per-attempt timeout in seconds (used by the HTTP transport); None waits forever
+    timeout: Optional[float] = 30.0
+    retry_statuses: FrozenSet[int] = frozenset({429, 502, 503, 504})
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number `attempt` (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    if isinstance(exc, (CircuitOpenError, DeadlineExceeded)):
+        return False
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(exc).__mro__)
+
+
+# ---------------------------------------------------------------- deadlines
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("restgpt_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """Bound everything run inside (and in hedge threads started from it) to `seconds`.
+
+    Nested scopes can only shorten the deadline. `None` leaves it unchanged.
+    """
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def attempt_timeout(timeout: Optional[float]) -> Optional[float]:
+    """`timeout` shortened to what is left of the current deadline."""
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise DeadlineExceeded("deadline exceeded")
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+# ------------------------------------------------------------------ retries
+
+def retry_call(
+    fn: Callable[[], T],
+    policy: RetryPolicy,
+    retry_on_result: Optional[Callable[[T], bool]] = None,
+    retry_on_exception: Callable[[BaseException], bool] = is_transient_error,
+    description: str = "call",
+) -> T:
+    """Call `fn` until it succeeds, `policy.max_attempts` is reached or the deadline would pass.
+
+    A result for which `retry_on_result` is true is retried like an error;
+    if the attempts run out, the last such result is returned rather than
+    raised, so callers still see e.g. the final 503 response.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        attempt_timeout(None)  # raises once the deadline has passed
+        try:
+            result = fn()
+        except Exception as e:
+            if attempt >= policy.max_attempts or not retry_on_exception(e):
+                raise
+            reason = f"{type(e).__name__}: {e}"
+        else:
+            if retry_on_result is None or not retry_on_result(result) or attempt >= policy.max_attempts:
+                return result
+            reason = f"retryable result {getattr(result, 'status_code', result)!r}"
+
+        delay = policy.backoff(attempt)
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            raise DeadlineExceeded(f"{description}: no time left to retry after {reason}")
+        logger.debug(f"Retry: {description} attempt {attempt} failed ({reason}), retrying in {delay:.2f}s")
+        time.sleep(delay)
+
+
+# ------------------------------------------------------------------ hedging
+
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+_hedge_pool_lock = threading.Lock()
+
+
+def _get_hedge_pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    if _hedge_pool is None:
+        with _hedge_pool_lock:
+            if _hedge_pool is None:
+                _hedge_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+    return _hedge_pool
+
+
+def hedged_call(fn: Callable[[], T], hedge_after: Optional[float], max_hedges: int = 1) -> T:
+    """Run `fn`; if it has not returned after `hedge_after` seconds, race duplicates against it.
+
+    Only for idempotent calls. The first successful result wins; the losers
+    are left to finish in the background. Errors are raised only when every
+    copy failed.
+    """
+    if hedge_after is None:
+        return fn()
+    pool = _get_hedge_pool()
+    pending = {pool.submit(contextvars.copy_context().run, fn)}
+    hedges = 0
+    error: Optional[BaseException] = None
+    while pending:
+        timeout = hedge_after if hedges < max_hedges else None
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+        if not done and hedges < max_hedges:
+            hedges += 1
+            logger.debug(f"Hedge: starting duplicate #{hedges}")
+            pending.add(pool.submit(contextvars.copy_context().run, fn))
+    assert error is not None
+    raise error
+
+
+def race(
+    fns: Dict[str, Callable[[threading.Event], T]],
+    is_valid: Callable[[T], bool],
+) -> Tuple[Optional[str], Optional[T]]:
+    """Run every `fns[name](cancelled)` concurrently and return (name, result) of the first valid result.
+
+    The losers are not interrupted; `cancelled` is set so they can stop at
+    their next step, and their results are dropped. If no result is valid,
+    (None, the last result) is returned; errors are raised only when every
+    function failed. Waits at most until the current deadline.
+    """
+    pool = _get_hedge_pool()
+    cancelled = threading.Event()
+    futures = {pool.submit(contextvars.copy_context().run, fn, cancelled): name for name, fn in fns.items()}
+    pending = set(futures)
+    result: Optional[T] = None
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=remaining_time(), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded(f"deadline exceeded while racing {', '.join(fns)}")
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                result = future.result()
+                if is_valid(result):
+                    return futures[future], result
+    finally:
+        cancelled.set()
+    if error is not None and len(fns) == sum(1 for future in futures if future.exception() is not None):
+        raise error
+    return None, result
+
+
+# --------------------------------------------------------- circuit breaking
+
+class CircuitBreaker:
+    """Classic closed / open / half-open breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls fail immediately with `CircuitOpenError`; after `reset_timeout`
+    seconds a single probe is let through and its outcome closes or re-opens
+    the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.probing or time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if self.probing or time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"circuit for {self.name} is open after {self.failures} consecutive failures")
+            self.probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit: {self.name} closed")
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+                if self.opened_at is None:
+                    logger.info(f"Circuit: {self.name} opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+
+class CircuitBreakerRegistry:
+    """One `CircuitBreaker` per key (a host, a model), created on first use."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    key, CircuitBreaker(key, self.failure_threshold, self.reset_timeout)
+                )
+        return breaker
+
+    def states(self) -> Dict[str, str]:
+        return {key: breaker.state for key, breaker in self._breakers.items()}
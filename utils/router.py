@@ -0,0 +1,174 @@
+"""Route mixed ChatOps queries to the systems they are about."""
+
+import math
+import re
+import logging
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional
+
+from .oas_utils import ReducedOpenAPISpec
+from .scenario_utils import CHATOPS_SYSTEMS, CHATOPS_HEADERS, load_chatops_spec
+from .transport import HttpTransport, PooledRequestsWrapper, host_key
+
+logger = logging.getLogger(__name__)
+
+
+# Words that name a system outright. A query mentioning one of these is routed
+# to exactly the systems it names.
+SYSTEM_ALIASES = {
+    'github': ['github', 'gh'],
+    'gitlab': ['gitlab'],
+    'docker': ['docker', 'dockerd'],
+    'kubernetes': ['kubernetes', 'k8s', 'kubectl'],
+    'jenkins': ['jenkins'],
+}
+
+STOPWORDS = {
+    'a', 'an', 'the', 'of', 'in', 'on', 'for', 'to', 'and', 'or', 'with', 'by', 'from', 'is', 'are', 'be',
+    'all', 'my', 'me', 'i', 'it', 'its', 'this', 'that', 'what', 'which', 'how', 'many', 'get', 'list',
+    'create', 'delete', 'update', 'show', 'give', 'return', 'named', 'name', 'id', 'api', 'v4', 'json',
+    'http', 'https', 'localhost', 'com', 'new', 'current', 'currently', 'there', 'then', 'first', 'specific',
+}
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", text.lower()):
+        if token in STOPWORDS or token.isdigit() or len(token) < 2:
+            continue
+        # crude singular form so that "issues" and "issue" meet
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+@dataclass
+class Route:
+    systems: List[str]
+    api_spec: ReducedOpenAPISpec
+    requests_wrapper: PooledRequestsWrapper
+
+
+class SpecIndex:
+    """One shared index over the endpoints of every ChatOps system.
+
+    Besides the per-system specs it keeps, for each vocabulary token taken
+    from endpoint paths and summaries, an idf-style weight per system, which
+    is all `ChatOpsRouter.classify` needs.
+    """
+
+    def __init__(self, specs: Dict[str, ReducedOpenAPISpec]):
+        self.specs = {system: spec for system, spec in specs.items() if spec.endpoints}
+        self.systems = list(self.specs)
+        self.token_weights: Dict[str, Dict[str, float]] = {}
+        self._slices: Dict[FrozenSet[str], ReducedOpenAPISpec] = {}
+        self._lock = threading.Lock()
+
+        counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for system, spec in self.specs.items():
+            for endpoint in spec.endpoints:
+                route = re.sub(r"[{].*?[}]", " ", re.sub(r"^https?://[^/]+", "", endpoint.path))
+                for token in set(tokenize(route) + tokenize(endpoint.description or "")):
+                    counts[token][system] += 1
+        n_systems = max(len(self.systems), 1)
+        for token, per_system in counts.items():
+            idf = math.log(1 + n_systems / len(per_system))
+            self.token_weights[token] = {
+                system: idf * (1 + math.log(count)) for system, count in per_system.items()
+            }
+
+    @classmethod
+    def from_spec_dir(cls, spec_dir: str = "specs", systems: Iterable[str] = CHATOPS_SYSTEMS,
+                      store_dir: Optional[str] = None) -> "SpecIndex":
+        return cls({system: load_chatops_spec(system, spec_dir=spec_dir, store_dir=store_dir) for system in systems})
+
+    def base_url(self, system: str) -> str:
+        return self.specs[system].servers[0]['url']
+
+    def slice(self, systems: Iterable[str]) -> ReducedOpenAPISpec:
+        """Spec restricted to `systems`; built once per combination."""
+        key = frozenset(systems)
+        spec = self._slices.get(key)
+        if spec is None:
+            with self._lock:
+                if key not in self._slices:
+                    ordered = [system for system in self.systems if system in key]
+                    self._slices[key] = ReducedOpenAPISpec(
+                        servers=[server for system in ordered for server in self.specs[system].servers],
+                        description=" / ".join(f"{system} Data" for system in ordered),
+                        endpoints=[endpoint for system in ordered for endpoint in self.specs[system].endpoints],
+                    )
+                spec = self._slices[key]
+        return spec
+
+
+class ChatOpsRouter:
+    """Classifies each query to one or more systems and hands out the matching spec slice.
+
+    Classification is lexical: explicit system names win, otherwise endpoint
+    vocabulary is scored per system. Only when nothing matches is `fallback`
+    (e.g. an LLM classifier) consulted; without one, all systems are used.
+    All routes share one pooled transport that picks credentials by host;
+    pass `requests_wrapper` to reuse the transport of a previous router.
+    """
+
+    def __init__(
+        self,
+        index: SpecIndex,
+        system_headers: Optional[Dict[str, Dict[str, str]]] = None,
+        fallback: Optional[Callable[[str, List[str]], List[str]]] = None,
+        relative_threshold: float = 0.5,
+        requests_wrapper: Optional[PooledRequestsWrapper] = None,
+    ):
+        self.index = index
+        self.fallback = fallback
+        self.relative_threshold = relative_threshold
+        system_headers = CHATOPS_HEADERS if system_headers is None else system_headers
+        host_headers = {
+            host_key(index.base_url(system)): headers
+            for system, headers in system_headers.items()
+            if system in index.specs
+        }
+        if requests_wrapper is not None:
+            # a rebuilt router (new spec version) keeps the warm connection pool
+            requests_wrapper.transport.host_headers.update(host_headers)
+            self.requests_wrapper = requests_wrapper
+        else:
+            self.requests_wrapper = PooledRequestsWrapper(transport=HttpTransport(host_headers=host_headers))
+
+    def scores(self, query: str) -> Dict[str, float]:
+        scores: Dict[str, float] = defaultdict(float)
+        for token in tokenize(query):
+            for system, weight in self.index.token_weights.get(token, {}).items():
+                scores[system] += weight
+        return dict(scores)
+
+    def classify(self, query: str) -> List[str]:
+        # quoted values are resource names ("the container named 'jenkins'"), not hints
+        query = re.sub(r"'[^']*'|\"[^\"]*\"|`[^`]*`", " ", query)
+        words = set(re.findall(r"[a-z0-9]+", query.lower()))
+        named = [
+            system for system in self.index.systems
+            if any(alias in words for alias in SYSTEM_ALIASES.get(system, [system]))
+        ]
+        if named:
+            return named
+
+        scores = self.scores(query)
+        if scores:
+            top = max(scores.values())
+            return [system for system in self.index.systems if scores.get(system, 0.0) >= top * self.relative_threshold]
+
+        if self.fallback is not None:
+            systems = [system for system in self.fallback(query, self.index.systems) if system in self.index.specs]
+            if systems:
+                return systems
+        return list(self.index.systems)
+
+    def route(self, query: str) -> Route:
+        systems = self.classify(query)
+        logger.info(f"Router: {', '.join(systems)}")
+        return Route(systems=systems, api_spec=self.index.slice(systems), requests_wrapper=self.requests_wrapper)
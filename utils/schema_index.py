@@ -0,0 +1,203 @@
+"""Query-relevant summaries of an endpoint's response schema.
+
+The parser used to dump the whole response schema and cut it after a fixed
+number of tokens, which on large GitHub and TMDB schemas often dropped the
+very fields the query was about. A `SchemaIndex` flattens the schema once
+per endpoint into field paths (`crew[].job`) with their type and
+description; `render(query, max_tokens)` keeps the fields whose names (or,
+weaker, descriptions) share words with the query, plus their ancestors and
+the identifying fields next to them, then fills what is left of the budget
+with top-level fields, and renders the pruned schema in the old layout.
+"""
+
+import re
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+STOPWORDS = frozenset("""
+a an and are as at be by did do does for from get give has have how i in is it its me my of on or
+please return show tell that the their them then there these they this to was what when where which
+who whose will with you your all any each every list find search number many much
+""".split())
+# fields worth keeping next to a relevant one: answers usually need the id or name of an item
+IDENTIFYING_FIELDS = frozenset({"id", "name", "title", "login", "full_name", "key", "slug", "username"})
+MAX_CACHED_INDEXES = 512
+
+
+def _singular(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def words(text: str) -> Set[str]:
+    """Lowercase, singular words of `text`; snake_case and camelCase names are split."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text or "")
+    return {_singular(word) for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOPWORDS}
+
+
+@dataclass
+class SchemaField:
+    path: str
+    parent: Optional[int]
+    depth: int
+    name: str
+    type: str
+    node: Any
+    name_words: Set[str]
+    description_words: Set[str]
+    # tokens this field adds to the rendered schema, children not included
+    cost: int = 0
+
+
+def _node_type(node: Any) -> str:
+    if not isinstance(node, dict):
+        return "unknown"
+    if "type" in node:
+        return str(node["type"])
+    return "object" if "properties" in node else "array" if "items" in node else "unknown"
+
+
+def _shallow(node: Any) -> Any:
+    """The node without its nested properties (those are separate fields)."""
+    if not isinstance(node, dict):
+        return node
+    out = {key: value for key, value in node.items() if key not in ("properties", "items")}
+    items = node.get("items")
+    if isinstance(items, dict) and "properties" not in items:
+        out["items"] = items
+    return out
+
+
+class SchemaIndex:
+    def __init__(self, schema: Any, encoder: Any):
+        self.encoder = encoder
+        self.fields: List[SchemaField] = []
+        # shape of the rendered schema, as the parser always had it:
+        # the properties of an object, or a one-element list with the properties of the array items
+        if isinstance(schema, dict) and isinstance(schema.get("properties"), dict):
+            self.root, self.is_list = schema["properties"], False
+        elif isinstance(schema, dict) and isinstance(schema.get("items"), dict) and isinstance(schema["items"].get("properties"), dict):
+            self.root, self.is_list = schema["items"]["properties"], True
+        else:
+            self.root, self.is_list = None, isinstance(schema, dict) and "items" in schema
+        if self.root is not None:
+            full = [self.root] if self.is_list else self.root
+        else:
+            full = [schema["items"]] if self.is_list else schema
+        self.full = json.dumps(full, indent=4)
+        self.full_tokens = len(encoder.encode(self.full))
+        if self.root is not None:
+            self._add_properties(self.root, None, "", 0)
+
+    def _add_properties(self, properties: Dict[str, Any], parent: Optional[int], prefix: str, depth: int) -> None:
+        for name, node in properties.items():
+            path = f"{prefix}{name}"
+            description = node.get("description", "") if isinstance(node, dict) else ""
+            index = len(self.fields)
+            self.fields.append(SchemaField(
+                path=path, parent=parent, depth=depth, name=name, type=_node_type(node), node=node,
+                name_words=words(name), description_words=words(" ".join(str(description).split()[:30])),
+                cost=len(self.encoder.encode(json.dumps({name: _shallow(node)}, indent=4))) + 4 * depth,
+            ))
+            if not isinstance(node, dict):
+                continue
+            if isinstance(node.get("properties"), dict):
+                self._add_properties(node["properties"], index, f"{path}.", depth + 1)
+            elif isinstance(node.get("items"), dict) and isinstance(node["items"].get("properties"), dict):
+                self._add_properties(node["items"]["properties"], index, f"{path}[].", depth + 1)
+
+    def scores(self, query: str) -> List[float]:
+        query_words = words(query)
+        scores: List[float] = []
+        for field in self.fields:
+            score = 3.0 * len(field.name_words & query_words) + 1.0 * len(field.description_words & query_words)
+            if field.parent is not None:
+                # the children of a matching object (e.g. everything under `crew`) are somewhat relevant too
+                score += 0.5 * scores[field.parent]
+            scores.append(score)
+        return scores
+
+    def select(self, query: str, max_tokens: int) -> List[int]:
+        """Indexes of the fields to render for `query`, within about `max_tokens`."""
+        scores = self.scores(query)
+        chosen: Set[int] = set()
+        used = 0
+
+        def add(index: int) -> bool:
+            nonlocal used
+            missing = []
+            while index is not None and index not in chosen:
+                missing.append(index)
+                index = self.fields[index].parent
+            cost = sum(self.fields[i].cost for i in missing)
+            if used + cost > max_tokens:
+                return False
+            chosen.update(missing)
+            used += cost
+            return True
+
+        # deeper matches rank lower: `user.login` before `head.repo.owner.login`
+        rank = {i: score / (1 + 0.25 * self.fields[i].depth) for i, score in enumerate(scores) if score > 0}
+        relevant = sorted(rank, key=lambda i: (-rank[i], i))
+        for index in relevant:
+            add(index)
+        # the ids and names beside what was kept, then top-level fields while the budget lasts
+        parents = {self.fields[i].parent for i in chosen}
+        for index, field in enumerate(self.fields):
+            if field.name in IDENTIFYING_FIELDS and field.parent in parents:
+                add(index)
+        for index, field in enumerate(self.fields):
+            if field.depth == 0 and index not in chosen:
+                add(index)
+        return sorted(chosen)
+
+    def render(self, query: Optional[str], max_tokens: int) -> Tuple[str, int]:
+        """(schema text, number of fields kept); the whole schema if it fits, or if there is no query."""
+        if self.full_tokens <= max_tokens or not query or self.root is None:
+            if self.full_tokens > max_tokens:
+                return self.encoder.decode(self.encoder.encode(self.full)[:max_tokens]) + '...', len(self.fields)
+            return self.full, len(self.fields)
+        chosen = self.select(query, max_tokens)
+        children: Dict[Optional[int], List[int]] = {}
+        for index in chosen:
+            children.setdefault(self.fields[index].parent, []).append(index)
+
+        def build(parent: Optional[int]) -> Dict[str, Any]:
+            out = {}
+            for index in children.get(parent, []):
+                field = self.fields[index]
+                node = _shallow(field.node)
+                if index in children:
+                    nested = build(index)
+                    if isinstance(field.node, dict) and "properties" in field.node:
+                        node["properties"] = nested
+                    else:
+                        node["items"] = {"type": "object", "properties": nested}
+                out[field.name] = node
+            return out
+
+        pruned = build(None)
+        return json.dumps([pruned] if self.is_list else pruned, indent=4), len(chosen)
+
+
+_indexes: "OrderedDict[Tuple[str, int], Tuple[Any, SchemaIndex]]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def schema_index(endpoint: str, schema: Any, encoder: Any) -> SchemaIndex:
+    """The `SchemaIndex` of an endpoint's response schema, built once while the (shared, read-only) schema lives."""
+    key = (endpoint, id(schema))
+    with _indexes_lock:
+        cached = _indexes.get(key)
+        # the schema object is kept in the entry, so its id cannot be reused while cached
+        if cached is not None and cached[0] is schema:
+            _indexes.move_to_end(key)
+            return cached[1]
+    index = SchemaIndex(schema, encoder)
+    with _indexes_lock:
+        _indexes[key] = (schema, index)
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,86 @@
+"""Coalesce identical calls that are in flight at the same time."""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+from .resilience import DeadlineExceeded, remaining_time
+
+T = TypeVar("T")
+
+# a timeout this close to the leader's deadline was cut short by it (see resilience.attempt_timeout)
+DEADLINE_SLACK = 0.5
+
+
+def _deadline_bound(error: BaseException) -> bool:
+    """Whether the leader's own deadline, rather than the call itself, made it fail."""
+    if isinstance(error, DeadlineExceeded):
+        return True
+    remaining = remaining_time()
+    timed_out = isinstance(error, TimeoutError) or any("Timeout" in cls.__name__ for cls in type(error).__mro__)
+    return timed_out and remaining is not None and remaining <= DEADLINE_SLACK
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "deadline_bound", "followers")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.deadline_bound = False
+        self.followers = 0
+
+
+class SingleFlight:
+    """`do(key, fn)` runs `fn` once per key at a time; callers arriving meanwhile get its outcome.
+
+    Nothing is cached: as soon as the leading call returns, the next caller
+    with the same key starts a new one. Followers wait at most until the
+    current deadline. If the leader fails because its own deadline ran out,
+    its followers do not inherit that: they try again, one of them leading.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """(result, whether it was shared from a call already in flight)."""
+        first = True
+        while True:
+            with self._lock:
+                if first:
+                    self.calls += 1
+                    first = False
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                else:
+                    call.followers += 1
+                    self.shared += 1
+            if leader:
+                break
+            if not call.event.wait(remaining_time()):
+                raise DeadlineExceeded("deadline exceeded while waiting for a coalesced call")
+            if call.error is None:
+                return call.result, True
+            if not call.deadline_bound:
+                raise call.error
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            call.deadline_bound = _deadline_bound(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "shared": self.shared}
@@ -0,0 +1,242 @@
+"""Hot-reloadable registry of the reduced specs, for long-running processes.
+
+The registry loads each scenario's spec on first use and, from a watcher
+thread (or an explicit `check()`), notices when a spec file changed on
+disk. Only the paths whose raw definition changed are reduced again (all
+paths that use `$ref` if the shared components changed); every other
+`Endpoint` object is carried over, so whatever is cached per endpoint
+(compiled path patterns, prompts built from unchanged docs) stays valid.
+
+Each reload produces a new immutable `SpecVersion` that replaces the old
+one in a single assignment. Queries hold on to the version they started
+with (`with version.use(): ...`); the old version is reported as drained
+once the last of them has finished.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .oas_utils import Endpoint, ReducedOpenAPISpec
+from .scenario_utils import CHATOPS_SYSTEMS, prompt_scenario, reduce_scenario_spec, scenario_headers, spec_file
+
+logger = logging.getLogger(__name__)
+
+
+def _digest(obj) -> str:
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _paths(raw_api_spec: dict) -> dict:
+    # ChatOps specs may be a plain {url: {method: docs}} dict instead of an OAS with `paths`
+    return raw_api_spec["paths"] if isinstance(raw_api_spec.get("paths"), dict) else raw_api_spec
+
+
+def _shared_parts(raw_api_spec: dict) -> dict:
+    """Everything besides the paths (components, servers, info) of an OAS; nothing for plain dicts."""
+    if not isinstance(raw_api_spec.get("paths"), dict):
+        return {}
+    return {key: value for key, value in raw_api_spec.items() if key != "paths"}
+
+
+@dataclass
+class SpecVersion:
+    scenario: str
+    version: int
+    api_spec: ReducedOpenAPISpec
+    headers: Dict[str, str]
+    prompt_scenario: str
+    file_digest: str
+    path_digests: Dict[str, str]
+    shared_digest: str
+    # paths whose definition contains a $ref, re-reduced when the shared components change
+    ref_paths: Set[str] = field(default_factory=set)
+    in_flight: int = 0
+    retired: bool = False
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @contextmanager
+    def use(self) -> Iterator["SpecVersion"]:
+        """Mark a query as running on this version until the block exits."""
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                drained = self.retired and self.in_flight == 0
+            if drained:
+                logger.info(f"Spec registry: {self.scenario} v{self.version} drained")
+
+    def retire(self) -> None:
+        with self._lock:
+            self.retired = True
+            in_flight = self.in_flight
+        if in_flight:
+            logger.info(f"Spec registry: {self.scenario} v{self.version} draining {in_flight} running queries")
+
+
+class SpecRegistry:
+    """Current `SpecVersion` per scenario, reloaded incrementally when a spec file changes.
+
+    `subscribe(fn)` registers `fn(old, new)`, called after each swap.
+    Request headers (e.g. the Spotify token) are kept across reloads.
+    """
+
+    def __init__(self, spec_dir: str = "specs", poll_interval: float = 2.0):
+        self.spec_dir = spec_dir
+        self.poll_interval = poll_interval
+        self._versions: Dict[str, SpecVersion] = {}
+        self._stats: Dict[str, Tuple[int, int]] = {}
+        self._listeners: List[Callable[[SpecVersion, SpecVersion], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # bumped whenever a ChatOps system is swapped, so routers know to rebuild
+        self.chatops_generation = 0
+
+    def subscribe(self, listener: Callable[[SpecVersion, SpecVersion], None]) -> None:
+        self._listeners.append(listener)
+
+    def get(self, scenario: str) -> SpecVersion:
+        scenario = scenario.split("_")[0]
+        version = self._versions.get(scenario)
+        if version is None:
+            with self._lock:
+                if scenario not in self._versions:
+                    self._versions[scenario] = self._load(scenario)
+                version = self._versions[scenario]
+        return version
+
+    def specs(self, scenarios: Iterable[str] = CHATOPS_SYSTEMS) -> Dict[str, ReducedOpenAPISpec]:
+        return {scenario: self.get(scenario).api_spec for scenario in scenarios}
+
+    def versions(self) -> Dict[str, int]:
+        return {scenario: version.version for scenario, version in self._versions.items()}
+
+    def _file_stat(self, path: str) -> Tuple[int, int]:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self, scenario: str) -> Tuple[dict, str]:
+        path = spec_file(scenario, self.spec_dir)
+        self._stats[scenario] = self._file_stat(path)
+        with open(path, 'rb') as f:
+            content = f.read()
+        return json.loads(content), hashlib.sha256(content).hexdigest()
+
+    def _load(self, scenario: str) -> SpecVersion:
+        raw, file_digest = self._read(scenario)
+        paths = _paths(raw)
+        api_spec = reduce_scenario_spec(scenario, raw)
+        return SpecVersion(
+            scenario=scenario, version=1, api_spec=api_spec,
+            headers=scenario_headers(scenario, raw), prompt_scenario=prompt_scenario(scenario),
+            file_digest=file_digest,
+            path_digests={route: _digest(item) for route, item in paths.items()},
+            shared_digest=_digest(_shared_parts(raw)),
+            ref_paths={route for route, item in paths.items() if '"$ref"' in json.dumps(item)},
+        )
+
+    def _reload(self, old: SpecVersion, raw: dict, file_digest: str) -> Tuple[SpecVersion, int, int]:
+        """New version from `raw`, re-reducing only the changed paths; (version, reduced, reused)."""
+        scenario = old.scenario
+        paths = _paths(raw)
+        path_digests = {route: _digest(item) for route, item in paths.items()}
+        shared_digest = _digest(_shared_parts(raw))
+        ref_paths = {route for route, item in paths.items() if '"$ref"' in json.dumps(item)}
+        changed = {route for route, digest in path_digests.items() if old.path_digests.get(route) != digest}
+        if shared_digest != old.shared_digest:
+            changed |= ref_paths
+
+        reduced: Dict[str, List[Endpoint]] = {}
+        servers, description = old.api_spec.servers, old.api_spec.description
+        if changed or shared_digest != old.shared_digest:
+            sub_paths = {route: paths[route] for route in paths if route in changed}
+            sub_spec = {**raw, "paths": sub_paths} if isinstance(raw.get("paths"), dict) else sub_paths
+            partial = reduce_scenario_spec(scenario, sub_spec)
+            for endpoint in partial.endpoints:
+                reduced.setdefault(endpoint.path, []).append(endpoint)
+            # ChatOps specs take their base URL from the paths, which the partial spec may not include
+            if scenario not in CHATOPS_SYSTEMS or partial.servers != [{"url": "http://localhost"}]:
+                servers, description = partial.servers, partial.description
+
+        old_by_path: Dict[str, List[Endpoint]] = {}
+        for endpoint in old.api_spec.endpoints:
+            old_by_path.setdefault(endpoint.path, []).append(endpoint)
+        endpoints: List[Endpoint] = []
+        reused = 0
+        for route, item in paths.items():
+            if route in changed:
+                endpoints.extend(reduced.get(route, []))
+            else:
+                kept = old_by_path.get(route, [])
+                endpoints.extend(kept)
+                reused += len(kept)
+        new = SpecVersion(
+            scenario=scenario, version=old.version + 1,
+            api_spec=ReducedOpenAPISpec(servers=servers, description=description, endpoints=endpoints),
+            headers=old.headers, prompt_scenario=old.prompt_scenario, file_digest=file_digest,
+            path_digests=path_digests, shared_digest=shared_digest, ref_paths=ref_paths,
+        )
+        return new, len(endpoints) - reused, reused
+
+    def check(self) -> List[str]:
+        """Reload every loaded scenario whose spec file changed; returns the swapped scenarios."""
+        swapped = []
+        for scenario, old in list(self._versions.items()):
+            path = spec_file(scenario, self.spec_dir)
+            try:
+                if self._file_stat(path) == self._stats.get(scenario):
+                    continue
+                raw, file_digest = self._read(scenario)
+            except (OSError, ValueError) as e:
+                # a half-written file: keep serving the current version and retry on the next poll
+                logger.info(f"Spec registry: cannot reload {path} yet: {e}")
+                self._stats.pop(scenario, None)
+                continue
+            if file_digest == old.file_digest:
+                continue
+            start_time = time.time()
+            new, reduced, reused = self._reload(old, raw, file_digest)
+            with self._lock:
+                self._versions[scenario] = new
+                if scenario in CHATOPS_SYSTEMS:
+                    self.chatops_generation += 1
+            logger.info(
+                f"Spec registry: {scenario} v{new.version} swapped in, {reduced} endpoints reduced, "
+                f"{reused} reused in {time.time() - start_time:.2f}s"
+            )
+            old.retire()
+            for listener in self._listeners:
+                listener(old, new)
+            swapped.append(scenario)
+        return swapped
+
+    def start(self) -> None:
+        """Poll the spec files every `poll_interval` seconds from a daemon thread."""
+        if self._thread is not None:
+            return
+
+        def watch():
+            while not self._stop.wait(self.poll_interval):
+                try:
+                    self.check()
+                except Exception:
+                    logger.exception("Spec registry: reload failed")
+
+        self._thread = threading.Thread(target=watch, name="spec-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,235 @@
+"""Read-only spec store that worker processes share through an mmap'd file.
+
+Every process that loads `tmdb_oas.json` (or a ChatOps spec) holds its own
+expanded dict graph of the whole spec. The store is built once from the
+reduced spec by a single loader and laid out as
+
+    header | index (JSON) | docs of every endpoint (compact JSON, back to back)
+
+Workers map the file read-only: the index (names, descriptions, parameter
+names and the byte range of each endpoint's docs) is all they decode up
+front, and the docs stay in the page cache shared by every process until an
+endpoint is actually used. `MappedEndpoint.raw_docs()` is a zero-copy view;
+`docs` decodes just that slice.
+
+A loader (or the first worker to get the lock) builds or refreshes the store
+whenever the source spec changed:
+
+    python -m utils.spec_store tmdb spotify --store-dir specs/.store
+"""
+
+import os
+import re
+import sys
+import json
+import mmap
+import struct
+import hashlib
+import logging
+import argparse
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from .oas_utils import Endpoint, ReducedOpenAPISpec
+from .scenario_utils import reduce_scenario_spec, spec_file
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent first builds simply race on os.replace
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RGPTSPEC"
+FORMAT_VERSION = 1
+# magic, format version, length of the index
+HEADER = struct.Struct("<8sIQ")
+DEFAULT_STORE_DIR = os.path.join("specs", ".store")
+
+
+def source_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class MappedEndpoint(Endpoint):
+    """An `Endpoint` whose docs live in a `SpecStore`'s mapping and are decoded on access."""
+
+    __slots__ = ("_store", "_offset", "_length")
+
+    def __init__(self, store: "SpecStore", name: str, description: Optional[str],
+                 param_names: List[str], required_params: List[str], offset: int, length: int):
+        method, _, path = name.partition(" ")
+        self.name = sys.intern(name)
+        self.method = sys.intern(method.upper())
+        self.path = sys.intern(path)
+        self.description = description
+        self.param_names = tuple(sys.intern(p) for p in param_names)
+        self.required_params = tuple(sys.intern(p) for p in required_params)
+        self.path_params = tuple(sys.intern(arg) for arg in re.findall(r"[{](.*?)[}]", path))
+        self._pattern = None
+        self._frozen = None
+        self._variants = None
+        self._store = store
+        self._offset = offset
+        self._length = length
+
+    def raw_docs(self) -> memoryview:
+        """The compact JSON docs as a view into the mapping (no copy)."""
+        return self._store.view(self._offset, self._length)
+
+    @property
+    def _raw(self) -> str:
+        return str(self.raw_docs(), 'utf-8')
+
+    @property
+    def docs(self) -> dict:
+        return json.loads(self.raw_docs().tobytes())
+
+
+class SpecStore:
+    """A store file mapped read-only; `api_spec` is its reduced spec with `MappedEndpoint`s."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, version, index_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a spec store of format {FORMAT_VERSION}")
+        index = json.loads(self._view[HEADER.size:HEADER.size + index_length].tobytes())
+        base = HEADER.size + index_length
+        self.scenario: str = index["scenario"]
+        self.source_digest: str = index["source_digest"]
+        # what request headers need besides the paths (e.g. Spotify's OAuth scopes)
+        self.security_schemes: dict = index.get("security_schemes") or {}
+        self.api_spec = ReducedOpenAPISpec(
+            servers=index["servers"],
+            description=index["description"],
+            endpoints=[
+                MappedEndpoint(self, name, description, param_names, required_params, base + offset, length)
+                for name, description, param_names, required_params, offset, length in index["endpoints"]
+            ],
+        )
+
+    def view(self, offset: int, length: int) -> memoryview:
+        return self._view[offset:offset + length]
+
+    def header_spec(self) -> dict:
+        """The part of the raw spec `scenario_headers` reads."""
+        return {"components": {"securitySchemes": self.security_schemes}}
+
+    def close(self) -> None:
+        self._view.release()
+        self._mmap.close()
+
+
+def build_spec_store(scenario: str, path: str, spec_dir: str = "specs") -> str:
+    """Reduce the scenario's spec and write it as a store file at `path` (atomically); returns `path`."""
+    scenario = scenario.split("_")[0]
+    source = spec_file(scenario, spec_dir)
+    digest = source_digest(source)
+    with open(source) as f:
+        raw_api_spec = json.load(f)
+    api_spec = reduce_scenario_spec(scenario, raw_api_spec)
+
+    blobs: List[bytes] = []
+    entries = []
+    offset = 0
+    for endpoint in api_spec.endpoints:
+        blob = endpoint._raw.encode('utf-8')
+        entries.append([endpoint.name, endpoint.description, endpoint.param_names, endpoint.required_params, offset, len(blob)])
+        blobs.append(blob)
+        offset += len(blob)
+    security_schemes = raw_api_spec.get("components", {}).get("securitySchemes") if isinstance(raw_api_spec.get("components"), dict) else None
+    index = json.dumps({
+        "scenario": scenario,
+        "source_digest": digest,
+        "servers": api_spec.servers,
+        "description": api_spec.description,
+        "security_schemes": security_schemes,
+        "endpoints": entries,
+    }, separators=(",", ":"), ensure_ascii=False).encode('utf-8')
+    del raw_api_spec, api_spec
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(index)))
+        f.write(index)
+        for blob in blobs:
+            f.write(blob)
+    # workers that mapped the old file keep their (unlinked) copy until they exit
+    os.replace(tmp_path, path)
+    logger.info(f"Spec store: built {path} from {source}, {len(entries)} endpoints, {offset} bytes of docs")
+    return path
+
+
+@contextmanager
+def _build_lock(path: str) -> Iterator[None]:
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _current(path: str, digest: str) -> Optional[SpecStore]:
+    try:
+        store = SpecStore(path)
+    except (OSError, ValueError):
+        return None
+    if store.source_digest != digest:
+        store.close()
+        return None
+    return store
+
+
+def open_spec_store(scenario: str, store_dir: str = DEFAULT_STORE_DIR, spec_dir: str = "specs") -> SpecStore:
+    """Map the scenario's store, building it first if it is missing or older than the spec file.
+
+    Concurrent workers serialize on a lock file, so only one of them builds.
+    """
+    scenario = scenario.split("_")[0]
+    path = os.path.join(store_dir, f"{scenario}.spec")
+    digest = source_digest(spec_file(scenario, spec_dir))
+    store = _current(path, digest)
+    if store is not None:
+        return store
+    with _build_lock(path):
+        # another worker may have built it while we waited for the lock
+        store = _current(path, digest)
+        if store is None:
+            build_spec_store(scenario, path, spec_dir)
+            store = SpecStore(path)
+    return store
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, str]:
+    parser = argparse.ArgumentParser(description="Build the shared spec stores before starting workers.")
+    parser.add_argument("scenarios", nargs="+", help="scenarios or ChatOps systems, e.g. tmdb spotify github")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--spec-dir", default="specs")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    paths = {}
+    for scenario in args.scenarios:
+        store = open_spec_store(scenario, args.store_dir, args.spec_dir)
+        paths[scenario] = store.path
+        logger.info(f"Spec store: {store.path} ready, {len(store.api_spec.endpoints)} endpoints")
+        store.close()
+    return paths
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""Pooled HTTP transport shared by every Caller of a process."""
+
+import json
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from langchain.requests import TextRequestsWrapper
+
+from .budget import current_budget
+from .rate_limit import RateLimiter, credential_key, default_rate_limiter
+from .resilience import CircuitBreakerRegistry, RetryPolicy, attempt_timeout, hedged_call, retry_call
+from .single_flight import SingleFlight
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# reads that concurrent callers can share one response for
+COALESCED_METHODS = frozenset({"GET", "HEAD"})
+
+
+def host_key(url: str) -> str:
+    """`host[:port]` of a URL, without any user info."""
+    parsed = urlparse(url)
+    host = parsed.hostname or ""
+    return f"{host}:{parsed.port}" if parsed.port else host
+
+
+def never_sent(e: BaseException) -> bool:
+    """Whether a failed request provably never reached the server, so even a POST can be resent."""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], "reason", None) if isinstance(e, requests.ConnectionError) and e.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class HttpTransport:
+    """A `requests.Session` with a sized connection pool and default headers.
+
+    One transport is meant to live as long as the process so that keep-alive
+    connections to each backend are reused across queries. `host_headers`
+    adds per-host credentials, so one transport can serve several backends.
+
+    Every request gets a timeout bounded by the current deadline (see
+    `resilience.deadline_scope`), transient failures are retried with jittered
+    backoff (5xx only for idempotent methods), slow idempotent requests
+    can be hedged, and a per-host circuit breaker fails requests to a dead
+    backend immediately. Requests wait for a slot of the (process-wide by
+    default) `RateLimiter` for their host and credential; rate-limited
+    responses are retried once the announced reset has passed. Identical
+    GETs in flight at the same time share one network call. Each request
+    is charged to the current query's budget (`utils.budget`).
+    """
+
+    def __init__(
+        self,
+        headers: Optional[Dict[str, str]] = None,
+        host_headers: Optional[Dict[str, Dict[str, str]]] = None,
+        pool_connections: int = 16,
+        pool_maxsize: int = 32,
+        retry_policy: Optional[RetryPolicy] = None,
+        hedge_after: Optional[float] = None,
+        breakers: Optional[CircuitBreakerRegistry] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ):
+        self.headers = dict(headers or {})
+        self.host_headers = {host: dict(h) for host, h in (host_headers or {}).items()}
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.hedge_after = hedge_after
+        self.breakers = breakers or CircuitBreakerRegistry()
+        self.rate_limiter = rate_limiter or default_rate_limiter()
+        self.single_flight = SingleFlight()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None, **kwargs: Any) -> requests.Response:
+        budget = current_budget()
+        if budget is not None:
+            budget.charge(http_calls=1)
+        response = self._request(method, url, headers, **kwargs)
+        if budget is not None:
+            budget.record(http_bytes=len(response.content))
+        return response
+
+    def _request(self, method: str, url: str, headers: Optional[Dict[str, str]], **kwargs: Any) -> requests.Response:
+        host = host_key(url)
+        merged_headers = {**self.headers, **self.host_headers.get(host, {}), **(headers or {})}
+        if method.upper() in COALESCED_METHODS and not any(kwargs.get(k) for k in ("data", "json", "files")):
+            key = (
+                method.upper(), url,
+                json.dumps(kwargs.get("params"), sort_keys=True, default=str),
+                tuple(sorted(merged_headers.items())), repr(kwargs.get("auth")),
+            )
+            response, _ = self.single_flight.do(key, lambda: self._send(method, url, host, merged_headers, **kwargs))
+            return response
+        return self._send(method, url, host, merged_headers, **kwargs)
+
+    def _send(self, method: str, url: str, host: str, merged_headers: Dict[str, str], **kwargs: Any) -> requests.Response:
+        breaker = self.breakers.get(host)
+        limit_key = credential_key(host, merged_headers)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        policy = self.retry_policy
+
+        def attempt() -> requests.Response:
+            breaker.before_call()
+            self.rate_limiter.acquire(limit_key)
+            try:
+                response = self.session.request(
+                    method, url, headers=merged_headers, timeout=attempt_timeout(policy.timeout), **kwargs
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                breaker.record_failure()
+                raise
+            self.rate_limiter.update(limit_key, response.status_code, response.headers)
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            return response
+
+        def send() -> requests.Response:
+            return hedged_call(attempt, self.hedge_after if idempotent else None)
+
+        def retry_on_exception(e: BaseException) -> bool:
+            if idempotent:
+                return isinstance(e, (requests.ConnectionError, requests.Timeout))
+            return never_sent(e)
+
+        def retry_on_result(response: requests.Response) -> bool:
+            # a rate-limited request was not processed, so any method may be resent
+            if RateLimiter.is_rate_limited(response.status_code, response.headers):
+                return True
+            return idempotent and response.status_code in policy.retry_statuses
+
+        return retry_call(
+            send,
+            policy,
+            retry_on_result=retry_on_result,
+            retry_on_exception=retry_on_exception,
+            description=f"{method} {url}",
+        )
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class PooledRequestsWrapper(TextRequestsWrapper):
+    """Drop-in `RequestsWrapper` that sends everything through an `HttpTransport`.
+
+    Chains copy their pydantic fields, so the transport object itself (and its
+    pool) is shared between all the copies.
+    """
+
+    transport: Any = None
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None, transport: Optional[HttpTransport] = None, **kwargs: Any):
+        if transport is None:
+            transport = HttpTransport(headers=headers)
+        super().__init__(headers=headers, transport=transport, **kwargs)
+
+    def response(self, method: str, url: str, data: Optional[Dict[str, Any]] = None, **kwargs: Any) -> requests.Response:
+        """The response itself, status and headers included; the verb methods return only its text."""
+        if data is not None:
+            kwargs["json"] = data
+        return self.transport.request(method.upper(), url, auth=self.auth, **kwargs)
+
+    def get(self, url: str, **kwargs: Any) -> str:
+        return self.response("GET", url, **kwargs).text
+
+    def post(self, url: str, data: Dict[str, Any], **kwargs: Any) -> str:
+        return self.response("POST", url, data, **kwargs).text
+
+    def patch(self, url: str, data: Dict[str, Any], **kwargs: Any) -> str:
+        return self.response("PATCH", url, data, **kwargs).text
+
+    def put(self, url: str, data: Dict[str, Any], **kwargs: Any) -> str:
+        return self.response("PUT", url, data, **kwargs).text
+
+    def delete(self, url: str, **kwargs: Any) -> str:
+        return self.response("DELETE", url, **kwargs).text
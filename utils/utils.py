@@ -1,16 +1,23 @@
 import os
 import re
+import sys
 import json
+import gzip
+import shutil
 import logging
+from functools import lru_cache
 from logging.handlers import BaseRotatingHandler
 from colorama import Fore
 
-from langchain.agents.agent_toolkits.openapi.spec import ReducedOpenAPISpec
+from .oas_utils import ReducedOpenAPISpec
+from .json_repair import JSONRepairError, repair_json
 
 
 
 class ColorPrint:
-    def __init__(self):
+    def __init__(self, stream=None):
+        # None: whatever `sys.stdout` is when writing, as `print` does
+        self.stream = stream
         self.color_mapping = {
             "Planner": Fore.RED,
             "API Selector": Fore.YELLOW,
@@ -20,17 +27,22 @@ class ColorPrint:
         }
 
     def write(self, data):
+        stream = self.stream or sys.stdout
         module = data.split(':')[0]
         if module not in self.color_mapping:
-            print(data, end="")
+            stream.write(data)
         else:
-            print(self.color_mapping[module] + data + Fore.RESET, end="")
+            stream.write(self.color_mapping[module] + data + Fore.RESET)
+
+    def flush(self):
+        (self.stream or sys.stdout).flush()
 
 
 class MyRotatingFileHandler(BaseRotatingHandler):
-    def __init__(self, filename, mode='a', encoding=None, delay=False):
+    def __init__(self, filename, mode='a', encoding=None, delay=False, compress=False):
         BaseRotatingHandler.__init__(self, filename, mode, encoding, delay)
         self.cnt = 1
+        self.compress = compress
 
     def doRollover(self):
         if self.stream:
@@ -41,6 +53,10 @@ class MyRotatingFileHandler(BaseRotatingHandler):
         if os.path.exists(dfn):
             os.remove(dfn)
         self.rotate(self.baseFilename, dfn)
+        if self.compress and os.path.exists(dfn):
+            with open(dfn, 'rb') as f_in, gzip.open(dfn + '.gz', 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.remove(dfn)
         self.cnt += 1
         
         if not self.delay:
@@ -52,6 +68,13 @@ class MyRotatingFileHandler(BaseRotatingHandler):
         return 0
 
 
+@lru_cache(maxsize=None)
+def get_encoder(model_name: str = 'text-davinci-003'):
+    # tiktoken caches the BPE ranks itself, but the lookup still costs; keep one per model
+    import tiktoken
+    return tiktoken.encoding_for_model(model_name)
+
+
 def get_matched_endpoint(api_spec: ReducedOpenAPISpec, plan: str):
     pattern = r"\b(GET|POST|PATCH|DELETE|PUT)\s+(\S+)"
     matches = re.findall(pattern, plan)
@@ -59,20 +82,13 @@ def get_matched_endpoint(api_spec: ReducedOpenAPISpec, plan: str):
         "{method} {route}".format(method=method, route=route.split("?")[0])
         for method, route in matches
     ]
-    spec_endpoints = [item[0] for item in api_spec.endpoints]
 
     matched_endpoints = []
 
     for plan_endpoint in plan_endpoints:
-        if plan_endpoint in spec_endpoints:
-            matched_endpoints.append(plan_endpoint)
-            continue
-        for name in spec_endpoints:
-            arg_list = re.findall(r"[{](.*?)[}]", name)
-            pattern = name.format(**{arg: r"[^/]+" for arg in arg_list}) + '$'
-            if re.match(pattern, plan_endpoint):
-                matched_endpoints.append(name)
-                break
+        endpoint = api_spec.match_endpoint(plan_endpoint)
+        if endpoint is not None:
+            matched_endpoints.append(endpoint.name)
     if len(matched_endpoints) == 0:
         return None
         # raise ValueError(f"Endpoint {plan_endpoint} not found in API spec.")
@@ -81,11 +97,10 @@ def get_matched_endpoint(api_spec: ReducedOpenAPISpec, plan: str):
 
 
 def simplify_json(raw_json: dict):
+    # builds a new structure, so it also works on read-only endpoint docs
     if isinstance(raw_json, dict):
-        for key in raw_json.keys():
-            raw_json[key] = simplify_json(raw_json[key])
-        return raw_json
-    elif isinstance(raw_json, list):
+        return {key: simplify_json(value) for key, value in raw_json.items()}
+    elif isinstance(raw_json, (list, tuple)):
         if len(raw_json) == 0:
             return raw_json
         elif len(raw_json) == 1:
@@ -97,28 +112,15 @@ def simplify_json(raw_json: dict):
 
 
 def fix_json_error(data: str, return_str=True):
+    """Repair LLM-written JSON (see utils/json_repair.py); the text itself if it cannot be repaired."""
     data = data.strip().strip('"').strip(",").strip("`")
     try:
-        json.loads(data)
-        return data
-    except json.decoder.JSONDecodeError:
-        data = data.split("\n")
-        data = [line.strip() for line in data]
-        for i in range(len(data)):
-            line = data[i]
-            if line in ['[', ']', '{', '}']:
-                continue
-            if line.endswith(('[', ']', '{', '}')):
-                continue
-            if not line.endswith(',') and data[i + 1] not in [']', '}', '],', '},']:
-                data[i] += ','
-            if data[i + 1] in [']', '}', '],', '},'] and line.endswith(','):
-                data[i] = line[:-1]
-        data = " ".join(data)
-        
-        if not return_str:
-            data = json.loads(data)
+        result = repair_json(data)
+    except JSONRepairError:
         return data
+    if not return_str:
+        return result.value
+    return data if not result.repairs else result.text
 
 
 def init_spotify(requests_wrapper):
@@ -1,62 +1,206 @@
 import os
+import sys
 import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
 from utils.chatops_utils import reduce_openapi_spec  # 调用你之前修改过的 reduce 函数
 
-def merge_all_jsons(input_folder, output_file):
-    merged_spec = {}
-    
-    files = [f for f in os.listdir(input_folder) if f.endswith('.json')]
-    print(f"检测到 {len(files)} 个文件，开始合并...")
+API_ROOT = "./APIs"
+RAW_CHATOPS_FOLDER = "./chatops_raw_APIs"
+SPEC_DIR = "./specs"
+CHATOPS_SPEC_NAME = "chatops_OAS"
+MANIFEST_NAME = ".build_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_digest(file_path: str) -> str:
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def reduce_file(file_path: str) -> Tuple[str, Optional[Dict[str, dict]], Optional[str]]:
+    """Reduce one raw API file to a `{url: {method: docs}}` fragment.
+
+    Runs in a worker process, so it only returns plain data and never raises.
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        # reduced_data.endpoints 是一个列表: [(name, desc, dict), ...]
+        reduced_data = reduce_openapi_spec(data, dereference=False)
 
-    for filename in files:
-        file_path = os.path.join(input_folder, filename)
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-            
-            # 2. 将清洗后的 endpoints 重新组装回字典格式
-            # reduced_data.endpoints 是一个列表: [(name, desc, dict), ...]
-            reduced_data = reduce_openapi_spec(data, dereference=False)
-            
-            for name, description, docs in reduced_data.endpoints:
-                parts = name.split(" ", 1)
-                if len(parts) == 2:
-                    method, url = parts
-                    
-                    if url not in merged_spec:
-                        merged_spec[url] = {}
-                    merged_spec[url][method.lower()] = docs
-                    
-        except Exception as e:
-            print(f"跳过文件 {filename}: {e}")
-
-    # 3. 保存合并后的文件
-    # 修改上面的第 3 步保存逻辑
-    
+        fragment: Dict[str, dict] = {}
+        for name, description, docs in reduced_data.endpoints:
+            parts = name.split(" ", 1)
+            if len(parts) == 2:
+                method, url = parts
+                fragment.setdefault(url, {})[method.lower()] = docs
+        return file_path, fragment, None
+    except Exception as e:
+        return file_path, None, f"{type(e).__name__}: {e}"
+
+
+def wrap_paths(merged_spec: dict) -> dict:
     # 伪造一个标准 OAS 结构
-    final_output = {
+    # 注意：标准 OAS 的 paths key 通常是相对路径 (例如 /issues)，但这里是绝对路径
+    # RestGPT 对此通常不敏感，只要是字符串即可
+    return {
         "openapi": "3.0.0",
         "info": {
             "title": "chatops",
             "version": "1.0.0",
             "description": "chatops APIs"
         },
-        "paths": {}  # 关键在这里
+        "paths": merged_spec,
     }
 
-    # 把我们合并的 merged_spec (格式是 url -> methods) 塞进 paths
-    # 注意：标准 OAS 的 paths key 通常是相对路径 (例如 /issues)，但你的是绝对路径
-    # RestGPT 对此通常不敏感，只要是字符串即可
-    final_output["paths"] = merged_spec
+
+def list_json_files(input_folder: str) -> List[str]:
+    # sorted so that later files override earlier ones deterministically
+    return [
+        os.path.join(input_folder, f)
+        for f in sorted(os.listdir(input_folder))
+        if f.endswith('.json')
+    ]
+
+
+def discover_targets(api_root: str = API_ROOT, raw_chatops_folder: str = RAW_CHATOPS_FOLDER) -> Dict[str, List[str]]:
+    """Map each output spec name to the raw files it is built from."""
+    targets = {}
+    if os.path.isdir(api_root):
+        for system in sorted(os.listdir(api_root)):
+            folder = os.path.join(api_root, system)
+            if os.path.isdir(folder):
+                targets[system] = list_json_files(folder)
+    if os.path.isdir(raw_chatops_folder):
+        targets[CHATOPS_SPEC_NAME] = list_json_files(raw_chatops_folder)
+    return targets
+
+
+def load_manifest(manifest_path: str) -> dict:
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {"version": MANIFEST_VERSION, "files": {}}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "files": {}}
+    return manifest
+
+
+def write_json_if_changed(obj: dict, output_file: str) -> bool:
+    content = json.dumps(obj, indent=2, ensure_ascii=False)
+    try:
+        with open(output_file, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+    except OSError:
+        pass
+    # write to a temp file first so readers never see a half-written spec
+    tmp_file = output_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_file, output_file)
+    return True
+
+
+def build_specs(
+    targets: Dict[str, List[str]],
+    spec_dir: str = SPEC_DIR,
+    max_workers: Optional[int] = None,
+    force: bool = False,
+) -> Dict[str, str]:
+    """Build every spec in `targets` in one pass.
+
+    Raw files are hashed and only those whose content changed since the last
+    build are re-reduced, in parallel across a process pool. The reduced
+    fragments are kept in a manifest next to the specs so unchanged files are
+    merged straight from it. Returns the errors keyed by file path.
+    """
+    os.makedirs(spec_dir, exist_ok=True)
+    manifest_path = os.path.join(spec_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    cached = manifest["files"]
+
+    all_files = sorted({path for files in targets.values() for path in files})
+    digests = {path: file_digest(path) for path in all_files}
+    # `force` re-reduces the files of `targets` only; the entries of other specs stay cached
+    stale = [path for path in all_files if force or cached.get(path, {}).get("sha256") != digests[path]]
+    print(f"{len(all_files)} files in {len(targets)} specs, {len(stale)} changed")
+
+    errors: Dict[str, str] = {}
+    if stale:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for path, fragment, error in pool.map(reduce_file, stale, chunksize=8):
+                if error is not None:
+                    errors[path] = error
+                    cached.pop(path, None)
+                else:
+                    cached[path] = {"sha256": digests[path], "paths": fragment}
+
+    for name, files in targets.items():
+        merged_spec: Dict[str, dict] = {}
+        for path in files:
+            if path not in cached:
+                continue
+            for url, methods in cached[path]["paths"].items():
+                merged_spec.setdefault(url, {}).update(methods)
+        output_file = os.path.join(spec_dir, f"{name}.json")
+        changed = write_json_if_changed(wrap_paths(merged_spec), output_file)
+        print(f"{name}: {len(merged_spec)} paths{' (updated)' if changed else ''}")
+
+    # drop files that no longer exist so the manifest does not grow forever; a partial build
+    # (`--systems`) keeps the entries of the specs it did not touch
+    manifest["files"] = {path: entry for path, entry in cached.items() if path in digests or os.path.exists(path)}
+    write_json_if_changed(manifest, manifest_path)
+    return errors
+
+
+def merge_all_jsons(input_folder, output_file):
+    merged_spec = {}
+    files = list_json_files(input_folder)
+    print(f"检测到 {len(files)} 个文件，开始合并...")
+
+    for file_path in files:
+        _, fragment, error = reduce_file(file_path)
+        if error is not None:
+            print(f"跳过文件 {os.path.basename(file_path)}: {error}")
+            continue
+        for url, methods in fragment.items():
+            merged_spec.setdefault(url, {}).update(methods)
 
     with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(final_output, f, indent=2, ensure_ascii=False)
+        json.dump(wrap_paths(merged_spec), f, indent=2, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build specs/*.json from the raw API files.")
+    parser.add_argument("--systems", nargs="*", default=None,
+                        help=f"only build these specs (e.g. gitlab docker {CHATOPS_SPEC_NAME}); default is all")
+    parser.add_argument("--workers", type=int, default=None, help="size of the process pool")
+    parser.add_argument("--force", action="store_true", help="re-reduce every file of the selected specs, even if unchanged")
+    args = parser.parse_args()
+
+    targets = discover_targets()
+    if args.systems:
+        unknown = set(args.systems) - set(targets)
+        if unknown:
+            parser.error(f"unknown systems: {', '.join(sorted(unknown))}")
+        targets = {name: files for name, files in targets.items() if name in args.systems}
+
+    errors = build_specs(targets, max_workers=args.workers, force=args.force)
+    for path, error in errors.items():
+        print(f"跳过文件 {path}: {error}", file=sys.stderr)
+    if errors:
+        sys.exit(1)
+
 
 if __name__ == "__main__":
-    # 配置路径
-    system = "gitlab"
-    INPUT_FOLDER = f"./APIs/{system}"  # 你的原始文件目录
-    OUTPUT_FILE = f"./specs/{system}.json" # 输出给 RestGPT 用的文件
-    
-    merge_all_jsons(INPUT_FOLDER, OUTPUT_FILE)
\ No newline at end of file
+    main()